@@ -0,0 +1,131 @@
+-- Migration:
+--    - turn public.bikes into a table range partitioned by UTC day on last_updated.
+--    - move all existing rows into one partition per day.
+--
+-- INSERT INTO public.schema_migrations (version, description, reason)
+-- VALUES ('002', 'Partition bikes by day',
+--   'Every day scoped query in processing and the visualization API scanned the
+--   whole bikes history. With daily partitions a city day touches one or two
+--   partitions and old days can be detached or dropped without a DELETE.');
+
+-- Stop the collector first. Run against the live database:
+--   psql -h localhost -p 5432 -U <user> -d <dbname> -f 002_partition_bikes_migration.sql
+--
+-- The old table is kept as public.bikes_unpartitioned. Drop it after the
+-- verification queries look right:
+--   DROP TABLE public.bikes_unpartitioned;
+
+BEGIN;
+
+ALTER TABLE public.bikes RENAME TO bikes_unpartitioned;
+ALTER TABLE public.bikes_unpartitioned RENAME CONSTRAINT bikes_pkey TO bikes_unpartitioned_pkey;
+
+-- Keep the ids: the new table continues the existing sequence
+CREATE TABLE public.bikes (
+    id INTEGER NOT NULL DEFAULT nextval('public.bikes_id_seq'),
+    bike_number TEXT NOT NULL,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    active BOOLEAN,
+    state TEXT,
+    bike_type TEXT,
+    station_number INTEGER,
+    station_uid INTEGER,
+    last_updated TIMESTAMPTZ NOT NULL,
+    city_id INTEGER NOT NULL,
+    city_name TEXT NOT NULL,
+    PRIMARY KEY (id, last_updated)
+) PARTITION BY RANGE (last_updated);
+
+ALTER SEQUENCE public.bikes_id_seq OWNED BY public.bikes.id;
+
+CREATE TABLE public.bikes_default PARTITION OF public.bikes DEFAULT;
+
+CREATE INDEX bikes_city_id_last_updated_idx ON public.bikes (city_id, last_updated);
+
+-- Same function as in create_bike_and_stations_db.sql
+CREATE OR REPLACE FUNCTION public.create_bikes_partitions(first_day DATE, days INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    partition_day DATE;
+    partition_name TEXT;
+    lower_bound TIMESTAMPTZ;
+    upper_bound TIMESTAMPTZ;
+    created INTEGER := 0;
+BEGIN
+    -- Several collectors may start at the same time
+    PERFORM pg_advisory_xact_lock(hashtext('public.create_bikes_partitions'));
+
+    FOR offset_days IN 0 .. days - 1 LOOP
+        partition_day := first_day + offset_days;
+        partition_name := 'bikes_' || to_char(partition_day, 'YYYYMMDD');
+        CONTINUE WHEN to_regclass('public.' || partition_name) IS NOT NULL;
+
+        lower_bound := partition_day::timestamp AT TIME ZONE 'UTC';
+        upper_bound := (partition_day + 1)::timestamp AT TIME ZONE 'UTC';
+
+        EXECUTE format(
+            'CREATE TABLE public.%I (LIKE public.bikes INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+            partition_name
+        );
+        EXECUTE format(
+            'WITH moved AS (
+                DELETE FROM public.bikes_default
+                WHERE last_updated >= $1 AND last_updated < $2
+                RETURNING *
+            )
+            INSERT INTO public.%I SELECT * FROM moved',
+            partition_name
+        ) USING lower_bound, upper_bound;
+        EXECUTE format(
+            'ALTER TABLE public.bikes ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+            partition_name, lower_bound, upper_bound
+        );
+        created := created + 1;
+    END LOOP;
+
+    RETURN created;
+END;
+$$;
+
+-- One partition for every day with data, plus the next two days
+SELECT public.create_bikes_partitions(
+    first_day,
+    (GREATEST(last_day, CURRENT_DATE + 2) - first_day) + 1
+)
+FROM (
+    SELECT
+        COALESCE(MIN((last_updated AT TIME ZONE 'UTC')::date), CURRENT_DATE) AS first_day,
+        COALESCE(MAX((last_updated AT TIME ZONE 'UTC')::date), CURRENT_DATE) AS last_day
+    FROM public.bikes_unpartitioned
+) AS bounds;
+
+INSERT INTO public.bikes (
+    id, bike_number, latitude, longitude, active, state, bike_type,
+    station_number, station_uid, last_updated, city_id, city_name
+)
+SELECT
+    id, bike_number, latitude, longitude, active, state, bike_type,
+    station_number, station_uid, last_updated, city_id, city_name
+FROM public.bikes_unpartitioned;
+
+COMMIT;
+
+ANALYZE public.bikes;
+
+
+-- ============================================================
+-- VERIFICATION QUERIES (run after migration)
+-- ============================================================
+-- Row counts must match
+SELECT
+    (SELECT COUNT(*) FROM public.bikes) AS partitioned_rows,
+    (SELECT COUNT(*) FROM public.bikes_unpartitioned) AS unpartitioned_rows;
+
+-- Partitions and their row counts, bikes_default should be empty
+SELECT tableoid::regclass AS partition, COUNT(*)
+FROM public.bikes
+GROUP BY tableoid
+ORDER BY partition;
@@ -0,0 +1,38 @@
+-- Migration:
+--    - add public.bike_intervals, filled by the processing compaction job.
+--
+-- INSERT INTO public.schema_migrations (version, description, reason)
+-- VALUES ('003', 'Add bike_intervals',
+--   'Most bikes rows repeat the previous snapshot of the same bike. The
+--   compaction job folds every run of identical snapshots into one interval,
+--   trips and station occupancy of a compacted day are read from a few
+--   thousand intervals instead of ~1M raw rows, which can then be deleted.');
+
+-- Run against the live database:
+--   psql -h localhost -p 5432 -U <user> -d <dbname> -f 003_bike_intervals_migration.sql
+
+BEGIN;
+
+-- Same table as in create_bike_and_stations_db.sql
+CREATE TABLE IF NOT EXISTS public.bike_intervals (
+    id BIGSERIAL PRIMARY KEY,
+    bike_number TEXT NOT NULL,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    active BOOLEAN,
+    state TEXT,
+    bike_type TEXT,
+    station_number INTEGER,
+    station_uid INTEGER,
+    valid_from TIMESTAMPTZ NOT NULL,
+    valid_to TIMESTAMPTZ NOT NULL,
+    ended_at TIMESTAMPTZ,
+    snapshots INTEGER NOT NULL,
+    city_id INTEGER NOT NULL,
+    city_name TEXT NOT NULL,
+    UNIQUE (city_id, bike_number, valid_from)
+);
+
+CREATE INDEX IF NOT EXISTS bike_intervals_city_id_valid_from_idx ON public.bike_intervals (city_id, valid_from);
+
+COMMIT;
@@ -0,0 +1,31 @@
+-- Migration:
+--    - add public.station_occupancy, written by the collector.
+--
+-- INSERT INTO public.schema_migrations (version, description, reason)
+-- VALUES ('004', 'Add station_occupancy',
+--   'Station occupancy was rebuilt on every processing run and /api/stations
+--   request by joining every minute of the day with every station. The
+--   collector now writes only the occupancy changes, reads are a range scan.');
+
+-- Run against the live database and restart the collector, a collector that
+-- found the table missing stops writing occupancy until it is restarted:
+--   psql -h localhost -p 5432 -U <user> -d <dbname> -f 004_station_occupancy_migration.sql
+--
+-- Days before the migration have no occupancy rows, they are still read
+-- from public.bikes.
+
+BEGIN;
+
+-- Same table as in create_bike_and_stations_db.sql
+CREATE TABLE IF NOT EXISTS public.station_occupancy (
+    id BIGSERIAL PRIMARY KEY,
+    station_number INTEGER NOT NULL,
+    bike_count INTEGER NOT NULL,
+    bike_list TEXT NOT NULL,
+    last_updated TIMESTAMPTZ NOT NULL,
+    city_id INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS station_occupancy_city_id_last_updated_idx ON public.station_occupancy (city_id, last_updated);
+
+COMMIT;
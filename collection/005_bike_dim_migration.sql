@@ -0,0 +1,152 @@
+-- Migration:
+--    - add public.bike_dim and public.bike_snapshots, the normalized storage of
+--      the raw bike snapshots written with DB_BIKE_STORAGE=normalized.
+--    - create_bikes_partitions() becomes a wrapper of create_daily_partitions().
+--    - copy all existing public.bikes rows into the new tables.
+--
+-- INSERT INTO public.schema_migrations (version, description, reason)
+-- VALUES ('005', 'Normalized bike snapshots',
+--   'Every bikes row repeated the bike number and city name as text and carried
+--   a serial id with its own primary key index. bike_snapshots refers to
+--   bike_dim by an integer id and keeps the city name in cities only, which
+--   roughly halves the size of the raw bike rows and their indexes.');
+
+-- Stop the collector first. Run against the live database:
+--   psql -h localhost -p 5432 -U <user> -d <dbname> -f 005_bike_dim_migration.sql
+-- then set DB_BIKE_STORAGE=normalized for the collector, the processor and the
+-- visualization and start them again.
+--
+-- public.bikes is kept. Empty it after the verification query looks right:
+--   TRUNCATE public.bikes;
+
+BEGIN;
+
+-- Same functions as in create_bike_and_stations_db.sql
+-- Daily partitions of a table partitioned like public.bikes, named
+-- <parent>_YYYYMMDD. Rows that landed in <parent>_default are moved over.
+CREATE OR REPLACE FUNCTION public.create_daily_partitions(parent TEXT, first_day DATE, days INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    partition_day DATE;
+    partition_name TEXT;
+    lower_bound TIMESTAMPTZ;
+    upper_bound TIMESTAMPTZ;
+    created INTEGER := 0;
+BEGIN
+    -- Several collectors may start at the same time
+    PERFORM pg_advisory_xact_lock(hashtext('public.create_daily_partitions.' || parent));
+
+    FOR offset_days IN 0 .. days - 1 LOOP
+        partition_day := first_day + offset_days;
+        partition_name := parent || '_' || to_char(partition_day, 'YYYYMMDD');
+        CONTINUE WHEN to_regclass('public.' || partition_name) IS NOT NULL;
+
+        lower_bound := partition_day::timestamp AT TIME ZONE 'UTC';
+        upper_bound := (partition_day + 1)::timestamp AT TIME ZONE 'UTC';
+
+        EXECUTE format(
+            'CREATE TABLE public.%I (LIKE public.%I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+            partition_name, parent
+        );
+        EXECUTE format(
+            'WITH moved AS (
+                DELETE FROM public.%I
+                WHERE last_updated >= $1 AND last_updated < $2
+                RETURNING *
+            )
+            INSERT INTO public.%I SELECT * FROM moved',
+            parent || '_default', partition_name
+        ) USING lower_bound, upper_bound;
+        EXECUTE format(
+            'ALTER TABLE public.%I ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+            parent, partition_name, lower_bound, upper_bound
+        );
+        created := created + 1;
+    END LOOP;
+
+    RETURN created;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.create_bikes_partitions(first_day DATE, days INTEGER)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+    SELECT public.create_daily_partitions('bikes', first_day, days);
+$$;
+
+-- Same tables as in create_bike_and_stations_db.sql
+CREATE TABLE IF NOT EXISTS public.bike_dim (
+    bike_id SERIAL PRIMARY KEY,
+    city_id INTEGER NOT NULL,
+    bike_number TEXT NOT NULL,
+    UNIQUE (city_id, bike_number)
+);
+
+CREATE TABLE IF NOT EXISTS public.bike_snapshots (
+    bike_id INTEGER NOT NULL,
+    city_id INTEGER NOT NULL,
+    station_number INTEGER,
+    station_uid INTEGER,
+    last_updated TIMESTAMPTZ NOT NULL,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    active BOOLEAN,
+    state TEXT,
+    bike_type TEXT
+) PARTITION BY RANGE (last_updated);
+
+CREATE TABLE IF NOT EXISTS public.bike_snapshots_default PARTITION OF public.bike_snapshots DEFAULT;
+
+CREATE INDEX IF NOT EXISTS bike_snapshots_city_id_last_updated_idx ON public.bike_snapshots (city_id, last_updated);
+
+CREATE OR REPLACE FUNCTION public.create_bike_snapshots_partitions(first_day DATE, days INTEGER)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+    SELECT public.create_daily_partitions('bike_snapshots', first_day, days);
+$$;
+
+INSERT INTO public.bike_dim (city_id, bike_number)
+SELECT DISTINCT city_id, bike_number
+FROM public.bikes
+ON CONFLICT DO NOTHING;
+
+SELECT public.create_bike_snapshots_partitions(
+    COALESCE(MIN((last_updated AT TIME ZONE 'UTC')::date), CURRENT_DATE),
+    COALESCE(MAX((last_updated AT TIME ZONE 'UTC')::date) - MIN((last_updated AT TIME ZONE 'UTC')::date) + 1, 0)
+)
+FROM public.bikes;
+
+INSERT INTO public.bike_snapshots (
+    bike_id, city_id, station_number, station_uid, last_updated,
+    latitude, longitude, active, state, bike_type
+)
+SELECT d.bike_id, b.city_id, b.station_number, b.station_uid, b.last_updated,
+       b.latitude, b.longitude, b.active, b.state, b.bike_type
+FROM public.bikes b
+JOIN public.bike_dim d ON d.city_id = b.city_id AND d.bike_number = b.bike_number
+ORDER BY b.last_updated, b.id;
+
+COMMIT;
+
+ANALYZE public.bike_dim;
+ANALYZE public.bike_snapshots;
+
+
+-- ============================================================
+-- VERIFICATION QUERIES (run after migration)
+-- ============================================================
+-- Row counts must match
+SELECT
+    (SELECT COUNT(*) FROM public.bikes) AS wide_rows,
+    (SELECT COUNT(*) FROM public.bike_snapshots) AS normalized_rows;
+
+-- Size of both layouts including indexes
+SELECT
+    pg_size_pretty(SUM(pg_total_relation_size(i.inhrelid)) FILTER (WHERE i.inhparent = 'public.bikes'::regclass)) AS wide,
+    pg_size_pretty(SUM(pg_total_relation_size(i.inhrelid)) FILTER (WHERE i.inhparent = 'public.bike_snapshots'::regclass)
+                   + pg_total_relation_size('public.bike_dim')) AS normalized
+FROM pg_inherits i;
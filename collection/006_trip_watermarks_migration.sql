@@ -0,0 +1,33 @@
+-- Migration:
+--    - add public.trip_watermarks and public.trip_bike_positions for the
+--      incremental trip processing.
+--
+-- INSERT INTO public.schema_migrations (version, description, reason)
+-- VALUES ('006', 'Add trip watermarks',
+--   'Trips were only processed at midnight for the whole previous day, so
+--   they showed up up to 24 h late. The incremental job processes the bike
+--   rows newer than a per-city watermark every few minutes and carries the
+--   last position of every bike over to its next run.');
+
+-- Run against the live database:
+--   psql -h localhost -p 5432 -U <user> -d <dbname> -f 006_trip_watermarks_migration.sql
+
+BEGIN;
+
+-- Same tables as in create_bike_and_stations_db.sql
+CREATE TABLE IF NOT EXISTS public.trip_watermarks (
+    city_id INTEGER PRIMARY KEY,
+    processed_until TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS public.trip_bike_positions (
+    city_id INTEGER NOT NULL,
+    bike_number TEXT NOT NULL,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    last_updated TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (city_id, bike_number)
+);
+
+COMMIT;
@@ -0,0 +1,33 @@
+-- Migration:
+--    - add public.station_occupancy_covers_day(), the check processing and
+--      the visualization API use to read a day from public.station_occupancy.
+--
+-- INSERT INTO public.schema_migrations (version, description, reason)
+-- VALUES ('007', 'Add station_occupancy_covers_day',
+--   'Processing and the API each checked only that the collector wrote
+--   occupancy since before the day started, so a day the collector stopped
+--   writing it part way through was read from incomplete occupancy rows.
+--   The check now also needs rows after the day and lives in one place.');
+
+-- Needs 004_station_occupancy_migration.sql. Run against the live database:
+--   psql -h localhost -p 5432 -U <user> -d <dbname> -f 007_station_occupancy_coverage_migration.sql
+--
+-- Until it ran, processing and the API read station occupancy from the raw
+-- bike rows.
+
+BEGIN;
+
+-- Same function as in create_bike_and_stations_db.sql
+CREATE OR REPLACE FUNCTION public.station_occupancy_covers_day(city INTEGER, day_start TIMESTAMPTZ, day_end TIMESTAMPTZ)
+RETURNS BOOLEAN
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT EXISTS (
+        SELECT 1 FROM public.station_occupancy WHERE city_id = city AND last_updated <= day_start
+    ) AND EXISTS (
+        SELECT 1 FROM public.station_occupancy WHERE city_id = city AND last_updated >= day_end
+    );
+$$;
+
+COMMIT;
@@ -1,5 +1,9 @@
+-- Bikes are range partitioned by UTC day on last_updated, one partition per
+-- day named bikes_YYYYMMDD. Partitions are created ahead of time by the
+-- collector with create_bikes_partitions(). Rows without a partition land in
+-- bikes_default and are moved once their partition is created.
 CREATE TABLE IF NOT EXISTS public.bikes (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     bike_number TEXT NOT NULL,
     latitude DOUBLE PRECISION NOT NULL,
     longitude DOUBLE PRECISION NOT NULL,
@@ -10,9 +14,130 @@ CREATE TABLE IF NOT EXISTS public.bikes (
     station_uid INTEGER,
     last_updated TIMESTAMPTZ NOT NULL,
     city_id INTEGER NOT NULL,
-    city_name TEXT NOT NULL
+    city_name TEXT NOT NULL,
+    PRIMARY KEY (id, last_updated)
+) PARTITION BY RANGE (last_updated);
+
+CREATE TABLE IF NOT EXISTS public.bikes_default PARTITION OF public.bikes DEFAULT;
+
+CREATE INDEX IF NOT EXISTS bikes_city_id_last_updated_idx ON public.bikes (city_id, last_updated);
+
+-- Daily partitions of a table partitioned like public.bikes, named
+-- <parent>_YYYYMMDD. Rows that landed in <parent>_default are moved over.
+CREATE OR REPLACE FUNCTION public.create_daily_partitions(parent TEXT, first_day DATE, days INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    partition_day DATE;
+    partition_name TEXT;
+    lower_bound TIMESTAMPTZ;
+    upper_bound TIMESTAMPTZ;
+    created INTEGER := 0;
+BEGIN
+    -- Several collectors may start at the same time
+    PERFORM pg_advisory_xact_lock(hashtext('public.create_daily_partitions.' || parent));
+
+    FOR offset_days IN 0 .. days - 1 LOOP
+        partition_day := first_day + offset_days;
+        partition_name := parent || '_' || to_char(partition_day, 'YYYYMMDD');
+        CONTINUE WHEN to_regclass('public.' || partition_name) IS NOT NULL;
+
+        lower_bound := partition_day::timestamp AT TIME ZONE 'UTC';
+        upper_bound := (partition_day + 1)::timestamp AT TIME ZONE 'UTC';
+
+        EXECUTE format(
+            'CREATE TABLE public.%I (LIKE public.%I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+            partition_name, parent
+        );
+        EXECUTE format(
+            'WITH moved AS (
+                DELETE FROM public.%I
+                WHERE last_updated >= $1 AND last_updated < $2
+                RETURNING *
+            )
+            INSERT INTO public.%I SELECT * FROM moved',
+            parent || '_default', partition_name
+        ) USING lower_bound, upper_bound;
+        EXECUTE format(
+            'ALTER TABLE public.%I ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+            parent, partition_name, lower_bound, upper_bound
+        );
+        created := created + 1;
+    END LOOP;
+
+    RETURN created;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.create_bikes_partitions(first_day DATE, days INTEGER)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+    SELECT public.create_daily_partitions('bikes', first_day, days);
+$$;
+
+-- Normalized storage of the raw bike snapshots, written instead of
+-- public.bikes with DB_BIKE_STORAGE=normalized. Every bike number is stored
+-- once per city in bike_dim, snapshots refer to it by bike_id and the city
+-- name is only in public.cities. Fixed width columns come first, so rows
+-- carry no alignment padding. Partitioned like public.bikes.
+CREATE TABLE IF NOT EXISTS public.bike_dim (
+    bike_id SERIAL PRIMARY KEY,
+    city_id INTEGER NOT NULL,
+    bike_number TEXT NOT NULL,
+    UNIQUE (city_id, bike_number)
 );
 
+CREATE TABLE IF NOT EXISTS public.bike_snapshots (
+    bike_id INTEGER NOT NULL,
+    city_id INTEGER NOT NULL,
+    station_number INTEGER,
+    station_uid INTEGER,
+    last_updated TIMESTAMPTZ NOT NULL,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    active BOOLEAN,
+    state TEXT,
+    bike_type TEXT
+) PARTITION BY RANGE (last_updated);
+
+CREATE TABLE IF NOT EXISTS public.bike_snapshots_default PARTITION OF public.bike_snapshots DEFAULT;
+
+CREATE INDEX IF NOT EXISTS bike_snapshots_city_id_last_updated_idx ON public.bike_snapshots (city_id, last_updated);
+
+CREATE OR REPLACE FUNCTION public.create_bike_snapshots_partitions(first_day DATE, days INTEGER)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+    SELECT public.create_daily_partitions('bike_snapshots', first_day, days);
+$$;
+
+-- Runs of consecutive snapshots in which a bike stayed at the same spot,
+-- written by the processing compaction job. valid_from and valid_to are the
+-- first and last snapshot of the run, ended_at is the next snapshot of the
+-- city after valid_to (NULL if the run lasted until the end of the compacted day).
+CREATE TABLE IF NOT EXISTS public.bike_intervals (
+    id BIGSERIAL PRIMARY KEY,
+    bike_number TEXT NOT NULL,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    active BOOLEAN,
+    state TEXT,
+    bike_type TEXT,
+    station_number INTEGER,
+    station_uid INTEGER,
+    valid_from TIMESTAMPTZ NOT NULL,
+    valid_to TIMESTAMPTZ NOT NULL,
+    ended_at TIMESTAMPTZ,
+    snapshots INTEGER NOT NULL,
+    city_id INTEGER NOT NULL,
+    city_name TEXT NOT NULL,
+    UNIQUE (city_id, bike_number, valid_from)
+);
+
+CREATE INDEX IF NOT EXISTS bike_intervals_city_id_valid_from_idx ON public.bike_intervals (city_id, valid_from);
+
 CREATE TABLE IF NOT EXISTS public.stations (
     id SERIAL PRIMARY KEY,
     uid INTEGER NOT NULL,
@@ -28,6 +153,40 @@ CREATE TABLE IF NOT EXISTS public.stations (
     city_name TEXT NOT NULL
 );
 
+CREATE INDEX IF NOT EXISTS stations_city_id_last_updated_idx ON public.stations (city_id, last_updated);
+
+-- Station bike counts, one row per station and snapshot in which its count
+-- changed, plus every station on the first snapshot of a local day.
+-- Written by the collector.
+CREATE TABLE IF NOT EXISTS public.station_occupancy (
+    id BIGSERIAL PRIMARY KEY,
+    station_number INTEGER NOT NULL,
+    bike_count INTEGER NOT NULL,
+    bike_list TEXT NOT NULL,
+    last_updated TIMESTAMPTZ NOT NULL,
+    city_id INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS station_occupancy_city_id_last_updated_idx ON public.station_occupancy (city_id, last_updated);
+
+-- True if the collector wrote the station occupancy of the city for the
+-- whole day: it was writing rows before the day started and was still
+-- writing after it ended. The collector writes every station on the first
+-- snapshot of a local day, so the row after the day shows up with the first
+-- poll after midnight. Processing and the visualization API read a covered
+-- day from public.station_occupancy, other days from the raw bike rows.
+CREATE OR REPLACE FUNCTION public.station_occupancy_covers_day(city INTEGER, day_start TIMESTAMPTZ, day_end TIMESTAMPTZ)
+RETURNS BOOLEAN
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT EXISTS (
+        SELECT 1 FROM public.station_occupancy WHERE city_id = city AND last_updated <= day_start
+    ) AND EXISTS (
+        SELECT 1 FROM public.station_occupancy WHERE city_id = city AND last_updated >= day_end
+    );
+$$;
+
 CREATE TABLE IF NOT EXISTS public.cities (
     id SERIAL PRIMARY KEY,
     city_id INTEGER NOT NULL UNIQUE,
@@ -60,4 +219,22 @@ CREATE TABLE IF NOT EXISTS public.trips (
     duration_seconds DOUBLE PRECISION NOT NULL,
     route_id INTEGER REFERENCES public.routes(id),
     UNIQUE (bike_number, city_id, start_time)
-);
\ No newline at end of file
+);
+
+-- Incremental trip processing (nextbike_processing.incremental): raw bike
+-- rows up to processed_until are turned into trips, the last position of
+-- every bike is carried over to the next run
+CREATE TABLE IF NOT EXISTS public.trip_watermarks (
+    city_id INTEGER PRIMARY KEY,
+    processed_until TIMESTAMPTZ NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS public.trip_bike_positions (
+    city_id INTEGER NOT NULL,
+    bike_number TEXT NOT NULL,
+    latitude DOUBLE PRECISION NOT NULL,
+    longitude DOUBLE PRECISION NOT NULL,
+    last_updated TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (city_id, bike_number)
+);
@@ -0,0 +1,222 @@
+"""
+Offline collector throughput against a local fake Nextbike API.
+
+Every scenario starts benchmarks.fake_nextbike_server in its own process
+and runs the real fetch -> parse -> DatabaseClient path of the collector
+for a number of back-to-back ticks in another one, so the peak RSS is that
+of the collector alone. Reports polls/s, rows/s, the p50/p99 tick duration
+and the peak RSS per scenario.
+
+Run from collection/data_collection:
+    python -m benchmarks.bench_collector --cities 1 10 --bikes 1000 10000
+    python -m benchmarks.bench_collector --cities 200 --bikes 1000 --latency-ms 80 --stream --columnar
+    python -m benchmarks.bench_collector --backend parquet --mode sequential
+
+The default `null` backend builds every row like a writer would and drops
+it, `parquet` writes to a temporary folder and `postgres` uses the DB_*
+settings from .env.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import math
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.fake_nextbike_server import FakeNextbikeServer, PayloadSource
+from columnar import EntryRows, entry_rows
+from database.base import AbstractDatabaseClient, DatabaseClient, register_backend
+from query_nextbike import AppConfig, Collector, NextbikeAPI, NextbikeCLI, new_async_api, poll_cities
+
+
+@register_backend("null")
+class NullClient(AbstractDatabaseClient):
+    """Materialize the rows of every write and discard them"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def insert_city_information(self, city):
+        city.as_tuple()
+
+    def insert_bike_entries(self, bike_entries):
+        self._consume(bike_entries)
+
+    def insert_station_entries(self, station_entries):
+        self._consume(station_entries)
+
+    def insert_station_occupancy(self, occupancy_rows):
+        # Plain row tuples, not entries
+        self._consume(EntryRows(occupancy_rows))
+
+    @staticmethod
+    def _consume(entries):
+        for _ in entry_rows(entries):
+            pass
+
+    def get_last_station_syncs(self, city_ids):
+        return {}
+
+    def get_last_city_syncs(self, city_ids):
+        return {}
+
+
+def _serve(bikes, latency_seconds, payload_path, url_pipe, stop):
+    recorded = None
+    if payload_path:
+        with open(payload_path, "rb") as payload:
+            recorded = payload.read()
+    server = FakeNextbikeServer(PayloadSource(bikes, recorded), latency_seconds)
+    server.start()
+    url_pipe.send(server.url)
+    stop.wait()
+    server.stop()
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile, enough for a handful of ticks"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def _collector(options, url):
+    os.environ.update({
+        "NEXTBIKE_API_URL": url,
+        "DB_TYPE": options["backend"],
+        "FETCH_CONCURRENCY": str(options["concurrency"]),
+        "PARQUET_DIR": options["parquet_dir"],
+        "METRICS_PORT": "0",
+        "METRICS_JSON_PATH": "",
+    })
+    args = ["--city-ids", *map(str, options["city_ids"]), "--save", "--daemon"]
+    args += [flag for flag in ("--stream", "--columnar", "--delta") if options[flag.strip("-")]]
+    cli = NextbikeCLI(args)
+    config = AppConfig(cli.city_ids)
+    return Collector(cli, config, DatabaseClient(config))
+
+
+def _sequential_tick(collector):
+    config = collector.config
+    for city_id in config.city_ids:
+        api = NextbikeAPI(
+            city_id,
+            timeout=config.http_timeout_seconds,
+            metrics=collector.metrics,
+            base_url=config.nextbike_api_url,
+        )
+        try:
+            if collector.cli.stream:
+                collector.store_snapshot(city_id, *api.fetch_snapshot_streamed(collector.cli.columnar))
+            else:
+                collector.handle_city(city_id, api.fetch_data())
+        except Exception as error:
+            print(f"City {city_id} failed: {error!r}")
+
+
+async def _run_ticks(collector, options):
+    durations = []
+    async with new_async_api(collector.config, collector.metrics) as api:
+        for tick in range(options["warmup"] + options["ticks"]):
+            start = time.perf_counter()
+            if options["mode"] == "sequential":
+                _sequential_tick(collector)
+            else:
+                await poll_cities(collector, api)
+            if tick >= options["warmup"]:
+                durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _measure(options, url, results):
+    collector = _collector(options, url)
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            durations = asyncio.run(_run_ticks(collector, options))
+    finally:
+        with contextlib.redirect_stdout(output):
+            collector.close()
+
+    cities = collector.metrics.snapshot()["cities"]
+    rows = sum(sum(city.get("rows_written", {}).values()) for city in cities.values())
+    failures = sum(sum(city.get("failures", {}).values()) for city in cities.values())
+    ticks = options["warmup"] + options["ticks"]
+    elapsed = sum(durations)
+    results.put({
+        "polls_per_second": len(options["city_ids"]) * len(durations) / elapsed,
+        # rows_written also counts the warmup ticks
+        "rows_per_second": rows * len(durations) / ticks / elapsed,
+        "p50": percentile(durations, 0.5),
+        "p99": percentile(durations, 0.99),
+        # KiB on Linux
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "failures": failures,
+    })
+
+
+def run_scenario(options) -> dict:
+    context = multiprocessing.get_context("spawn")
+    receive_url, send_url = context.Pipe(duplex=False)
+    stop = context.Event()
+    server = context.Process(
+        target=_serve,
+        args=(options["bikes"], options["latency_ms"] / 1000, options["payload"], send_url, stop),
+    )
+    server.start()
+    try:
+        url = receive_url.recv()
+        results = context.Queue()
+        collector = context.Process(target=_measure, args=(options, url, results))
+        collector.start()
+        result = results.get()
+        collector.join()
+        return result
+    finally:
+        stop.set()
+        server.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, nargs="+", default=[1, 10], help="City counts to run")
+    parser.add_argument("--bikes", type=int, nargs="+", default=[1000, 10000], help="Bikes per city to run")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay of every fake API response")
+    parser.add_argument("--payload", help="Recorded nextbike-live.json to serve instead of synthetic cities")
+    parser.add_argument("--ticks", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="Ticks run before measuring")
+    parser.add_argument("--mode", choices=("daemon", "sequential"), default="daemon",
+                        help="Concurrent AsyncNextbikeAPI ticks or one NextbikeAPI per city")
+    parser.add_argument("--backend", choices=("null", "parquet", "postgres"), default="null")
+    parser.add_argument("--concurrency", type=int, default=8, help="FETCH_CONCURRENCY of the daemon mode")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--columnar", action="store_true")
+    parser.add_argument("--delta", action="store_true")
+    args = parser.parse_args()
+    if args.delta and args.columnar:
+        parser.error("--delta cannot be combined with --columnar")
+
+    flags = " ".join(f"--{flag}" for flag in ("stream", "columnar", "delta") if getattr(args, flag))
+    print(f"mode {args.mode}, backend {args.backend}, latency {args.latency_ms:g} ms, {args.ticks} ticks {flags}")
+    print(f"{'cities':>6} {'bikes':>7} {'polls/s':>9} {'rows/s':>11} {'p50 s':>8} {'p99 s':>8} {'RSS MiB':>8} {'failed':>6}")
+    with tempfile.TemporaryDirectory() as parquet_dir:
+        for cities in args.cities:
+            for bikes in args.bikes:
+                options = dict(
+                    vars(args),
+                    city_ids=list(range(1, cities + 1)),
+                    bikes=bikes,
+                    parquet_dir=parquet_dir,
+                )
+                result = run_scenario(options)
+                print(
+                    f"{cities:>6} {bikes:>7} {result['polls_per_second']:>9.1f} {result['rows_per_second']:>11.0f} "
+                    f"{result['p50']:>8.3f} {result['p99']:>8.3f} {result['peak_rss_mib']:>8.1f} {result['failures']:>6}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compare dataclass and columnar snapshot parsing.
+
+Run from collection/data_collection:
+    python -m benchmarks.bench_parse --bikes 10000
+"""
+import argparse
+import datetime
+import gc
+import sys
+import time
+
+from benchmarks.payloads import synthetic_city_payload
+from columnar import BikeColumns, StationColumns, entry_rows
+from query_nextbike import Bike, NextbikeAPI, Station
+
+
+def parse_dataclasses(places, timestamp):
+    bikes = Bike.bike_entries_from_place(places, 1, "Bench", timestamp)
+    stations = Station.build_station_entries(places, 1, "Bench", timestamp)
+    return bikes, stations
+
+
+def parse_columnar(places, timestamp):
+    bikes = BikeColumns.from_places(places, 1, "Bench", timestamp)
+    stations = StationColumns.from_places(places, 1, "Bench", timestamp)
+    return bikes, stations
+
+
+def measure(parse, places, timestamp, repeats):
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        bikes, stations = parse(places, timestamp)
+        # Consume the rows like the COPY writer does
+        for _ in entry_rows(bikes):
+            pass
+        durations.append(time.perf_counter() - start)
+        del bikes, stations
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    bikes, stations = parse(places, timestamp)
+    blocks_retained = sys.getallocatedblocks() - blocks_before
+
+    return min(durations), blocks_retained, len(bikes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bikes", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    payload = synthetic_city_payload(1, args.bikes)
+    places = NextbikeAPI.extract_places(payload)
+    timestamp = datetime.datetime.now(datetime.timezone.utc)
+
+    print(f"{'parser':<12} {'ms / 10k bikes':>15} {'objects / 10k bikes':>20}")
+    for name, parse in (("dataclass", parse_dataclasses), ("columnar", parse_columnar)):
+        seconds, blocks, bikes = measure(parse, places, timestamp, args.repeats)
+        scale = 10000 / bikes
+        print(f"{name:<12} {seconds * 1000 * scale:>15.2f} {blocks * scale:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Compare peak memory of parsing a whole nextbike-live.json response with
+json.loads() against the streaming parser.
+
+Run from collection/data_collection:
+    python -m benchmarks.bench_stream --bikes 50000
+"""
+import argparse
+import contextlib
+import io
+import json
+import tracemalloc
+
+import ijson
+from benchmarks.payloads import synthetic_city_payload
+from query_nextbike import parse_nextbike_data, parse_nextbike_stream
+
+
+def parse_loaded(body: bytes, columnar: bool):
+    return parse_nextbike_data(json.loads(body), columnar)
+
+
+def parse_streamed(body: bytes, columnar: bool):
+    return parse_nextbike_stream(ijson.parse(io.BytesIO(body), use_float=True), columnar)
+
+
+def peak_mib(parse, body, columnar):
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        parse(body, columnar)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bikes", type=int, default=50000)
+    args = parser.parse_args()
+
+    body = json.dumps(synthetic_city_payload(1, args.bikes)).encode()
+    print(f"response: {len(body) / 2**20:.1f} MiB, {args.bikes} bikes")
+    print(f"{'parser':<20} {'peak MiB':>10}")
+    for columnar in (False, True):
+        for name, parse in (("json.loads", parse_loaded), ("stream", parse_streamed)):
+            label = f"{name}{' columnar' if columnar else ''}"
+            print(f"{label:<20} {peak_mib(parse, body, columnar):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Local stand-in for the Nextbike API, serving nextbike-live.json payloads
+for offline benchmarks.
+
+Every city gets a synthetic payload with the configured number of bikes,
+or the same recorded response if --payload is given. Responses are delayed
+by --latency-ms to imitate the round trip to the real API.
+
+Run from collection/data_collection:
+    python -m benchmarks.fake_nextbike_server --bikes 10000 --latency-ms 80
+and point the collector at it:
+    NEXTBIKE_API_URL=http://127.0.0.1:8089/maps/nextbike-live.json python3 query_nextbike.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.payloads import synthetic_city_payload
+
+API_PATH = "/maps/nextbike-live.json"
+
+
+class PayloadSource:
+    """
+    Response bodies per city id.
+
+    The places of a synthetic city only depend on the bike count, so they
+    are serialized once and every city gets its own header around them.
+    200 cities of 50k bikes would otherwise keep gigabytes of payloads.
+    """
+
+    def __init__(self, bikes: int = 1000, recorded: bytes | None = None):
+        self.recorded = recorded
+        if recorded is None:
+            country = synthetic_city_payload(0, bikes)["countries"][0]
+            self._places = json.dumps(country.pop("cities")[0]["places"]).encode()
+            self._country = country
+
+    def body(self, city_id: int) -> bytes:
+        if self.recorded is not None:
+            return self.recorded
+        country = dict(self._country, cities=[{"uid": city_id, "name": f"City {city_id}", "places": None}])
+        head, tail = json.dumps({"countries": [country]}).encode().split(b"null")
+        return head + self._places + tail
+
+
+class FakeNextbikeServer:
+    """Threaded HTTP server answering GET /maps/nextbike-live.json?city=<id>"""
+
+    def __init__(self, source: PayloadSource, latency_seconds: float = 0, port: int = 0, host: str = "127.0.0.1"):
+        self.source = source
+        self.latency_seconds = latency_seconds
+        self.requests_served = 0
+        counter_lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(handler):
+                url = urlsplit(handler.path)
+                city = parse_qs(url.query).get("city", [""])[0]
+                if url.path != API_PATH or not city.isdigit():
+                    handler.send_error(404)
+                    return
+                if self.latency_seconds:
+                    time.sleep(self.latency_seconds)
+                body = self.source.body(int(city))
+                handler.send_response(200)
+                handler.send_header("Content-Type", "application/json")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+                with counter_lock:
+                    self.requests_served += 1
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-nextbike", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{API_PATH}"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--bikes", type=int, default=1000, help="Bikes per synthetic city")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay before every response")
+    parser.add_argument("--payload", help="Recorded nextbike-live.json to serve for every city")
+    args = parser.parse_args()
+
+    recorded = None
+    if args.payload:
+        with open(args.payload, "rb") as payload:
+            recorded = payload.read()
+    server = FakeNextbikeServer(PayloadSource(args.bikes, recorded), args.latency_ms / 1000, args.port, args.host)
+    print(f"Serving {server.url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
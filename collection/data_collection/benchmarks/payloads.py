@@ -0,0 +1,62 @@
+"""Synthetic nextbike-live.json payloads for benchmarks"""
+import random
+
+
+def synthetic_city_payload(city_id: int, bikes: int, stations: int | None = None, seed: int = 0) -> dict:
+    """
+    Build a response shaped like the Nextbike API for one city.
+    About two thirds of the bikes are parked at stations, the rest are
+    free-floating places with one bike each.
+    """
+    rng = random.Random(seed + city_id)
+    if stations is None:
+        stations = max(1, bikes // 10)
+
+    places = []
+    for number in range(stations):
+        places.append({
+            "uid": city_id * 100000 + number,
+            "lat": 50.5 + rng.random() / 10,
+            "lng": 8.6 + rng.random() / 10,
+            "bike": False,
+            "name": f"Station {number}",
+            "number": 1000 + number,
+            "spot": True,
+            "maintenance": False,
+            "terminal_type": "sign",
+            "bike_list": [],
+        })
+
+    for bike_number in range(bikes):
+        bike = {
+            "number": str(city_id * 100000 + bike_number),
+            "bike_type": 150,
+            "active": True,
+            "state": "ok",
+        }
+        if places and rng.random() < 2 / 3:
+            places[rng.randrange(stations)]["bike_list"].append(bike)
+        else:
+            places.append({
+                "uid": city_id * 1000000 + bike_number,
+                "lat": 50.5 + rng.random() / 10,
+                "lng": 8.6 + rng.random() / 10,
+                "bike": True,
+                "name": f"BIKE {bike['number']}",
+                "number": 0,
+                "spot": False,
+                "bike_list": [bike],
+            })
+
+    return {
+        "countries": [
+            {
+                "lat": 50.58,
+                "lng": 8.67,
+                "timezone": "Europe/Berlin",
+                "set_point_bikes": bikes,
+                "available_bikes": bikes,
+                "cities": [{"uid": city_id, "name": f"City {city_id}", "places": places}],
+            }
+        ]
+    }
@@ -0,0 +1,165 @@
+import datetime
+from array import array
+from itertools import repeat
+
+
+class BikeColumns:
+    """
+    All bikes of one snapshot, stored column by column.
+    Parsing fills plain lists and float arrays in a single pass over the
+    places instead of creating one Bike dataclass per bike. Values shared by
+    every bike of a place or of the snapshot are stored only once.
+    """
+
+    __slots__ = (
+        "bike_number", "latitude", "longitude", "active", "state", "bike_type",
+        "station_number", "station_uid", "last_updated", "city_id", "city_name",
+    )
+
+    def __init__(self, city_id: int, city_name: str, last_updated: datetime.datetime):
+        self.bike_number = []
+        self.latitude = array("d")
+        self.longitude = array("d")
+        self.active = []
+        self.state = []
+        self.bike_type = []
+        self.station_number = []
+        self.station_uid = []
+        self.last_updated = last_updated
+        self.city_id = city_id
+        self.city_name = city_name
+
+    @classmethod
+    def from_places(
+        cls,
+        places: list[dict],
+        city_id: int,
+        city_name: str,
+        timestamp: datetime.datetime,
+    ):
+        columns = cls(city_id, city_name, timestamp)
+        columns.add_places(places)
+        return columns
+
+    def add_places(self, places):
+        add_number = self.bike_number.append
+        add_active = self.active.append
+        add_state = self.state.append
+        add_type = self.bike_type.append
+
+        for place in places:
+            bike_list = place.get("bike_list")
+            if not bike_list:
+                continue
+
+            count = len(bike_list)
+            self.latitude.extend(repeat(place.get("lat", 0), count))
+            self.longitude.extend(repeat(place.get("lng", 0), count))
+            self.station_number.extend(repeat(place.get("number", 0), count))
+            self.station_uid.extend(repeat(place.get("uid", 0), count))
+
+            for bike in bike_list:
+                add_number(bike.get("number", ""))
+                add_active(bike.get("active", None))
+                add_state(bike.get("state", ""))
+                add_type(bike.get("bike_type", ""))
+
+    def __len__(self):
+        return len(self.bike_number)
+
+    def rows(self):
+        """Rows in the column order of Bike.as_tuple()"""
+        count = len(self)
+        return zip(
+            self.bike_number,
+            self.latitude,
+            self.longitude,
+            self.active,
+            self.state,
+            self.bike_type,
+            self.station_number,
+            self.station_uid,
+            repeat(self.last_updated, count),
+            repeat(self.city_id, count),
+            repeat(self.city_name, count),
+        )
+
+
+class StationColumns:
+    """All stations of one snapshot, stored column by column"""
+
+    __slots__ = (
+        "uid", "latitude", "longitude", "name", "spot", "station_number",
+        "maintenance", "terminal_type", "last_updated", "city_id", "city_name",
+    )
+
+    def __init__(self, city_id: int, city_name: str, last_updated: datetime.datetime):
+        self.uid = []
+        self.latitude = array("d")
+        self.longitude = array("d")
+        self.name = []
+        self.spot = []
+        self.station_number = []
+        self.maintenance = []
+        self.terminal_type = []
+        self.last_updated = last_updated
+        self.city_id = city_id
+        self.city_name = city_name
+
+    @classmethod
+    def from_places(
+        cls,
+        places: list[dict],
+        city_id: int,
+        city_name: str,
+        timestamp: datetime.datetime,
+    ):
+        columns = cls(city_id, city_name, timestamp)
+        columns.add_places(places)
+        return columns
+
+    def add_places(self, places):
+        for place in places:
+            if place.get("bike") is not False:
+                continue
+            self.uid.append(place.get("uid", 0))
+            self.latitude.append(place.get("lat", 0))
+            self.longitude.append(place.get("lng", 0))
+            self.name.append(place.get("name", "Unknown"))
+            self.spot.append(place.get("spot", None))
+            self.station_number.append(place.get("number", 0))
+            self.maintenance.append(place.get("maintenance", None))
+            self.terminal_type.append(place.get("terminal_type", "Unknown"))
+
+    def __len__(self):
+        return len(self.uid)
+
+    def rows(self):
+        """Rows in the column order of Station.as_tuple()"""
+        count = len(self)
+        return zip(
+            self.uid,
+            self.latitude,
+            self.longitude,
+            self.name,
+            self.spot,
+            self.station_number,
+            self.maintenance,
+            self.terminal_type,
+            repeat(self.last_updated, count),
+            repeat(self.city_id, count),
+            repeat(self.city_name, count),
+        )
+
+
+class EntryRows(list):
+    """Entries that already are rows in as_tuple() order, e.g. replayed from the spool"""
+
+
+def entry_rows(entries):
+    """Database rows of columnar entries or of a list of Bike/Station dataclasses"""
+    if isinstance(entries, (BikeColumns, StationColumns)):
+        return entries.rows()
+    if isinstance(entries, EntryRows):
+        return iter(entries)
+    return (entry.as_tuple() for entry in entries)
@@ -1,2 +1,2 @@
 # Ensure automatic backend registration
-from database import postgres
+from database import parquet, postgres
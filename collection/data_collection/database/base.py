@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 
 # ---------- registry utils ----------
 _DATABASE_BACKENDS = {}
@@ -30,6 +31,18 @@ class AbstractDatabaseClient(ABC):
     def insert_station_entries(self, station_entries):
         pass
 
+    @abstractmethod
+    def insert_station_occupancy(self, occupancy_rows):
+        pass
+
+    @contextmanager
+    def transaction(self):
+        """Group the writes of one poll. Backends without transactions just run them."""
+        yield self
+
+    def close(self):
+        pass
+
 
 class DatabaseClient:
     def __init__(self, config):
@@ -0,0 +1,260 @@
+import datetime
+import os
+import threading
+import time
+
+from columnar import BikeColumns, EntryRows, StationColumns, entry_rows
+from database.base import AbstractDatabaseClient, register_backend
+from database.postgres import BIKE_COLUMNS, STATION_COLUMNS
+from occupancy import OCCUPANCY_COLUMNS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, only needed for DB_TYPE=parquet
+    pa = None
+    pq = None
+
+CITY_COLUMNS = (
+    "city_id", "city_name", "timezone", "latitude", "longitude",
+    "set_point_bikes", "available_bikes", "last_updated",
+)
+# Files being written are hidden from readers: pyarrow datasets skip names
+# starting with "." and the file has no footer before it is closed
+IN_PROGRESS_PREFIX = "."
+IN_PROGRESS_SUFFIX = ".inprogress"
+
+
+def _schemas():
+    timestamp = pa.timestamp("us", tz="UTC")
+    return {
+        "bikes": pa.schema([
+            ("bike_number", pa.string()),
+            ("latitude", pa.float64()),
+            ("longitude", pa.float64()),
+            ("active", pa.bool_()),
+            ("state", pa.string()),
+            ("bike_type", pa.string()),
+            ("station_number", pa.int32()),
+            ("station_uid", pa.int32()),
+            ("last_updated", timestamp),
+            ("city_id", pa.int32()),
+            ("city_name", pa.string()),
+        ]),
+        "stations": pa.schema([
+            ("uid", pa.int32()),
+            ("latitude", pa.float64()),
+            ("longitude", pa.float64()),
+            ("name", pa.string()),
+            ("spot", pa.bool_()),
+            ("station_number", pa.int32()),
+            ("maintenance", pa.bool_()),
+            ("terminal_type", pa.string()),
+            ("last_updated", timestamp),
+            ("city_id", pa.int32()),
+            ("city_name", pa.string()),
+        ]),
+        "station_occupancy": pa.schema([
+            ("station_number", pa.int32()),
+            ("bike_count", pa.int32()),
+            ("bike_list", pa.string()),
+            ("last_updated", timestamp),
+            ("city_id", pa.int32()),
+        ]),
+        "cities": pa.schema([
+            ("city_id", pa.int32()),
+            ("city_name", pa.string()),
+            ("timezone", pa.string()),
+            ("latitude", pa.float64()),
+            ("longitude", pa.float64()),
+            ("set_point_bikes", pa.int32()),
+            ("available_bikes", pa.int32()),
+            ("last_updated", timestamp),
+        ]),
+    }
+
+
+def _utc_hour(timestamp: datetime.datetime) -> datetime.datetime:
+    return timestamp.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+@register_backend("parquet")
+class ParquetClient(AbstractDatabaseClient):
+    """
+    Write snapshots to compressed Parquet files instead of a database.
+
+    Layout: PARQUET_DIR/<table>/city_id=<id>/date=<YYYY-MM-DD>/<table>_<YYYYMMDD>T<HH>.parquet
+    with one file per table, city and UTC hour. Every write becomes one row
+    group, so readers can skip row groups by the min/max statistics of
+    last_updated. The open file is written as `.<name>.inprogress`, hidden
+    from dataset readers, and renamed once the hour is over, the client is
+    closed or it was open for `parquet_roll_seconds`. Further files of the
+    same hour get a `_<n>` suffix. A crash loses the open files only.
+    """
+
+    def __init__(self, config):
+        if pa is None:
+            raise ImportError("DB_TYPE=parquet needs pyarrow: pip install pyarrow")
+        self.config = config
+        self.root = config.parquet_dir
+        self.compression = config.parquet_compression
+        self.roll_seconds = config.parquet_roll_seconds
+        self.schemas = _schemas()
+        self._writers = {}
+        self._lock = threading.Lock()
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(IN_PROGRESS_SUFFIX):
+                    # Without a footer, its rows cannot be read back
+                    print(f"Skipping unfinished {os.path.join(directory, name)} of a previous run, its rows are lost")
+
+    # ----- WRITES -----
+    def insert_city_information(self, city):
+        self._write("cities", CITY_COLUMNS, EntryRows([city.as_tuple()]))
+
+    def insert_bike_entries(self, bike_entries):
+        self._write("bikes", BIKE_COLUMNS, bike_entries)
+
+    def insert_station_entries(self, station_entries):
+        self._write("stations", STATION_COLUMNS, station_entries)
+
+    def insert_station_occupancy(self, occupancy_rows):
+        self._write("station_occupancy", OCCUPANCY_COLUMNS, EntryRows(occupancy_rows))
+
+    def _write(self, table, columns, entries):
+        with self._lock:
+            for (city_id, hour), batch in self._batches(table, columns, entries):
+                self._writer(table, city_id, hour).write_table(batch)
+
+    def _batches(self, table, columns, entries):
+        """Arrow tables of the entries, one per (city_id, UTC hour)"""
+        schema = self.schemas[table]
+        if isinstance(entries, (BikeColumns, StationColumns)):
+            # All entries of a snapshot share city and timestamp
+            if not len(entries):
+                return []
+            key = (entries.city_id, _utc_hour(entries.last_updated))
+            return [(key, self._table_from_columns(schema, columns, entries))]
+
+        groups = {}
+        time_index = columns.index("last_updated")
+        city_index = columns.index("city_id")
+        for row in entry_rows(entries):
+            key = (row[city_index], _utc_hour(row[time_index]))
+            groups.setdefault(key, []).append(row)
+        return [
+            (key, self._table_from_rows(schema, rows))
+            for key, rows in groups.items()
+        ]
+
+    @staticmethod
+    def _table_from_columns(schema, columns, entries):
+        count = len(entries)
+        arrays = []
+        for column, field in zip(columns, schema):
+            value = getattr(entries, column)
+            if column in ("last_updated", "city_id", "city_name"):
+                arrays.append(pa.array([value] * count, type=field.type))
+            else:
+                arrays.append(pa.array(_coerce(field, value), type=field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    @staticmethod
+    def _table_from_rows(schema, rows):
+        arrays = [
+            pa.array(_coerce(field, values), type=field.type)
+            for field, values in zip(schema, zip(*rows))
+        ]
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def _writer(self, table, city_id, hour):
+        key = (table, city_id)
+        current = self._writers.get(key)
+        if current is not None and current[0] == hour and time.monotonic() - current[3] < self.roll_seconds:
+            return current[1]
+        if current is not None:
+            self._close_writer(key)
+
+        path = self.file_path(table, city_id, hour)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part = 0
+        # Same hour again after a roll or a restart, keep what was written before
+        while os.path.exists(path) or os.path.exists(_in_progress_path(path)):
+            part += 1
+            path = self.file_path(table, city_id, hour).replace(".parquet", f"_{part}.parquet")
+        writer = pq.ParquetWriter(
+            _in_progress_path(path),
+            self.schemas[table],
+            compression=self.compression,
+            write_statistics=True,
+        )
+        self._writers[key] = (hour, writer, path, time.monotonic())
+        return writer
+
+    def _close_writer(self, key):
+        _, writer, path, _ = self._writers.pop(key)
+        writer.close()
+        os.replace(_in_progress_path(path), path)
+
+    def file_path(self, table, city_id, hour: datetime.datetime) -> str:
+        return os.path.join(
+            self.root,
+            table,
+            f"city_id={city_id}",
+            f"date={hour:%Y-%m-%d}",
+            f"{table}_{hour:%Y%m%dT%H}.parquet",
+        )
+
+    def close(self):
+        with self._lock:
+            for key in list(self._writers):
+                self._close_writer(key)
+
+    # ----- SYNC TIMESTAMPS -----
+    def get_last_station_syncs(self, city_ids) -> dict[int, datetime.datetime]:
+        return self._last_written("stations", city_ids)
+
+    def get_last_city_syncs(self, city_ids) -> dict[int, datetime.datetime]:
+        return self._last_written("cities", city_ids)
+
+    def _last_written(self, table, city_ids) -> dict[int, datetime.datetime]:
+        """Newest last_updated per city, read from the row group statistics only"""
+        syncs = {}
+        for city_id in city_ids:
+            city_dir = os.path.join(self.root, table, f"city_id={city_id}")
+            if not os.path.isdir(city_dir):
+                continue
+            dates = sorted(os.listdir(city_dir))
+            for date_dir in reversed(dates):
+                directory = os.path.join(city_dir, date_dir)
+                files = sorted(name for name in os.listdir(directory) if name.endswith(".parquet"))
+                latest = [_max_last_updated(os.path.join(directory, name)) for name in files]
+                latest = [value for value in latest if value is not None]
+                if latest:
+                    syncs[city_id] = max(latest)
+                    break
+        return syncs
+
+
+def _in_progress_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, IN_PROGRESS_PREFIX + name + IN_PROGRESS_SUFFIX)
+
+
+def _max_last_updated(path):
+    metadata = pq.ParquetFile(path).metadata
+    column = metadata.schema.names.index("last_updated")
+    latest = None
+    for index in range(metadata.num_row_groups):
+        statistics = metadata.row_group(index).column(column).statistics
+        if statistics is not None and statistics.has_min_max:
+            if latest is None or statistics.max > latest:
+                latest = statistics.max
+    return latest
+
+
+def _coerce(field, values):
+    """The API returns some text fields (e.g. bike_type) as numbers"""
+    if pa.types.is_string(field.type):
+        return [value if value is None or isinstance(value, str) else str(value) for value in values]
+    return values
@@ -1,7 +1,124 @@
 import datetime
+import threading
+from contextlib import contextmanager
 
-import psycopg
+from psycopg import errors
+from psycopg_pool import ConnectionPool
+from columnar import entry_rows
 from database.base import AbstractDatabaseClient, register_backend
+from occupancy import OCCUPANCY_COLUMNS
+
+BIKE_COLUMNS = (
+    "bike_number", "latitude", "longitude", "active", "state", "bike_type",
+    "station_number", "station_uid", "last_updated", "city_id", "city_name",
+)
+BIKE_COPY_TYPES = (
+    "text", "float8", "float8", "bool", "text", "text",
+    "int4", "int4", "timestamptz", "int4", "text",
+)
+
+STATION_COLUMNS = (
+    "uid", "latitude", "longitude", "name", "spot", "station_number",
+    "maintenance", "terminal_type", "last_updated", "city_id", "city_name",
+)
+STATION_COPY_TYPES = (
+    "int4", "float8", "float8", "text", "bool", "int4",
+    "bool", "text", "timestamptz", "int4", "text",
+)
+
+OCCUPANCY_COPY_TYPES = ("int4", "int4", "text", "timestamptz", "int4")
+
+# DB_BIKE_STORAGE=normalized: the bike number becomes a bike_id of the
+# bike dimension table and the city name is left out
+SNAPSHOT_COLUMNS = (
+    "bike_id", "city_id", "station_number", "station_uid", "last_updated",
+    "latitude", "longitude", "active", "state", "bike_type",
+)
+SNAPSHOT_COPY_TYPES = (
+    "int4", "int4", "int4", "int4", "timestamptz",
+    "float8", "float8", "bool", "text", "text",
+)
+# Positions in Bike.as_tuple()
+BIKE_NUMBER_INDEX = 0
+BIKE_CITY_ID_INDEX = 9
+
+INGEST_MODES = ("copy", "copy_staging", "insert")
+BIKE_STORAGES = ("wide", "normalized")
+
+
+class BikeIdCache:
+    """
+    bike_id of every (city_id, bike_number) in the bike dimension table.
+
+    The ids of a city are loaded on its first write, bikes seen for the
+    first time are added to the table in the transaction of the write.
+    Those ids are only kept once the transaction commits: after a rollback
+    their rows are gone and the cache must not hand them out.
+    """
+
+    def __init__(self, table_name):
+        self.table_name = table_name
+        self._ids = {}
+        self._loaded_cities = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def _pending(self) -> dict:
+        if not hasattr(self._local, "pending"):
+            self._local.pending = {}
+        return self._local.pending
+
+    def bike_ids(self, cursor, rows) -> list[int]:
+        """bike_id of every bike row, in the order of `rows`"""
+        keys = [(row[BIKE_CITY_ID_INDEX], str(row[BIKE_NUMBER_INDEX])) for row in rows]
+        pending = self._pending
+
+        with self._lock:
+            new_cities = {city_id for city_id, _ in keys} - self._loaded_cities
+        if new_cities:
+            cursor.execute(
+                f"SELECT city_id, bike_number, bike_id FROM {self.table_name} WHERE city_id = ANY(%s)",
+                (list(new_cities),),
+            )
+            loaded = {(city_id, bike_number): bike_id for city_id, bike_number, bike_id in cursor.fetchall()}
+            with self._lock:
+                self._ids.update(loaded)
+                self._loaded_cities |= new_cities
+
+        with self._lock:
+            missing = {key for key in keys if key not in self._ids and key not in pending}
+        if missing:
+            city_ids, bike_numbers = zip(*missing)
+            cursor.execute(
+                f"""
+                INSERT INTO {self.table_name} (city_id, bike_number)
+                SELECT * FROM unnest(%s::int[], %s::text[])
+                ON CONFLICT DO NOTHING
+                """,
+                (list(city_ids), list(bike_numbers)),
+            )
+            cursor.execute(
+                f"""
+                SELECT d.city_id, d.bike_number, d.bike_id
+                FROM {self.table_name} d
+                JOIN unnest(%s::int[], %s::text[]) AS new_bikes(city_id, bike_number)
+                    ON d.city_id = new_bikes.city_id AND d.bike_number = new_bikes.bike_number
+                """,
+                (list(city_ids), list(bike_numbers)),
+            )
+            pending.update({(city_id, bike_number): bike_id for city_id, bike_number, bike_id in cursor.fetchall()})
+
+        with self._lock:
+            return [self._ids.get(key) or pending[key] for key in keys]
+
+    def commit(self):
+        with self._lock:
+            self._ids.update(self._pending)
+        self._pending.clear()
+
+    def rollback(self):
+        self._pending.clear()
 
 
 @register_backend("postgres")
@@ -14,17 +131,82 @@ class PostgresClient(AbstractDatabaseClient):
     def __init__(self, config):
         self.config = config
         self.connection_string = f"host={self.config.db_host} port={self.config.db_port} dbname={self.config.db_name} user={self.config.db_user} password={self.config.db_password}"
+        if self.config.db_ingest_mode not in INGEST_MODES:
+            raise ValueError(f"Unknown ingest mode: {self.config.db_ingest_mode}")
+        if self.config.db_bike_storage not in BIKE_STORAGES:
+            raise ValueError(f"Unknown bike storage: {self.config.db_bike_storage}")
+        self._bike_ids = BikeIdCache(self.config.db_bike_dim_table)
+        self._pool = None
+        self._local = threading.local()
+        self._partitions_ensured_on = None
+        self._occupancy_table_missing = False
+
+    # ----- CONNECTIONS -----
+    @property
+    def pool(self) -> ConnectionPool:
+        """Bounded pool that lives as long as the client. Opened on first use."""
+        if self._pool is None:
+            self._pool = ConnectionPool(
+                self.connection_string,
+                min_size=self.config.db_pool_min_size,
+                max_size=self.config.db_pool_max_size,
+                open=True,
+            )
+        return self._pool
+
+    @contextmanager
+    def connection(self):
+        """Connection of the running transaction(), otherwise one borrowed from the pool"""
+        active = getattr(self._local, "connection", None)
+        if active is not None:
+            yield active
+            return
+        with self.pool.connection() as connection:
+            yield connection
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run every call inside the block on one pooled connection and commit
+        once at the end. If any write fails, none of them is stored.
+        """
+        active = getattr(self._local, "connection", None)
+        if active is not None:
+            try:
+                with active.transaction():
+                    yield self
+            except BaseException:
+                # Bike ids added inside the savepoint are gone, the others are looked up again
+                self._bike_ids.rollback()
+                raise
+            return
+
+        try:
+            with self.pool.connection() as connection, connection.transaction():
+                self._local.connection = connection
+                try:
+                    yield self
+                finally:
+                    self._local.connection = None
+        except BaseException:
+            self._bike_ids.rollback()
+            raise
+        self._bike_ids.commit()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
 
     # ----- CITY -----
     def insert_city_information(self, city):
         city_sql = self.city_sql_insert_statement(self.config.db_cities_table)
 
         with (
-            psycopg.connect(self.connection_string) as connection,
+            self.connection() as connection,
             connection.cursor() as cursor,
         ):
             cursor.execute(city_sql, city.__dict__)
-            connection.commit()
 
     @staticmethod
     def city_sql_insert_statement(table_name):
@@ -39,16 +221,60 @@ class PostgresClient(AbstractDatabaseClient):
         return city_sql
 
     # ----- BIKES -----
+    def ensure_bike_partitions(self):
+        """
+        Create the daily bikes (or bike_snapshots) partitions from yesterday
+        up to DB_BIKE_PARTITIONS_AHEAD_DAYS ahead. Runs once per UTC day.
+        Disabled for databases without partitioned bikes.
+        """
+        days_ahead = self.config.db_bike_partitions_ahead_days
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        if days_ahead <= 0 or self._partitions_ensured_on == today:
+            return
+
+        if self.config.db_bike_storage == "normalized":
+            table, function, migration = "bike_snapshots", "create_bike_snapshots_partitions", "005_bike_dim"
+        else:
+            table, function, migration = "bikes", "create_bikes_partitions", "002_partition_bikes"
+        with self.connection() as connection:
+            try:
+                # Savepoint, a missing function must not abort a running transaction
+                with connection.transaction(), connection.cursor() as cursor:
+                    cursor.execute(
+                        f"SELECT public.{function}(%s, %s)",
+                        (today - datetime.timedelta(days=1), days_ahead + 2),
+                    )
+                    created = cursor.fetchone()[0]
+            except errors.UndefinedFunction:
+                print(f"{table} is not partitioned, run {migration}_migration.sql. Not creating partitions.")
+                self.config.db_bike_partitions_ahead_days = 0
+                return
+
+        self._partitions_ensured_on = today
+        if created:
+            print(f"Created {created} {table} partition(s)")
+
     def insert_bike_entries(self, bike_entries):
+        self.ensure_bike_partitions()
+        if self.config.db_bike_storage == "normalized":
+            # Own transaction if there is none, new bike ids are kept on its commit
+            with self.transaction():
+                self.insert_bike_snapshots(bike_entries)
+            return
+
+        if self.config.db_ingest_mode != "insert":
+            rows = entry_rows(bike_entries)
+            self.copy_entries(self.config.db_bikes_table, BIKE_COLUMNS, BIKE_COPY_TYPES, rows)
+            return
+
         sql_statement = self.bike_sql_insert_statement(self.config.db_bikes_table)
 
-        bikes = [bike.__dict__ for bike in bike_entries]
+        bikes = [dict(zip(BIKE_COLUMNS, row)) for row in entry_rows(bike_entries)]
         with (
-            psycopg.connect(self.connection_string) as connection,
+            self.connection() as connection,
             connection.cursor() as cursor,
         ):
             cursor.executemany(sql_statement, bikes)
-            connection.commit()
 
     @staticmethod
     def bike_sql_insert_statement(table_name):
@@ -56,23 +282,46 @@ class PostgresClient(AbstractDatabaseClient):
         INSERT INTO {table_name} (
             bike_number, latitude, longitude, active, state, bike_type, station_number, station_uid, last_updated, city_id, city_name
         )
-        VALUES (%(bike_number)s, %(latitude)s, %(longitude)s, %(active)s, %(state)s, %(bike_type)s, %(station_number)s, %(station_uid)s, %(last_updated)s, %(city_id)s, %(city_name)s)
-        ON CONFLICT DO NOTHING;
+        VALUES (%(bike_number)s, %(latitude)s, %(longitude)s, %(active)s, %(state)s, %(bike_type)s, %(station_number)s, %(station_uid)s, %(last_updated)s, %(city_id)s, %(city_name)s);
         """
 
         return bike_sql
 
+    def insert_bike_snapshots(self, bike_entries):
+        """Write bike rows to the normalized bike_snapshots table"""
+        rows = list(entry_rows(bike_entries))
+        table_name = self.config.db_bike_snapshots_table
+        with self.connection() as connection, connection.cursor() as cursor:
+            bike_ids = self._bike_ids.bike_ids(cursor, rows)
+            snapshots = [
+                (bike_id, city_id, station_number, station_uid, last_updated, latitude, longitude, active, state, bike_type)
+                for bike_id, (_, latitude, longitude, active, state, bike_type, station_number, station_uid,
+                              last_updated, city_id, _) in zip(bike_ids, rows)
+            ]
+            if self.config.db_ingest_mode == "insert":
+                placeholders = ", ".join(["%s"] * len(SNAPSHOT_COLUMNS))
+                cursor.executemany(
+                    f"INSERT INTO {table_name} ({', '.join(SNAPSHOT_COLUMNS)}) VALUES ({placeholders})",
+                    snapshots,
+                )
+                return
+        self.copy_entries(table_name, SNAPSHOT_COLUMNS, SNAPSHOT_COPY_TYPES, snapshots)
+
     # ----- STATIONS -----
     def insert_station_entries(self, station_entries: list[tuple]):
+        if self.config.db_ingest_mode != "insert":
+            rows = entry_rows(station_entries)
+            self.copy_entries(self.config.db_stations_table, STATION_COLUMNS, STATION_COPY_TYPES, rows)
+            return
+
         sql_statement = self.station_sql_insert_statement(self.config.db_stations_table)
 
-        stations = [station.__dict__ for station in station_entries]
+        stations = [dict(zip(STATION_COLUMNS, row)) for row in entry_rows(station_entries)]
         with (
-            psycopg.connect(self.connection_string) as connection,
+            self.connection() as connection,
             connection.cursor() as cursor,
         ):
             cursor.executemany(sql_statement, stations)
-            connection.commit()
 
     @staticmethod
     def station_sql_insert_statement(table_name):
@@ -80,29 +329,117 @@ class PostgresClient(AbstractDatabaseClient):
         INSERT INTO {table_name} (
                 uid, latitude, longitude, name, spot, station_number, maintenance, terminal_type, last_updated, city_id, city_name
             )
-            VALUES (%(uid)s, %(latitude)s, %(longitude)s, %(name)s, %(spot)s, %(station_number)s, %(maintenance)s, %(terminal_type)s, %(last_updated)s, %(city_id)s, %(city_name)s)
-            ON CONFLICT DO NOTHING;
+            VALUES (%(uid)s, %(latitude)s, %(longitude)s, %(name)s, %(spot)s, %(station_number)s, %(maintenance)s, %(terminal_type)s, %(last_updated)s, %(city_id)s, %(city_name)s);
         """
 
         return station_sql
 
+    # ----- STATION OCCUPANCY -----
+    def insert_station_occupancy(self, occupancy_rows):
+        """
+        Write the station occupancy changes of a poll. A few rows per poll,
+        so they skip the staging table. Databases without the table are
+        skipped with a hint to run the migration.
+        """
+        if self._occupancy_table_missing:
+            return
+
+        table_name = self.config.db_station_occupancy_table
+        with self.connection() as connection:
+            try:
+                # Savepoint, a missing table must not abort the bike writes of the poll
+                with connection.transaction(), connection.cursor() as cursor:
+                    if self.config.db_ingest_mode == "insert":
+                        placeholders = ", ".join(["%s"] * len(OCCUPANCY_COLUMNS))
+                        cursor.executemany(
+                            f"INSERT INTO {table_name} ({', '.join(OCCUPANCY_COLUMNS)}) VALUES ({placeholders})",
+                            list(occupancy_rows),
+                        )
+                    else:
+                        self.copy_rows(
+                            cursor,
+                            self.copy_statement(table_name, OCCUPANCY_COLUMNS),
+                            OCCUPANCY_COPY_TYPES,
+                            occupancy_rows,
+                        )
+            except errors.UndefinedTable:
+                print(f"{table_name} does not exist, run 004_station_occupancy_migration.sql. Not writing occupancy.")
+                self._occupancy_table_missing = True
+
+    # ----- BULK COPY -----
+    def copy_entries(self, table_name, columns, types, rows):
+        """
+        Stream all rows with one binary COPY instead of one INSERT per row.
+        With DB_INGEST_MODE=copy_staging the rows go through an unlogged
+        staging table first and are moved with a single INSERT ... SELECT.
+        """
+        with (
+            self.connection() as connection,
+            connection.cursor() as cursor,
+        ):
+            if self.config.db_ingest_mode == "copy_staging":
+                staging_table = self.staging_table_name(table_name)
+                cursor.execute(self.staging_table_statement(table_name, staging_table, columns))
+                self.copy_rows(cursor, self.copy_statement(staging_table, columns), types, rows)
+                cursor.execute(self.move_staging_statement(staging_table, table_name, columns))
+            else:
+                self.copy_rows(cursor, self.copy_statement(table_name, columns), types, rows)
+
+    @staticmethod
+    def copy_rows(cursor, copy_sql, types, rows):
+        text_columns = [index for index, column_type in enumerate(types) if column_type == "text"]
+        with cursor.copy(copy_sql) as copy:
+            copy.set_types(types)
+            for row in rows:
+                # The API returns some text fields (e.g. bike_type) as numbers,
+                # binary COPY needs real strings for text columns.
+                if any(row[i] is not None and not isinstance(row[i], str) for i in text_columns):
+                    row = list(row)
+                    for i in text_columns:
+                        if row[i] is not None:
+                            row[i] = str(row[i])
+                copy.write_row(row)
+
+    @staticmethod
+    def copy_statement(table_name, columns):
+        return f"COPY {table_name} ({', '.join(columns)}) FROM STDIN (FORMAT BINARY)"
+
+    @staticmethod
+    def staging_table_name(table_name):
+        return f"{table_name}_staging"
+
+    @staticmethod
+    def staging_table_statement(table_name, staging_table, columns):
+        return f"""
+        CREATE UNLOGGED TABLE IF NOT EXISTS {staging_table} AS
+        SELECT {', '.join(columns)} FROM {table_name} WITH NO DATA;
+        TRUNCATE {staging_table};
+        """
+
+    @staticmethod
+    def move_staging_statement(staging_table, table_name, columns):
+        column_list = ", ".join(columns)
+        return f"""
+        INSERT INTO {table_name} ({column_list}) SELECT {column_list} FROM {staging_table};
+        TRUNCATE {staging_table};
+        """
+
     # ----- SYNC TIMESTAMPS -----
-    def get_last_station_sync(self, city_id: int) -> datetime.datetime | None:
-        with psycopg.connect(self.connection_string) as connection:
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    f"SELECT MAX(last_updated) FROM {self.config.db_stations_table} WHERE city_id = %s",
-                    (city_id,),
-                )
-                result = cursor.fetchone()
-                return result[0] if result and result[0] else None
+    def get_last_station_syncs(self, city_ids) -> dict[int, datetime.datetime]:
+        """Latest station write per city, for all cities in one query"""
+        return self._fetch_syncs(
+            f"SELECT city_id, MAX(last_updated) FROM {self.config.db_stations_table} WHERE city_id = ANY(%s) GROUP BY city_id",
+            city_ids,
+        )
+
+    def get_last_city_syncs(self, city_ids) -> dict[int, datetime.datetime]:
+        return self._fetch_syncs(
+            f"SELECT city_id, last_updated FROM {self.config.db_cities_table} WHERE city_id = ANY(%s)",
+            city_ids,
+        )
 
-    def get_last_city_sync(self, city_id: int) -> datetime.datetime | None:
-        with psycopg.connect(self.connection_string) as connection:
+    def _fetch_syncs(self, sql, city_ids) -> dict[int, datetime.datetime]:
+        with self.connection() as connection:
             with connection.cursor() as cursor:
-                cursor.execute(
-                    f"SELECT last_updated FROM {self.config.db_cities_table} WHERE city_id = %s",
-                    (city_id,),
-                )
-                result = cursor.fetchone()
-                return result[0] if result else None
+                cursor.execute(sql, (list(city_ids),))
+                return {city_id: last_updated for city_id, last_updated in cursor.fetchall()}
@@ -0,0 +1,78 @@
+import datetime
+from dataclasses import dataclass
+
+
+@dataclass
+class _BikeState:
+    last_seen: object
+    written: bool
+    last_written: datetime.datetime
+
+
+class BikeDeltaFilter:
+    """
+    Remember the last snapshot of every (city_id, bike_number) and only keep
+    bike rows that carry new information:
+
+    - the first sighting of a bike
+    - a changed position, station or state, together with the previous
+      unchanged sighting if that one was not written yet
+    - a heartbeat row when nothing was written for `heartbeat_seconds`
+
+    Writing the previous sighting keeps every pair of consecutive rows around
+    a position change, so the LEAD() trip detection in processing finds the
+    same trips with the same start and end times as on full snapshots.
+    """
+
+    def __init__(self, heartbeat_seconds: int = 3600):
+        self.heartbeat = datetime.timedelta(seconds=heartbeat_seconds)
+        self._bikes = {}
+
+    @staticmethod
+    def _fingerprint(bike) -> tuple:
+        return (
+            bike.latitude,
+            bike.longitude,
+            bike.station_number,
+            bike.station_uid,
+            bike.state,
+        )
+
+    def select(self, bike_entries) -> tuple[list, dict]:
+        """
+        Return the rows to write and the state updates to apply with
+        remember() once those rows are stored. Nothing is remembered before
+        that, so a failed write is repeated on the next poll.
+        """
+        rows = []
+        updates = {}
+        for bike in bike_entries:
+            key = (bike.city_id, bike.bike_number)
+            state = self._bikes.get(key)
+
+            if state is None:
+                rows.append(bike)
+                updates[key] = _BikeState(bike, True, bike.last_updated)
+            elif self._fingerprint(bike) != self._fingerprint(state.last_seen):
+                if not state.written:
+                    rows.append(state.last_seen)
+                rows.append(bike)
+                updates[key] = _BikeState(bike, True, bike.last_updated)
+            elif bike.last_updated - state.last_written >= self.heartbeat:
+                rows.append(bike)
+                updates[key] = _BikeState(bike, True, bike.last_updated)
+            else:
+                updates[key] = _BikeState(bike, False, state.last_written)
+
+        return rows, updates
+
+    def remember(self, updates: dict):
+        self._bikes.update(updates)
+
+    def unwritten(self) -> list:
+        """Last sightings not stored yet. Write them before shutting down."""
+        return [state.last_seen for state in self._bikes.values() if not state.written]
+
+    def mark_all_written(self):
+        for state in self._bikes.values():
+            state.written = True
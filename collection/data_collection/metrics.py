@@ -0,0 +1,228 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds, from a fast parse up to a poll that overruns the minute
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus sense"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)},
+        }
+
+
+def _labels(**labels) -> str:
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def _format_bound(bound) -> str:
+    return repr(float(bound))
+
+
+class CollectorMetrics:
+    """
+    Timings and counters of the collector, per city and phase:
+
+    - fetch: HTTP request and response body
+    - decode: JSON decode of the body
+    - parse: building Bike/Station entries
+    - stream: fetch, decode and parse interleaved by --stream
+    - store: database writes of one snapshot, or appending it to the spool
+    - replay: writing one spool segment, city "all"
+
+    Updated from the poll loop and the spool flusher thread, read by the
+    metrics HTTP server.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, clock=time.perf_counter):
+        self.buckets = buckets
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._phases = {}
+        self._payload_bytes = {}
+        self._rows = {}
+        self._failures = {}
+        self._tick_lateness = Histogram(buckets)
+        self._ticks_skipped = 0
+        self._poll_intervals = {}
+
+    def observe_phase(self, city_id, phase: str, seconds: float):
+        with self._lock:
+            key = (str(city_id), phase)
+            if key not in self._phases:
+                self._phases[key] = Histogram(self.buckets)
+            self._phases[key].observe(seconds)
+
+    @contextmanager
+    def time_phase(self, city_id, phase: str):
+        """Observe the duration of the block, or count a failure if it raises"""
+        start = self.clock()
+        try:
+            yield
+        except BaseException:
+            self.add_failure(city_id, phase)
+            raise
+        self.observe_phase(city_id, phase, self.clock() - start)
+
+    def add_payload_bytes(self, city_id, count: int):
+        with self._lock:
+            key = str(city_id)
+            self._payload_bytes[key] = self._payload_bytes.get(key, 0) + count
+
+    def add_rows(self, city_id, table: str, count: int):
+        with self._lock:
+            key = (str(city_id), table)
+            self._rows[key] = self._rows.get(key, 0) + count
+
+    def add_failure(self, city_id, phase: str):
+        with self._lock:
+            key = (str(city_id), phase)
+            self._failures[key] = self._failures.get(key, 0) + 1
+
+    def observe_tick(self, lateness: float, skipped: int):
+        with self._lock:
+            self._tick_lateness.observe(lateness)
+            self._ticks_skipped += skipped
+
+    def set_poll_interval(self, city_id, seconds: float):
+        with self._lock:
+            self._poll_intervals[str(city_id)] = seconds
+
+    # ----- EXPORT -----
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            lines.append("# HELP nextbike_collector_phase_seconds Duration of a collector phase per city")
+            lines.append("# TYPE nextbike_collector_phase_seconds histogram")
+            for (city_id, phase), histogram in sorted(self._phases.items()):
+                lines.extend(self._histogram_lines(
+                    "nextbike_collector_phase_seconds", histogram, city_id=city_id, phase=phase
+                ))
+
+            lines.append("# HELP nextbike_collector_payload_bytes_total Bytes received from the Nextbike API")
+            lines.append("# TYPE nextbike_collector_payload_bytes_total counter")
+            for city_id, count in sorted(self._payload_bytes.items()):
+                lines.append(f"nextbike_collector_payload_bytes_total{{{_labels(city_id=city_id)}}} {count}")
+
+            lines.append("# HELP nextbike_collector_rows_written_total Rows written to the database")
+            lines.append("# TYPE nextbike_collector_rows_written_total counter")
+            for (city_id, table), count in sorted(self._rows.items()):
+                lines.append(f"nextbike_collector_rows_written_total{{{_labels(city_id=city_id, table=table)}}} {count}")
+
+            lines.append("# HELP nextbike_collector_failures_total Failed collector phases")
+            lines.append("# TYPE nextbike_collector_failures_total counter")
+            for (city_id, phase), count in sorted(self._failures.items()):
+                lines.append(f"nextbike_collector_failures_total{{{_labels(city_id=city_id, phase=phase)}}} {count}")
+
+            lines.append("# HELP nextbike_collector_tick_lateness_seconds Delay of a daemon tick after its scheduled time")
+            lines.append("# TYPE nextbike_collector_tick_lateness_seconds histogram")
+            lines.extend(self._histogram_lines("nextbike_collector_tick_lateness_seconds", self._tick_lateness))
+
+            lines.append("# HELP nextbike_collector_ticks_skipped_total Daemon ticks skipped because a poll overran")
+            lines.append("# TYPE nextbike_collector_ticks_skipped_total counter")
+            lines.append(f"nextbike_collector_ticks_skipped_total {self._ticks_skipped}")
+
+            if self._poll_intervals:
+                lines.append("# HELP nextbike_collector_poll_interval_seconds Current poll interval of a city with --adaptive")
+                lines.append("# TYPE nextbike_collector_poll_interval_seconds gauge")
+                for city_id, seconds in sorted(self._poll_intervals.items()):
+                    lines.append(f"nextbike_collector_poll_interval_seconds{{{_labels(city_id=city_id)}}} {seconds}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _histogram_lines(name, histogram: Histogram, **labels) -> list[str]:
+        label_prefix = _labels(**labels)
+        separator = "," if label_prefix else ""
+        lines = []
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{name}_bucket{{{label_prefix}{separator}le="{_format_bound(bound)}"}} {count}')
+        lines.append(f'{name}_bucket{{{label_prefix}{separator}le="+Inf"}} {histogram.count}')
+        suffix = f"{{{label_prefix}}}" if label_prefix else ""
+        lines.append(f"{name}_sum{suffix} {histogram.sum}")
+        lines.append(f"{name}_count{suffix} {histogram.count}")
+        return lines
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cities = {}
+            for (city_id, phase), histogram in self._phases.items():
+                cities.setdefault(city_id, {}).setdefault("phases", {})[phase] = histogram.as_dict()
+            for city_id, count in self._payload_bytes.items():
+                cities.setdefault(city_id, {})["payload_bytes"] = count
+            for (city_id, table), count in self._rows.items():
+                cities.setdefault(city_id, {}).setdefault("rows_written", {})[table] = count
+            for (city_id, phase), count in self._failures.items():
+                cities.setdefault(city_id, {}).setdefault("failures", {})[phase] = count
+            for city_id, seconds in self._poll_intervals.items():
+                cities.setdefault(city_id, {})["poll_interval_seconds"] = seconds
+            return {
+                "cities": cities,
+                "tick_lateness": self._tick_lateness.as_dict(),
+                "ticks_skipped": self._ticks_skipped,
+            }
+
+    def dump_json(self, path: str):
+        """Write snapshot() to `path`, replacing the file atomically"""
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as dump:
+            json.dump(self.snapshot(), dump, indent=2)
+        os.replace(temporary_path, path)
+
+
+class MetricsServer:
+    """Serve CollectorMetrics in the Prometheus text format on /metrics"""
+
+    def __init__(self, metrics: CollectorMetrics, port: int, host: str = "127.0.0.1"):
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] != "/metrics":
+                    handler.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,63 @@
+from contextlib import contextmanager
+from zoneinfo import ZoneInfo
+
+from columnar import entry_rows
+
+OCCUPANCY_COLUMNS = ("station_number", "bike_count", "bike_list", "last_updated", "city_id")
+# Positions in Bike.as_tuple() and Station.as_tuple()
+BIKE_NUMBER_INDEX = 0
+BIKE_STATION_INDEX = 6
+STATION_NUMBER_INDEX = 5
+
+
+class StationOccupancyTracker:
+    """
+    Bike count per station, kept in memory by the collector to write only
+    the occupancy changes of every snapshot.
+
+    A station gets a row in the snapshot its bike count differs from the
+    previous snapshot of the city. On the first snapshot of a new local day
+    every station gets a row, so a day can be read without the days before.
+    Rows are (station_number, bike_count, bike_list, last_updated, city_id).
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._days = {}
+
+    def changes(self, city, bike_entries, station_entries) -> list[tuple]:
+        day = city.last_updated.astimezone(ZoneInfo(city.timezone)).date()
+        previous = self._counts.get(city.city_id)
+        if self._days.get(city.city_id) != day:
+            previous = None
+
+        bikes_at = {}
+        for row in entry_rows(bike_entries):
+            bikes_at.setdefault(row[BIKE_STATION_INDEX], []).append(str(row[BIKE_NUMBER_INDEX]))
+
+        counts = {}
+        rows = []
+        for row in entry_rows(station_entries):
+            station_number = row[STATION_NUMBER_INDEX]
+            if station_number in counts:
+                continue
+            bikes = bikes_at.get(station_number, [])
+            counts[station_number] = len(bikes)
+            if previous is None or previous.get(station_number) != len(bikes):
+                rows.append((station_number, len(bikes), ", ".join(bikes), city.last_updated, city.city_id))
+
+        self._counts[city.city_id] = counts
+        self._days[city.city_id] = day
+        return rows
+
+    @contextmanager
+    def rollback_on_error(self):
+        """Forget the counts recorded inside the block if the block fails"""
+        counts = dict(self._counts)
+        days = dict(self._days)
+        try:
+            yield self
+        except BaseException:
+            self._counts = counts
+            self._days = days
+            raise
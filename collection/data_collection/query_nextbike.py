@@ -1,10 +1,23 @@
 from database.base import DatabaseClient
-from dataclasses import dataclass
+from scheduler import AdaptivePollPlanner, BikeChangeCounter, TickScheduler
+from delta import BikeDeltaFilter
+from columnar import BikeColumns, EntryRows, StationColumns, entry_rows
+from spool import SnapshotSpool, SpoolFlusher
+from sync_state import SyncStateCache, station_content_hash
+from occupancy import StationOccupancyTracker
+from streaming import AsyncByteReader, CountingReader, PlaceStreamParser
+from metrics import CollectorMetrics, MetricsServer
+from dataclasses import dataclass, replace
 from zoneinfo import ZoneInfo
 import requests
+import httpx
+import ijson
 import argparse
+import asyncio
 import datetime
+import json
 import os
+import signal
 from dotenv import load_dotenv
 
 
@@ -173,8 +186,17 @@ class NextbikeAPI:
 
     BASE_URL = "https://maps.nextbike.net/maps/nextbike-live.json"
 
-    def __init__(self, city_id: int):
+    def __init__(
+        self,
+        city_id: int,
+        timeout: float = 10,
+        metrics: CollectorMetrics | None = None,
+        base_url: str = BASE_URL,
+    ):
         self.city_id = city_id
+        self.timeout = timeout
+        self.base_url = base_url
+        self.metrics = metrics or CollectorMetrics()
 
     def fetch_data(self) -> dict:
         """
@@ -182,9 +204,32 @@ class NextbikeAPI:
         Using Nextbike GPFS API v2
         """
         params = {"city": self.city_id}
-        response = requests.get(self.BASE_URL, params=params)
-        response.raise_for_status()
-        return response.json()
+        with self.metrics.time_phase(self.city_id, "fetch"):
+            response = requests.get(self.base_url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            body = response.content
+        self.metrics.add_payload_bytes(self.city_id, len(body))
+        with self.metrics.time_phase(self.city_id, "decode"):
+            return json.loads(body)
+
+    def fetch_snapshot_streamed(self, columnar: bool = False):
+        """
+        Fetch and parse in one pass: places are turned into bike and station
+        entries while the response is still downloading, the decoded document
+        is never held in memory as a whole.
+        """
+        params = {"city": self.city_id}
+        with (
+            self.metrics.time_phase(self.city_id, "stream"),
+            requests.get(self.base_url, params=params, timeout=self.timeout, stream=True) as response,
+        ):
+            response.raise_for_status()
+            response.raw.decode_content = True
+            reader = CountingReader(response.raw)
+            try:
+                return parse_nextbike_stream(ijson.parse(reader, use_float=True), columnar)
+            finally:
+                self.metrics.add_payload_bytes(self.city_id, reader.bytes_read)
 
     @staticmethod
     def extract_places(data: dict) -> list[dict]:
@@ -201,6 +246,83 @@ class NextbikeAPI:
             places = []
         return places
 
+
+class AsyncNextbikeAPI:
+    """
+    Fetch several cities concurrently over one keep-alive connection pool.
+    At most `max_concurrency` requests are in flight at the same time.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10,
+        max_concurrency: int = 8,
+        transport=None,
+        metrics: CollectorMetrics | None = None,
+        base_url: str = NextbikeAPI.BASE_URL,
+    ):
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.base_url = base_url
+        self.transport = transport
+        self.metrics = metrics or CollectorMetrics()
+        self._client = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+            transport=self.transport,
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._client.aclose()
+
+    async def fetch_data(self, city_id: int) -> dict:
+        params = {"city": city_id}
+        async with self._semaphore:
+            # Waiting for the semaphore is not part of the fetch
+            with self.metrics.time_phase(city_id, "fetch"):
+                response = await self._client.get(self.base_url, params=params)
+                response.raise_for_status()
+        self.metrics.add_payload_bytes(city_id, len(response.content))
+        with self.metrics.time_phase(city_id, "decode"):
+            return json.loads(response.content)
+
+    async def fetch_snapshot_streamed(self, city_id: int, columnar: bool = False):
+        """Streaming counterpart of fetch_data(), returns the parsed snapshot"""
+        params = {"city": city_id}
+        async with self._semaphore:
+            with self.metrics.time_phase(city_id, "stream"):
+                async with self._client.stream("GET", self.base_url, params=params) as response:
+                    response.raise_for_status()
+                    reader = AsyncByteReader(response.aiter_bytes())
+                    events = ijson.parse_async(reader, use_float=True)
+                    try:
+                        return await parse_nextbike_stream_async(events, columnar)
+                    finally:
+                        self.metrics.add_payload_bytes(city_id, reader.bytes_read)
+
+    async def fetch_all(self, city_ids: list[int], stream: bool = False, columnar: bool = False) -> dict:
+        """
+        Fetch all cities at once.
+        A failing city maps to its exception instead of failing the whole poll.
+        With `stream` every city maps to its parsed (city, bikes, stations) snapshot.
+        """
+        if stream:
+            requests_ = (self.fetch_snapshot_streamed(city_id, columnar) for city_id in city_ids)
+        else:
+            requests_ = (self.fetch_data(city_id) for city_id in city_ids)
+        results = await asyncio.gather(*requests_, return_exceptions=True)
+        return dict(zip(city_ids, results))
+
+
 # ---------- Console output ----------
 class ConsolePrinter:
     """Print nextbike info to console"""
@@ -220,6 +342,13 @@ class NextbikeCLI:
         parsed = self._parse_args(args=args)
         self.city_ids = parsed.city_ids
         self.save = parsed.save
+        self.concurrent = parsed.concurrent
+        self.daemon = parsed.daemon
+        self.delta = parsed.delta
+        self.columnar = parsed.columnar
+        self.stream = parsed.stream
+        self.spool = parsed.spool
+        self.adaptive = parsed.adaptive
 
     def _parse_args(self, args=None):
         parser = argparse.ArgumentParser(description="Nextbike data collector CLI")
@@ -233,8 +362,52 @@ class NextbikeCLI:
         parser.add_argument(
             "--save", action="store_true", help="Save fetched Nextbike data to database"
         )
+        parser.add_argument(
+            "--concurrent",
+            action="store_true",
+            help="Fetch all cities concurrently over one pooled HTTP client",
+        )
+        parser.add_argument(
+            "--daemon",
+            action="store_true",
+            help="Keep running and poll all cities on every POLL_INTERVAL_SECONDS wall-clock tick",
+        )
+        parser.add_argument(
+            "--delta",
+            action="store_true",
+            help="Only store bikes whose position, station or state changed. Requires --daemon.",
+        )
+        parser.add_argument(
+            "--columnar",
+            action="store_true",
+            help="Parse snapshots into column arrays instead of one object per bike and station",
+        )
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            help="Parse the API response incrementally while it downloads",
+        )
+        parser.add_argument(
+            "--spool",
+            action="store_true",
+            help="Append snapshots to a local spool and write them to the database in the background",
+        )
+        parser.add_argument(
+            "--adaptive",
+            action="store_true",
+            help="Poll every city on its own interval that follows its bike change rate. Requires --daemon.",
+        )
         parsed = parser.parse_args(args)
 
+        if parsed.spool and not parsed.save:
+            parser.error("--spool requires --save")
+        if parsed.delta and not parsed.daemon:
+            parser.error("--delta requires --daemon")
+        if parsed.adaptive and not parsed.daemon:
+            parser.error("--adaptive requires --daemon")
+        if parsed.delta and parsed.columnar:
+            parser.error("--delta works on Bike objects and cannot be combined with --columnar")
+
         return parsed
 
 
@@ -253,10 +426,38 @@ class AppConfig:
         self.db_cities_table = os.getenv("DB_CITIES_TABLE")
         self.db_bikes_table = os.getenv("DB_BIKES_TABLE")
         self.db_stations_table = os.getenv("DB_STATIONS_TABLE")
+        self.db_station_occupancy_table = os.getenv("DB_STATION_OCCUPANCY_TABLE", "public.station_occupancy")
+        self.db_ingest_mode = os.getenv("DB_INGEST_MODE", "copy").lower()
+        self.db_bike_storage = os.getenv("DB_BIKE_STORAGE", "wide").lower()
+        self.db_bike_snapshots_table = os.getenv("DB_BIKE_SNAPSHOTS_TABLE", "public.bike_snapshots")
+        self.db_bike_dim_table = os.getenv("DB_BIKE_DIM_TABLE", "public.bike_dim")
+        self.db_pool_min_size = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+        self.db_pool_max_size = int(os.getenv("DB_POOL_MAX_SIZE", "4"))
+        self.db_bike_partitions_ahead_days = int(os.getenv("DB_BIKE_PARTITIONS_AHEAD_DAYS", "2"))
+        self.parquet_dir = os.getenv("PARQUET_DIR", "parquet")
+        self.parquet_compression = os.getenv("PARQUET_COMPRESSION", "zstd")
+        self.parquet_roll_seconds = float(os.getenv("PARQUET_ROLL_SECONDS", "300"))
 
         self.stations_sync_interval_hours = int(os.getenv("STATIONS_SYNC_INTERVAL_HOURS", "24"))
         self.cities_sync_interval_hours = int(os.getenv("CITIES_SYNC_INTERVAL_HOURS", "720"))
 
+        self.nextbike_api_url = os.getenv("NEXTBIKE_API_URL", NextbikeAPI.BASE_URL)
+        self.http_timeout_seconds = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+        self.fetch_concurrency = int(os.getenv("FETCH_CONCURRENCY", "8"))
+        self.poll_interval_seconds = int(os.getenv("POLL_INTERVAL_SECONDS", "60"))
+        self.poll_min_interval_seconds = float(os.getenv("POLL_MIN_INTERVAL_SECONDS", "30"))
+        self.poll_max_interval_seconds = float(os.getenv("POLL_MAX_INTERVAL_SECONDS", "600"))
+        self.poll_target_changes = float(os.getenv("POLL_TARGET_CHANGES", "5"))
+        self.poll_jitter = float(os.getenv("POLL_JITTER", "0.1"))
+        self.delta_heartbeat_minutes = int(os.getenv("DELTA_HEARTBEAT_MINUTES", "60"))
+        self.metrics_port = int(os.getenv("METRICS_PORT", "0"))
+        self.metrics_host = os.getenv("METRICS_HOST", "127.0.0.1")
+        self.metrics_json_path = os.getenv("METRICS_JSON_PATH", "")
+        self.spool_dir = os.getenv("SPOOL_DIR", "spool")
+        self.spool_segment_seconds = int(os.getenv("SPOOL_SEGMENT_SECONDS", "300"))
+        self.spool_flush_interval_seconds = int(os.getenv("SPOOL_FLUSH_INTERVAL_SECONDS", "30"))
+        self.spool_max_attempts = int(os.getenv("SPOOL_MAX_ATTEMPTS", "5"))
+
         env_city_ids = os.getenv("CITY_IDS", None)
         self.city_ids = self._parse_city_ids(cli_city_ids, env_city_ids)
 
@@ -268,15 +469,17 @@ class AppConfig:
         raise ValueError("No city ID provided. Use --city-ids or set CITY_IDS in .env.")
 
 
-def process_nextbike_data(nextbike_api: NextbikeAPI):
-    data = nextbike_api.fetch_data()
+def parse_nextbike_data(data: dict, columnar: bool = False):
     city = City.from_api_data(data)
-    places = nextbike_api.extract_places(data)
+    places = NextbikeAPI.extract_places(data)
 
-    bike_entries = Bike.bike_entries_from_place(
+    bike_parser = BikeColumns.from_places if columnar else Bike.bike_entries_from_place
+    station_parser = StationColumns.from_places if columnar else Station.build_station_entries
+
+    bike_entries = bike_parser(
         places, city.city_id, city.city_name, city.last_updated
     )
-    station_entries = Station.build_station_entries(
+    station_entries = station_parser(
         places, city.city_id, city.city_name, city.last_updated
     )
 
@@ -285,29 +488,385 @@ def process_nextbike_data(nextbike_api: NextbikeAPI):
     return city, bike_entries, station_entries
 
 
+class SnapshotBuilder:
+    """Build the city, bike and station entries place by place while a response streams in"""
+
+    def __init__(self, parser: PlaceStreamParser, columnar: bool = False):
+        self.parser = parser
+        self.columnar = columnar
+        self.city = None
+        self.bike_entries = None
+        self.station_entries = None
+
+    def _start(self):
+        self.city = City.from_api_data(self.parser.api_header())
+        if self.columnar:
+            self.bike_entries = BikeColumns(self.city.city_id, self.city.city_name, self.city.last_updated)
+            self.station_entries = StationColumns(self.city.city_id, self.city.city_name, self.city.last_updated)
+        else:
+            self.bike_entries = []
+            self.station_entries = []
+
+    def add_place(self, place: dict):
+        if self.city is None:
+            self._start()
+        city = self.city
+        places = (place,)
+        if self.columnar:
+            self.bike_entries.add_places(places)
+            self.station_entries.add_places(places)
+        else:
+            self.bike_entries.extend(Bike.bike_entries_from_place(
+                places, city.city_id, city.city_name, city.last_updated
+            ))
+            self.station_entries.extend(Station.build_station_entries(
+                places, city.city_id, city.city_name, city.last_updated
+            ))
+
+    def finish(self):
+        if self.city is None:
+            self._start()
+        else:
+            # Country fields like available_bikes may come after the places
+            self.city = replace(City.from_api_data(self.parser.api_header()), last_updated=self.city.last_updated)
+        ConsolePrinter.print_summary(self.city, self.bike_entries, self.station_entries)
+        return self.city, self.bike_entries, self.station_entries
+
+
+def parse_nextbike_stream(events, columnar: bool = False):
+    parser = PlaceStreamParser()
+    builder = SnapshotBuilder(parser, columnar)
+    for prefix, event, value in events:
+        for place in parser.feed(prefix, event, value):
+            builder.add_place(place)
+    return builder.finish()
+
+
+async def parse_nextbike_stream_async(events, columnar: bool = False):
+    parser = PlaceStreamParser()
+    builder = SnapshotBuilder(parser, columnar)
+    async for prefix, event, value in events:
+        for place in parser.feed(prefix, event, value):
+            builder.add_place(place)
+    return builder.finish()
+
+
+def store_nextbike_data(
+    db, sync_state, city_id, city, bike_entries, station_entries, metrics=None, occupancy_rows=()
+):
+    """Write one city's snapshot in a single transaction"""
+    store_snapshots(db, sync_state, [(city_id, city, bike_entries, station_entries)], metrics, occupancy_rows)
+
+
+def store_snapshots(db, sync_state, snapshots, metrics=None, occupancy_rows=()):
+    """
+    Write a batch of (city_id, city, bike_entries, station_entries) snapshots
+    in a single transaction. All bike rows go out with one bulk write, the
+    station and city syncs are decided per snapshot in the order they were
+    polled. `city` is None for bike rows without a snapshot around them.
+    `occupancy_rows` are the station occupancy changes of the whole batch.
+    """
+    sync_state.load(db, {city_id for city_id, city, _, _ in snapshots if city is not None})
+    written = []
+
+    with sync_state.rollback_on_error(), db.transaction():
+        if len(snapshots) == 1:
+            db.insert_bike_entries(snapshots[0][2])
+        else:
+            db.insert_bike_entries(EntryRows(row for _, _, bikes, _ in snapshots for row in entry_rows(bikes)))
+
+        if occupancy_rows:
+            db.insert_station_occupancy(occupancy_rows)
+            for row in occupancy_rows:
+                written.append((row[-1], "station_occupancy", 1))
+
+        for city_id, city, bike_entries, station_entries in snapshots:
+            written.append((city_id, "bikes", len(bike_entries)))
+            if city is None:
+                continue
+
+            content_hash = station_content_hash(station_entries)
+            if sync_state.station_sync_due(city, content_hash):
+                db.insert_station_entries(station_entries)
+                sync_state.stations_written(city, content_hash)
+                written.append((city_id, "stations", len(station_entries)))
+                print(f"Station data synced for city {city_id}")
+
+            if sync_state.city_sync_due(city):
+                db.insert_city_information(city)
+                sync_state.city_written(city)
+                written.append((city_id, "cities", 1))
+                print(f"City info synced for city {city_id}")
+
+    if metrics is not None:
+        for city_id, table, count in written:
+            metrics.add_rows(city_id, table, count)
+
+
+def spooled_snapshots(snapshots):
+    """Spooled snapshots in the shape store_snapshots() expects"""
+    return [
+        (
+            snapshot.city_id,
+            City(**snapshot.city) if snapshot.city is not None else None,
+            EntryRows(snapshot.bike_rows),
+            EntryRows(snapshot.station_rows),
+        )
+        for snapshot in snapshots
+    ]
+
+
+def new_async_api(config, metrics=None) -> AsyncNextbikeAPI:
+    return AsyncNextbikeAPI(
+        timeout=config.http_timeout_seconds,
+        max_concurrency=config.fetch_concurrency,
+        metrics=metrics,
+        base_url=config.nextbike_api_url,
+    )
+
+
+async def fetch_all_cities(collector) -> dict:
+    cli = collector.cli
+    async with new_async_api(collector.config, collector.metrics) as api:
+        return await api.fetch_all(collector.config.city_ids, stream=cli.stream, columnar=cli.columnar)
+
+
+class Collector:
+    """State that lives as long as the collector process"""
+
+    def __init__(self, cli, config, db):
+        self.cli = cli
+        self.config = config
+        self.db = db
+        self.metrics = CollectorMetrics()
+        self.metrics_server = None
+        if config.metrics_port:
+            self.metrics_server = MetricsServer(self.metrics, config.metrics_port, config.metrics_host)
+            self.metrics_server.start()
+            print(f"Serving metrics on http://{config.metrics_host}:{self.metrics_server.port}/metrics")
+        self.delta_filter = None
+        if cli.delta:
+            self.delta_filter = BikeDeltaFilter(config.delta_heartbeat_minutes * 60)
+        self.sync_state = SyncStateCache(
+            config.stations_sync_interval_hours,
+            config.cities_sync_interval_hours,
+        )
+        self.occupancy = StationOccupancyTracker()
+        self.poll_planner = None
+        self.bike_changes = None
+        if cli.adaptive:
+            self.poll_planner = AdaptivePollPlanner(
+                config.city_ids,
+                min_interval=config.poll_min_interval_seconds,
+                max_interval=config.poll_max_interval_seconds,
+                initial_interval=config.poll_interval_seconds,
+                target_changes=config.poll_target_changes,
+                jitter=config.poll_jitter,
+            )
+            self.bike_changes = BikeChangeCounter()
+        self.spool = None
+        self.spool_flusher = None
+        if cli.spool:
+            self.spool = SnapshotSpool(config.spool_dir, config.spool_segment_seconds)
+            self.spool_flusher = SpoolFlusher(
+                self.spool,
+                self._replay,
+                interval_seconds=config.spool_flush_interval_seconds,
+                max_attempts=config.spool_max_attempts,
+            )
+            self.spool_flusher.start()
+
+    def handle_city(self, city_id: int, data: dict):
+        with self.metrics.time_phase(city_id, "parse"):
+            city, bike_entries, station_entries = parse_nextbike_data(data, self.cli.columnar)
+        self.store_snapshot(city_id, city, bike_entries, station_entries)
+
+    def store_snapshot(self, city_id: int, city, bike_entries, station_entries):
+        if self.poll_planner is not None:
+            self.poll_planner.observe_changes(city_id, self.bike_changes.count(city_id, bike_entries))
+        if not self.cli.save:
+            return
+
+        with self.occupancy.rollback_on_error():
+            # From the full snapshot, before --delta holds bikes back
+            occupancy_rows = self.occupancy.changes(city, bike_entries, station_entries)
+
+            delta_updates = None
+            if self.delta_filter is not None:
+                total = len(bike_entries)
+                bike_entries, delta_updates = self.delta_filter.select(bike_entries)
+                print(f"Delta mode: writing {len(bike_entries)} of {total} bike entries")
+
+            with self.metrics.time_phase(city_id, "store"):
+                if self.spool is not None:
+                    self.spool.append(
+                        city_id, city.__dict__, entry_rows(bike_entries), entry_rows(station_entries), occupancy_rows
+                    )
+                else:
+                    store_nextbike_data(
+                        self.db, self.sync_state, city_id, city, bike_entries, station_entries,
+                        self.metrics, occupancy_rows,
+                    )
+
+        if delta_updates is not None:
+            self.delta_filter.remember(delta_updates)
+
+    def _replay(self, snapshots):
+        with self.metrics.time_phase("all", "replay"):
+            occupancy_rows = [row for snapshot in snapshots for row in snapshot.occupancy_rows]
+            store_snapshots(self.db, self.sync_state, spooled_snapshots(snapshots), self.metrics, occupancy_rows)
+
+    def dump_metrics(self):
+        if self.config.metrics_json_path:
+            self.metrics.dump_json(self.config.metrics_json_path)
+
+    def handle_fetched_city(self, city_id: int, result):
+        """`result` is what AsyncNextbikeAPI.fetch_all() returned for the city"""
+        if isinstance(result, Exception):
+            print(f"Fetching city {city_id} failed: {result!r}")
+            return
+        if self.cli.stream:
+            self.store_snapshot(city_id, *result)
+        else:
+            self.handle_city(city_id, result)
+
+    def close(self):
+        try:
+            if self.delta_filter is not None and self.cli.save:
+                unwritten = self.delta_filter.unwritten()
+                if unwritten:
+                    if self.spool is not None:
+                        self.spool.append(None, None, entry_rows(unwritten), [])
+                    else:
+                        self.db.insert_bike_entries(unwritten)
+                    self.delta_filter.mark_all_written()
+                    print(f"Stored {len(unwritten)} held back bike entries")
+        finally:
+            try:
+                if self.spool_flusher is not None:
+                    self.spool_flusher.stop()
+            finally:
+                self.db.close()
+                self.dump_metrics()
+                if self.metrics_server is not None:
+                    self.metrics_server.stop()
+
+
+async def poll_cities(collector: Collector, api: AsyncNextbikeAPI, city_ids=None) -> dict:
+    """One daemon tick: fetch all cities, or `city_ids`, and store what came back"""
+    cli = collector.cli
+    city_ids = collector.config.city_ids if city_ids is None else city_ids
+    fetched = await api.fetch_all(city_ids, stream=cli.stream, columnar=cli.columnar)
+    for city_id, data in fetched.items():
+        try:
+            collector.handle_fetched_city(city_id, data)
+        except Exception as error:
+            print(f"Storing city {city_id} failed: {error!r}")
+    return fetched
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    """Retry-After of a rate limited or unavailable response, in seconds"""
+    if not isinstance(error, httpx.HTTPStatusError):
+        return None
+    try:
+        return float(error.response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+async def poll_due_cities(collector: Collector, api: AsyncNextbikeAPI):
+    """One --adaptive step: poll the cities that are due and plan their next poll"""
+    planner = collector.poll_planner
+    city_ids, lateness = await planner.wait_for_due()
+    collector.metrics.observe_tick(lateness, 0)
+
+    fetched = await poll_cities(collector, api, city_ids)
+    for city_id, data in fetched.items():
+        failed = isinstance(data, Exception)
+        delay = planner.record_poll(city_id, failed, retry_after_seconds(data) if failed else None)
+        collector.metrics.set_poll_interval(city_id, planner.interval(city_id))
+        backoff = " (backing off)" if failed else ""
+        print(f"City {city_id}: next poll in {delay:.0f}s{backoff}")
+
+
+async def run_daemon(collector: Collector):
+    """
+    Poll all cities on every tick in one resident process, or every city
+    on its own schedule with --adaptive.
+    HTTP pool, database client and config stay alive between ticks.
+    """
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, asyncio.current_task().cancel
+    )
+
+    async with new_async_api(collector.config, collector.metrics) as api:
+        if collector.poll_planner is not None:
+            await run_adaptive_polls(collector, api)
+        else:
+            await run_tick_polls(collector, api)
+
+
+async def run_tick_polls(collector: Collector, api):
+    """Poll all cities together on every tick of POLL_INTERVAL_SECONDS"""
+    scheduler = TickScheduler(collector.config.poll_interval_seconds)
+    while True:
+        tick = await scheduler.wait_for_next_tick()
+        collector.metrics.observe_tick(tick.lateness, tick.skipped)
+        scheduled = datetime.datetime.fromtimestamp(tick.scheduled, datetime.timezone.utc)
+        skipped = f", skipped {tick.skipped} tick(s)" if tick.skipped else ""
+        print(f"Tick {scheduled.isoformat()} started {tick.lateness:.3f}s late{skipped}")
+
+        await poll_cities(collector, api)
+        collector.dump_metrics()
+
+
+async def run_adaptive_polls(collector: Collector, api):
+    """Poll every city when its poll planner says it is due (--adaptive)"""
+    while True:
+        await poll_due_cities(collector, api)
+        collector.dump_metrics()
+
+
 def main():
     cli = NextbikeCLI()
     config = AppConfig(cli.city_ids)
 
-    db = DatabaseClient(config)
-
-    city_ids = config.city_ids
-    for city_id in city_ids:
-        api = NextbikeAPI(city_id)
-        city, bike_entries, station_entries = process_nextbike_data(api)
+    collector = Collector(cli, config, DatabaseClient(config))
+    try:
+        run(collector)
+    finally:
+        collector.close()
 
-        if cli.save:
-            db.insert_bike_entries(bike_entries)
 
-            last_station_sync = db.get_last_station_sync(city_id)
-            if last_station_sync is None or (city.last_updated - last_station_sync).total_seconds() >= config.stations_sync_interval_hours * 3600:
-                db.insert_station_entries(station_entries)
-                print(f"Station data synced for city {city_id}")
+def run(collector: Collector):
+    cli = collector.cli
+    config = collector.config
 
-            last_city_sync = db.get_last_city_sync(city_id)
-            if last_city_sync is None or (city.last_updated - last_city_sync).total_seconds() >= config.cities_sync_interval_hours * 3600:
-                db.insert_city_information(city)
-                print(f"City info synced for city {city_id}")
+    if cli.daemon:
+        try:
+            asyncio.run(run_daemon(collector))
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            print("Collector daemon stopped")
+        return
+
+    if cli.concurrent:
+        fetched = asyncio.run(fetch_all_cities(collector))
+        for city_id, data in fetched.items():
+            collector.handle_fetched_city(city_id, data)
+        return
+
+    for city_id in config.city_ids:
+        api = NextbikeAPI(
+            city_id,
+            timeout=config.http_timeout_seconds,
+            metrics=collector.metrics,
+            base_url=config.nextbike_api_url,
+        )
+        if cli.stream:
+            collector.store_snapshot(city_id, *api.fetch_snapshot_streamed(cli.columnar))
+        else:
+            collector.handle_city(city_id, api.fetch_data())
 
 
 if __name__ == "__main__":
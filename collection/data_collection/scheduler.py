@@ -0,0 +1,197 @@
+import asyncio
+import math
+import random
+import time
+from dataclasses import dataclass
+
+from columnar import entry_rows
+
+# Positions in Bike.as_tuple()
+BIKE_NUMBER_INDEX = 0
+BIKE_LATITUDE_INDEX = 1
+BIKE_LONGITUDE_INDEX = 2
+BIKE_STATION_INDEX = 6
+
+
+@dataclass
+class Tick:
+    scheduled: float
+    started: float
+    skipped: int
+
+    @property
+    def lateness(self) -> float:
+        """Seconds between the planned and the actual start of this tick"""
+        return self.started - self.scheduled
+
+
+class TickScheduler:
+    """
+    Drift-free ticks aligned to wall-clock multiples of `interval_seconds`.
+    The next tick is derived from the clock, never from "last run + sleep",
+    so slow work never shifts the cadence. Ticks missed while work overran
+    are skipped and counted instead of being run back to back.
+    """
+
+    def __init__(self, interval_seconds: float = 60, clock=time.time, sleep=asyncio.sleep):
+        if interval_seconds <= 0:
+            raise ValueError("interval_seconds must be positive")
+        self.interval_seconds = interval_seconds
+        self._clock = clock
+        self._sleep = sleep
+        self._last_scheduled = None
+
+    def next_tick_after(self, now: float) -> float:
+        return (math.floor(now / self.interval_seconds) + 1) * self.interval_seconds
+
+    async def wait_for_next_tick(self) -> Tick:
+        scheduled = self.next_tick_after(self._clock())
+        delay = scheduled - self._clock()
+        if delay > 0:
+            await self._sleep(delay)
+
+        skipped = 0
+        if self._last_scheduled is not None:
+            skipped = round((scheduled - self._last_scheduled) / self.interval_seconds) - 1
+        self._last_scheduled = scheduled
+
+        return Tick(scheduled=scheduled, started=self._clock(), skipped=skipped)
+
+
+@dataclass
+class CityPoll:
+    interval: float
+    next_poll: float
+    failures: int = 0
+    change_rate: float | None = None
+    last_observed: float | None = None
+
+
+class AdaptivePollPlanner:
+    """
+    Per-city poll times for the daemon's --adaptive mode.
+
+    Every city gets the interval at which about `target_changes` of its
+    bikes change between two snapshots, from a moving average of the
+    observed change rate, kept within `min_interval` and `max_interval`.
+    Quiet cities are polled less often, busy ones more often. An interval
+    at most doubles from one poll to the next, so a quiet minute does not
+    push a busy city to the maximum at once. Failed polls back off
+    exponentially up to `max_interval`. Every delay is spread by
+    +/- `jitter` so cities do not fall onto the same second, and kept
+    within the bounds afterwards.
+    """
+
+    SMOOTHING = 0.3
+
+    def __init__(
+        self,
+        city_ids,
+        min_interval: float = 30,
+        max_interval: float = 600,
+        initial_interval: float = 60,
+        target_changes: float = 5,
+        jitter: float = 0.1,
+        clock=time.time,
+        sleep=asyncio.sleep,
+        rng=random.random,
+    ):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("intervals must be positive and min_interval <= max_interval")
+        if target_changes <= 0:
+            raise ValueError("target_changes must be positive")
+        if not 0 <= jitter < 1:
+            raise ValueError("jitter must be in [0, 1)")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_changes = target_changes
+        self.jitter = jitter
+        self._clock = clock
+        self._sleep = sleep
+        self._random = rng
+
+        # The first polls are spread over the shortest interval
+        now = clock()
+        interval = self._bounded(initial_interval)
+        self._cities = {
+            city_id: CityPoll(interval, now + rng() * min_interval) for city_id in city_ids
+        }
+
+    def _bounded(self, interval: float) -> float:
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _jittered(self, delay: float) -> float:
+        return delay * (1 + self.jitter * (2 * self._random() - 1))
+
+    def interval(self, city_id) -> float:
+        return self._cities[city_id].interval
+
+    def next_poll(self, city_id) -> float:
+        return self._cities[city_id].next_poll
+
+    async def wait_for_due(self) -> tuple[list, float]:
+        """Sleep until a poll is due. Returns the due cities and how late the earliest one is."""
+        earliest = min(city.next_poll for city in self._cities.values())
+        delay = earliest - self._clock()
+        if delay > 0:
+            await self._sleep(delay)
+        now = self._clock()
+        due = [city_id for city_id, city in self._cities.items() if city.next_poll <= now]
+        return due, now - earliest
+
+    def observe_changes(self, city_id, changed: int | None, at: float | None = None):
+        """
+        Bikes of the city that changed since its previous snapshot, None
+        for the first snapshot.
+        """
+        city = self._cities[city_id]
+        at = self._clock() if at is None else at
+        if changed is not None and city.last_observed is not None and at > city.last_observed:
+            rate = changed / (at - city.last_observed)
+            if city.change_rate is None:
+                city.change_rate = rate
+            else:
+                city.change_rate += self.SMOOTHING * (rate - city.change_rate)
+        city.last_observed = at
+
+    def record_poll(self, city_id, failed: bool = False, retry_after: float | None = None) -> float:
+        """Plan the next poll of a city after polling it. Returns the delay until then."""
+        city = self._cities[city_id]
+        if failed:
+            city.failures += 1
+            # More doublings than from min_interval to max_interval change
+            # nothing, and 2 ** failures overflows a float after a long outage
+            doublings = min(city.failures, math.ceil(math.log2(self.max_interval / self.min_interval)))
+            delay = city.interval * 2 ** doublings
+        else:
+            city.failures = 0
+            if city.change_rate is not None:
+                wanted = self.target_changes / city.change_rate if city.change_rate > 0 else self.max_interval
+                city.interval = self._bounded(min(wanted, 2 * city.interval))
+            delay = city.interval
+        # Jitter never takes a delay out of the bounds, only Retry-After does
+        delay = self._bounded(self._jittered(delay))
+        if failed and retry_after is not None:
+            delay = max(delay, retry_after)
+        city.next_poll = self._clock() + delay
+        return delay
+
+
+class BikeChangeCounter:
+    """Bikes that moved, appeared or disappeared between consecutive snapshots of a city"""
+
+    def __init__(self):
+        self._positions = {}
+
+    def count(self, city_id, bike_entries) -> int | None:
+        """Changes since the previous snapshot of the city, None for its first one"""
+        positions = {
+            row[BIKE_NUMBER_INDEX]: (row[BIKE_LATITUDE_INDEX], row[BIKE_LONGITUDE_INDEX], row[BIKE_STATION_INDEX])
+            for row in entry_rows(bike_entries)
+        }
+        previous = self._positions.get(city_id)
+        self._positions[city_id] = positions
+        if previous is None:
+            return None
+        changed = sum(1 for bike, position in positions.items() if previous.get(bike) != position)
+        return changed + sum(1 for bike in previous if bike not in positions)
@@ -0,0 +1,263 @@
+import datetime
+import gzip
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+OPEN_SUFFIX = ".jsonl.gz.open"
+SEALED_SUFFIX = ".jsonl.gz"
+# Subdirectory of the spool for snapshots that could not be stored
+QUARANTINE_DIRECTORY = "quarantine"
+# Position of last_updated in Bike.as_tuple() and Station.as_tuple()
+ROW_TIMESTAMP_INDEX = 8
+# and in the station occupancy rows
+OCCUPANCY_TIMESTAMP_INDEX = 3
+
+
+@dataclass
+class SpooledSnapshot:
+    city_id: int
+    city: dict | None
+    bike_rows: list[tuple]
+    station_rows: list[tuple]
+    occupancy_rows: list[tuple] = field(default_factory=list)
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot spool {type(value).__name__}")
+
+
+def _decode_rows(rows, timestamp_index=ROW_TIMESTAMP_INDEX) -> list[tuple]:
+    decoded = []
+    for row in rows:
+        row[timestamp_index] = datetime.datetime.fromisoformat(row[timestamp_index])
+        decoded.append(tuple(row))
+    return decoded
+
+
+def encode_snapshot(city_id: int, city: dict | None, bike_rows, station_rows, occupancy_rows=()) -> bytes:
+    record = {
+        "city_id": city_id,
+        "city": city,
+        "bikes": list(bike_rows),
+        "stations": list(station_rows),
+        "occupancy": list(occupancy_rows),
+    }
+    return json.dumps(record, default=_json_default, separators=(",", ":")).encode() + b"\n"
+
+
+def decode_snapshot(line: bytes) -> SpooledSnapshot:
+    record = json.loads(line)
+    city = record["city"]
+    if city is not None:
+        city["last_updated"] = datetime.datetime.fromisoformat(city["last_updated"])
+    return SpooledSnapshot(
+        city_id=record["city_id"],
+        city=city,
+        bike_rows=_decode_rows(record["bikes"]),
+        station_rows=_decode_rows(record["stations"]),
+        # Segments spooled before occupancy tracking have no occupancy rows
+        occupancy_rows=_decode_rows(record.get("occupancy", []), OCCUPANCY_TIMESTAMP_INDEX),
+    )
+
+
+class SnapshotSpool:
+    """
+    Append-only spool of snapshots on local disk.
+
+    Snapshots are appended as gzip compressed JSON lines to the open segment.
+    Every append is its own gzip member, so a crash loses at most the
+    snapshot that was being written. After `segment_seconds` the open segment
+    is sealed and becomes ready for replay.
+    """
+
+    def __init__(self, directory: str, segment_seconds: int = 300, clock=time.time):
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._open_path = None
+        self._opened_at = None
+        os.makedirs(directory, exist_ok=True)
+        # Segments left open by a previous process are complete as far as they go
+        for name in os.listdir(directory):
+            if name.endswith(OPEN_SUFFIX):
+                path = os.path.join(directory, name)
+                os.replace(path, path[: -len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+
+    def append(self, city_id: int, city: dict | None, bike_rows, station_rows, occupancy_rows=()):
+        line = encode_snapshot(city_id, city, bike_rows, station_rows, occupancy_rows)
+        with self._lock:
+            if self._open_path is None:
+                self._opened_at = self.clock()
+                name = f"segment-{time.time_ns()}{OPEN_SUFFIX}"
+                self._open_path = os.path.join(self.directory, name)
+            with gzip.open(self._open_path, "ab", compresslevel=6) as segment:
+                segment.write(line)
+
+    def seal(self, force: bool = False):
+        """Close the open segment once it is old enough, or right away with `force`"""
+        with self._lock:
+            if self._open_path is None:
+                return
+            if not force and self.clock() - self._opened_at < self.segment_seconds:
+                return
+            os.replace(self._open_path, self._open_path[: -len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+            self._open_path = None
+            self._opened_at = None
+
+    def sealed_segments(self) -> list[str]:
+        """Sealed segments, oldest first"""
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEALED_SUFFIX))
+        return [os.path.join(self.directory, name) for name in names]
+
+    @staticmethod
+    def read_segment(path: str) -> list[SpooledSnapshot]:
+        snapshots = []
+        try:
+            with gzip.open(path, "rb") as segment:
+                for line in segment:
+                    snapshots.append(decode_snapshot(line))
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+            # A crash while appending leaves a truncated last snapshot
+            print(f"Spool segment {path} is truncated, replaying {len(snapshots)} snapshot(s)")
+        return snapshots
+
+    @staticmethod
+    def remove(path: str):
+        os.remove(path)
+
+    def quarantine(self, path: str, snapshots: list[SpooledSnapshot]) -> str:
+        """Move a segment out of the replay queue, keeping only `snapshots` of it"""
+        directory = os.path.join(self.directory, QUARANTINE_DIRECTORY)
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, os.path.basename(path))
+        with gzip.open(target + ".tmp", "wb", compresslevel=6) as segment:
+            for snapshot in snapshots:
+                segment.write(
+                    encode_snapshot(
+                        snapshot.city_id,
+                        snapshot.city,
+                        snapshot.bike_rows,
+                        snapshot.station_rows,
+                        snapshot.occupancy_rows,
+                    )
+                )
+        os.replace(target + ".tmp", target)
+        os.remove(path)
+        return target
+
+
+class SpoolFlusher:
+    """
+    Background thread that replays sealed spool segments into the database.
+    Every segment is written with `store_batch(snapshots)` in one go and
+    deleted afterwards. If the database is unavailable the segment stays on
+    disk and the flusher retries with exponential backoff, the poll loop is
+    never blocked.
+
+    A segment that failed `max_attempts` times is stored one snapshot at a
+    time and the snapshots that still fail are moved to the quarantine
+    directory of the spool, so one bad snapshot does not hold back all
+    later segments.
+    """
+
+    def __init__(
+        self,
+        spool: SnapshotSpool,
+        store_batch,
+        interval_seconds: float = 30,
+        max_backoff_seconds: float = 600,
+        max_attempts: int = 5,
+    ):
+        self.spool = spool
+        self.store_batch = store_batch
+        self.interval_seconds = interval_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.max_attempts = max_attempts
+        self._failed_attempts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="spool-flusher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def flush(self) -> bool:
+        """Replay all sealed segments. Returns False if a segment could not be stored."""
+        complete = True
+        stored_any = False
+        # Segments of which no snapshot could be stored on its own
+        unstored = []
+        for path in self.spool.sealed_segments():
+            snapshots = self.spool.read_segment(path)
+            try:
+                if snapshots:
+                    self.store_batch(snapshots)
+            except Exception as error:
+                attempts = self._failed_attempts.get(path, 0) + 1
+                self._failed_attempts[path] = attempts
+                print(
+                    f"Replaying spool segment {os.path.basename(path)} failed "
+                    f"({attempts}/{self.max_attempts}): {error!r}"
+                )
+                if attempts < self.max_attempts:
+                    complete = False
+                    break
+                failed = self._store_one_by_one(snapshots)
+                if len(failed) == len(snapshots):
+                    unstored.append((path, snapshots))
+                    continue
+                if failed:
+                    stored_any = True
+                    self._quarantine(path, failed)
+                    continue
+            stored_any = True
+            self._failed_attempts.pop(path, None)
+            self.spool.remove(path)
+            bikes = sum(len(snapshot.bike_rows) for snapshot in snapshots)
+            print(f"Replayed {len(snapshots)} spooled snapshot(s) with {bikes} bike entries")
+        for path, snapshots in unstored:
+            # With nothing stored at all the database is more likely down
+            # than the snapshots bad, keep them for the next flush
+            if stored_any:
+                self._quarantine(path, snapshots)
+            else:
+                complete = False
+        return complete
+
+    def _store_one_by_one(self, snapshots: list[SpooledSnapshot]) -> list[SpooledSnapshot]:
+        """Store the snapshots on their own, returns the ones that failed"""
+        failed = []
+        for snapshot in snapshots:
+            try:
+                self.store_batch([snapshot])
+            except Exception as error:
+                print(f"Storing a spooled snapshot of city {snapshot.city_id} failed: {error!r}")
+                failed.append(snapshot)
+        return failed
+
+    def _quarantine(self, path: str, snapshots: list[SpooledSnapshot]):
+        self._failed_attempts.pop(path, None)
+        target = self.spool.quarantine(path, snapshots)
+        print(f"Quarantined {len(snapshots)} spooled snapshot(s) that could not be stored in {target}")
+
+    def _run(self):
+        wait = self.interval_seconds
+        while not self._stop.wait(wait):
+            self.spool.seal()
+            if self.flush():
+                wait = self.interval_seconds
+            else:
+                wait = min(wait * 2, self.max_backoff_seconds)
+
+    def stop(self):
+        """Stop the thread and try to replay everything that is still spooled"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.spool.seal(force=True)
+        self.flush()
@@ -0,0 +1,111 @@
+from ijson.common import ObjectBuilder
+
+COUNTRY_PREFIX = "countries.item"
+CITY_PREFIX = "countries.item.cities.item"
+PLACE_PREFIX = "countries.item.cities.item.places.item"
+SCALAR_EVENTS = {"string", "number", "boolean", "null"}
+
+
+class PlaceStreamParser:
+    """
+    Turn ijson parse events of nextbike-live.json into places while the
+    document is still being read. Only the places of the first city of the
+    first country are returned, like NextbikeAPI.extract_places().
+    Scalar fields of that country and city are collected on the way. The
+    entries of a place need the country's timezone and the city's uid and
+    name, places read before all three are held back until they arrive or
+    the country ends, whatever the key order of the response.
+    """
+
+    def __init__(self):
+        self.country = {}
+        self.city = {}
+        self._country_index = -1
+        self._city_index = -1
+        self._place = None
+        self._pending = []
+        self._country_ended = False
+
+    def feed(self, prefix: str, event: str, value) -> list[dict]:
+        """Feed one parse event. Returns the places that are complete and ready, mostly none."""
+        if self._place is not None:
+            self._place.event(event, value)
+            if prefix == PLACE_PREFIX and event == "end_map":
+                self._pending.append(self._place.value)
+                self._place = None
+                return self._ready_places()
+            return []
+
+        if event == "start_map":
+            if prefix == COUNTRY_PREFIX:
+                self._country_index += 1
+                self._city_index = -1
+            elif prefix == CITY_PREFIX:
+                self._city_index += 1
+            elif prefix == PLACE_PREFIX and self._in_first_city():
+                self._place = ObjectBuilder()
+                self._place.event(event, value)
+            return []
+
+        if event == "end_map" and prefix == COUNTRY_PREFIX and self._country_index == 0:
+            # No more header fields, the defaults of City.from_api_data() apply
+            self._country_ended = True
+            return self._ready_places()
+
+        if event in SCALAR_EVENTS and self._country_index == 0:
+            parent, _, key = prefix.rpartition(".")
+            if parent == COUNTRY_PREFIX:
+                self.country[key] = value
+            elif parent == CITY_PREFIX and self._city_index == 0:
+                self.city[key] = value
+            return self._ready_places()
+        return []
+
+    def _ready_places(self) -> list[dict]:
+        if not self._pending or not (self._country_ended or self.header_known()):
+            return []
+        places, self._pending = self._pending, []
+        return places
+
+    def header_known(self) -> bool:
+        """True once the fields the entries of a place are built with were read"""
+        return "timezone" in self.country and "uid" in self.city and "name" in self.city
+
+    def _in_first_city(self) -> bool:
+        return self._country_index == 0 and self._city_index == 0
+
+    def api_header(self) -> dict:
+        """The response without places, shaped for City.from_api_data()"""
+        return {"countries": [{**self.country, "cities": [dict(self.city)]}]}
+
+
+class CountingReader:
+    """File object wrapper that counts the bytes ijson read"""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._raw.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class AsyncByteReader:
+    """Minimal async file object so ijson can read an httpx byte stream"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks.__aiter__()
+        self.bytes_read = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        # ijson probes the stream type with read(0)
+        if size == 0:
+            return b""
+        # ijson reads until it gets b"", so never hand out empty chunks early
+        async for chunk in self._chunks:
+            if chunk:
+                self.bytes_read += len(chunk)
+                return chunk
+        return b""
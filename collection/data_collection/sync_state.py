@@ -0,0 +1,92 @@
+import datetime
+import hashlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from zoneinfo import ZoneInfo
+
+from columnar import entry_rows
+
+# Station columns before last_updated, city_id and city_name
+STATION_CONTENT_COLUMNS = 8
+
+
+def station_content_hash(station_entries) -> str:
+    """Hash of everything in the station list except the timestamp"""
+    digest = hashlib.blake2b(digest_size=16)
+    for row in entry_rows(station_entries):
+        digest.update(repr(row[:STATION_CONTENT_COLUMNS]).encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class _StationSync:
+    last_written: datetime.datetime
+    content_hash: str | None
+
+
+class SyncStateCache:
+    """
+    Last station and city sync per city, kept in memory by the collector.
+
+    The timestamps are loaded from the database once per city and then only
+    updated from what the collector writes itself. Station lists are written:
+
+    - if the city never had stations written
+    - on the first snapshot of a new local day, processing reads the
+      stations of a day from that day's rows
+    - when the sync interval elapsed and the station list changed
+    """
+
+    def __init__(self, stations_sync_interval_hours: int, cities_sync_interval_hours: int):
+        self.station_interval = datetime.timedelta(hours=stations_sync_interval_hours)
+        self.city_interval = datetime.timedelta(hours=cities_sync_interval_hours)
+        self._stations = {}
+        self._cities = {}
+        self._loaded = set()
+
+    def load(self, db, city_ids):
+        """Fetch the sync timestamps of all cities not loaded yet with one query per table"""
+        missing = [city_id for city_id in city_ids if city_id not in self._loaded]
+        if not missing:
+            return
+        station_syncs = db.get_last_station_syncs(missing)
+        city_syncs = db.get_last_city_syncs(missing)
+        for city_id in missing:
+            if station_syncs.get(city_id) is not None:
+                self._stations[city_id] = _StationSync(station_syncs[city_id], None)
+            if city_syncs.get(city_id) is not None:
+                self._cities[city_id] = city_syncs[city_id]
+        self._loaded.update(missing)
+
+    def station_sync_due(self, city, content_hash: str) -> bool:
+        last = self._stations.get(city.city_id)
+        if last is None:
+            return True
+        timezone = ZoneInfo(city.timezone)
+        if last.last_written.astimezone(timezone).date() != city.last_updated.astimezone(timezone).date():
+            return True
+        if city.last_updated - last.last_written < self.station_interval:
+            return False
+        return content_hash != last.content_hash
+
+    def city_sync_due(self, city) -> bool:
+        last = self._cities.get(city.city_id)
+        return last is None or city.last_updated - last >= self.city_interval
+
+    def stations_written(self, city, content_hash: str):
+        self._stations[city.city_id] = _StationSync(city.last_updated, content_hash)
+
+    def city_written(self, city):
+        self._cities[city.city_id] = city.last_updated
+
+    @contextmanager
+    def rollback_on_error(self):
+        """Forget the syncs recorded inside the block if the block fails"""
+        stations = dict(self._stations)
+        cities = dict(self._cities)
+        try:
+            yield self
+        except BaseException:
+            self._stations = stations
+            self._cities = cities
+            raise
@@ -0,0 +1,83 @@
+import asyncio
+import time
+import unittest
+
+import httpx
+from query_nextbike import AsyncNextbikeAPI
+
+
+def _city_payload(city_id):
+    return {
+        "countries": [
+            {
+                "timezone": "Europe/Berlin",
+                "cities": [{"uid": city_id, "name": f"City {city_id}", "places": []}],
+            }
+        ]
+    }
+
+
+class TestAsyncNextbikeAPI(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _slow_handler(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+        city_id = int(request.url.params["city"])
+        return httpx.Response(200, json=_city_payload(city_id))
+
+    async def test_fetch_all_returns_data_per_city(self):
+        transport = httpx.MockTransport(self._slow_handler)
+        async with AsyncNextbikeAPI(transport=transport) as api:
+            results = await api.fetch_all([467, 773])
+
+        self.assertEqual(results[467]["countries"][0]["cities"][0]["uid"], 467)
+        self.assertEqual(results[773]["countries"][0]["cities"][0]["uid"], 773)
+
+    async def test_cities_are_fetched_concurrently(self):
+        transport = httpx.MockTransport(self._slow_handler)
+        start = time.perf_counter()
+        async with AsyncNextbikeAPI(max_concurrency=10, transport=transport) as api:
+            await api.fetch_all(list(range(10)))
+        elapsed = time.perf_counter() - start
+
+        # Ten sequential requests would take at least 0.5 s
+        self.assertLess(elapsed, 0.3)
+        self.assertGreater(self.max_in_flight, 1)
+
+    async def test_concurrency_is_capped(self):
+        transport = httpx.MockTransport(self._slow_handler)
+        async with AsyncNextbikeAPI(max_concurrency=3, transport=transport) as api:
+            await api.fetch_all(list(range(10)))
+
+        self.assertLessEqual(self.max_in_flight, 3)
+
+    async def test_failing_city_does_not_fail_other_cities(self):
+        def handler(request):
+            city_id = int(request.url.params["city"])
+            if city_id == 1:
+                return httpx.Response(503)
+            return httpx.Response(200, json=_city_payload(city_id))
+
+        async with AsyncNextbikeAPI(transport=httpx.MockTransport(handler)) as api:
+            results = await api.fetch_all([1, 2])
+
+        self.assertIsInstance(results[1], httpx.HTTPStatusError)
+        self.assertEqual(results[2]["countries"][0]["cities"][0]["uid"], 2)
+
+    async def test_timeout_is_reported_per_city(self):
+        async def handler(request):
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        async with AsyncNextbikeAPI(timeout=0.1, transport=httpx.MockTransport(handler)) as api:
+            results = await api.fetch_all([467])
+
+        self.assertIsInstance(results[467], httpx.TimeoutException)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+from benchmarks.bench_collector import run_scenario
+
+
+class TestBenchCollector(unittest.TestCase):
+    def _run(self, **options):
+        return run_scenario(dict({
+            "city_ids": [1, 2],
+            "bikes": 50,
+            "latency_ms": 0,
+            "payload": None,
+            "ticks": 1,
+            "warmup": 0,
+            "mode": "daemon",
+            "backend": "null",
+            "concurrency": 2,
+            "parquet_dir": "",
+            "stream": False,
+            "columnar": False,
+            "delta": False,
+        }, **options))
+
+    def test_null_backend_stores_every_city(self):
+        result = self._run()
+
+        self.assertEqual(result["failures"], 0)
+        self.assertGreater(result["rows_per_second"], 0)
+
+    def test_null_backend_stores_columnar_snapshots(self):
+        result = self._run(stream=True, columnar=True)
+
+        self.assertEqual(result["failures"], 0)
+        self.assertGreater(result["rows_per_second"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
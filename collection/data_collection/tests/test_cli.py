@@ -16,6 +16,54 @@ class TestNextbikeCLI(unittest.TestCase):
         expected_ids = [467, 123]
         self.assertEqual(cli.city_ids, expected_ids)
 
+    def test_concurrent_defaults_to_false(self):
+        cli = NextbikeCLI(["--city-ids", "467"])
+        self.assertFalse(cli.concurrent)
+
+    def test_concurrent_flag(self):
+        cli = NextbikeCLI(["--city-ids", "467", "--concurrent"])
+        self.assertTrue(cli.concurrent)
+
+    def test_daemon_flag(self):
+        cli = NextbikeCLI(["--city-ids", "467", "--daemon"])
+        self.assertTrue(cli.daemon)
+
+    def test_delta_flag_with_daemon(self):
+        cli = NextbikeCLI(["--city-ids", "467", "--daemon", "--delta"])
+        self.assertTrue(cli.delta)
+
+    def test_delta_requires_daemon(self):
+        with self.assertRaises(SystemExit):
+            NextbikeCLI(["--city-ids", "467", "--delta"])
+
+    def test_adaptive_flag_with_daemon(self):
+        cli = NextbikeCLI(["--city-ids", "467", "--daemon", "--adaptive"])
+        self.assertTrue(cli.adaptive)
+
+    def test_adaptive_requires_daemon(self):
+        with self.assertRaises(SystemExit):
+            NextbikeCLI(["--city-ids", "467", "--adaptive"])
+
+    def test_columnar_flag(self):
+        cli = NextbikeCLI(["--city-ids", "467", "--columnar"])
+        self.assertTrue(cli.columnar)
+
+    def test_columnar_cannot_be_combined_with_delta(self):
+        with self.assertRaises(SystemExit):
+            NextbikeCLI(["--city-ids", "467", "--daemon", "--delta", "--columnar"])
+
+    def test_stream_flag(self):
+        cli = NextbikeCLI(["--city-ids", "467", "--stream"])
+        self.assertTrue(cli.stream)
+
+    def test_spool_flag(self):
+        cli = NextbikeCLI(["--city-ids", "467", "--save", "--spool"])
+        self.assertTrue(cli.spool)
+
+    def test_spool_requires_save(self):
+        with self.assertRaises(SystemExit):
+            NextbikeCLI(["--city-ids", "467", "--spool"])
+
 
 class TestAppConfig(unittest.TestCase):
     def setUp(self) -> None:
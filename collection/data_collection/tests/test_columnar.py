@@ -0,0 +1,66 @@
+import datetime
+import unittest
+from columnar import BikeColumns, StationColumns, entry_rows
+from query_nextbike import Bike, Station
+
+
+class TestColumnarMatchesDataclasses(unittest.TestCase):
+    def setUp(self):
+        self.timestamp = datetime.datetime.now()
+        self.places = [
+            {
+                "uid": 1001,
+                "lat": 47.0,
+                "lng": 12.0,
+                "number": 101,
+                "bike": False,
+                "name": "Bahnhof",
+                "spot": True,
+                "maintenance": False,
+                "terminal_type": "sign",
+                "bike_list": [
+                    {"number": "B001", "active": True, "state": "ok", "bike_type": "150"},
+                    {"number": "B002", "active": False, "state": "maintenance", "bike_type": "237"},
+                ],
+            },
+            {"uid": 1002, "lat": 47.1, "lng": 12.1, "number": 0, "bike": True,
+             "bike_list": [{"number": "B003"}]},
+            {"uid": 1003, "lat": 47.2, "lng": 12.2, "number": 103, "bike": False, "bike_list": []},
+        ]
+
+    def test_bike_rows_match_bike_tuples(self):
+        columns = BikeColumns.from_places(self.places, 773, "Kufstein", self.timestamp)
+        bikes = Bike.bike_entries_from_place(self.places, 773, "Kufstein", self.timestamp)
+
+        self.assertEqual(list(columns.rows()), [bike.as_tuple() for bike in bikes])
+
+    def test_station_rows_match_station_tuples(self):
+        columns = StationColumns.from_places(self.places, 773, "Kufstein", self.timestamp)
+        stations = Station.build_station_entries(self.places, 773, "Kufstein", self.timestamp)
+
+        self.assertEqual(list(columns.rows()), [station.as_tuple() for station in stations])
+
+    def test_len(self):
+        self.assertEqual(len(BikeColumns.from_places(self.places, 1, "X", self.timestamp)), 3)
+        self.assertEqual(len(StationColumns.from_places(self.places, 1, "X", self.timestamp)), 2)
+
+    def test_empty_places(self):
+        columns = BikeColumns.from_places([], 1, "X", self.timestamp)
+        self.assertEqual(len(columns), 0)
+        self.assertEqual(list(columns.rows()), [])
+
+
+class TestEntryRows(unittest.TestCase):
+    def test_dataclass_entries_use_as_tuple(self):
+        bike = Bike("1", 1.0, 2.0, True, "ok", "150", 3, 4, datetime.datetime.now(), 5, "X")
+        self.assertEqual(list(entry_rows([bike])), [bike.as_tuple()])
+
+    def test_columnar_entries_use_rows(self):
+        columns = BikeColumns.from_places(
+            [{"lat": 1.0, "lng": 2.0, "bike_list": [{"number": "1"}]}], 5, "X", None
+        )
+        self.assertEqual(len(list(entry_rows(columns))), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
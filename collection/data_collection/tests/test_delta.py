@@ -0,0 +1,125 @@
+import datetime
+import random
+import unittest
+from delta import BikeDeltaFilter
+from query_nextbike import Bike
+
+
+START = datetime.datetime(2026, 6, 9, 8, 0, tzinfo=datetime.timezone.utc)
+
+
+def _bike(number, minute, position, state="ok"):
+    latitude, longitude = position
+    return Bike(
+        bike_number=number,
+        latitude=latitude,
+        longitude=longitude,
+        active=True,
+        state=state,
+        bike_type="150",
+        station_number=0,
+        station_uid=0,
+        last_updated=START + datetime.timedelta(minutes=minute),
+        city_id=467,
+        city_name="Gießen",
+    )
+
+
+def _trips(rows):
+    """Python version of the LEAD() query in processing/nextbike_processing/trips.py"""
+    trips = []
+    by_bike = {}
+    for row in rows:
+        by_bike.setdefault(row.bike_number, []).append(row)
+    for bike_rows in by_bike.values():
+        bike_rows.sort(key=lambda row: row.last_updated)
+        for start, end in zip(bike_rows, bike_rows[1:]):
+            if (start.latitude, start.longitude) != (end.latitude, end.longitude):
+                trips.append((
+                    start.bike_number,
+                    start.latitude, start.longitude, start.last_updated,
+                    end.latitude, end.longitude, end.last_updated,
+                ))
+    return sorted(trips)
+
+
+def _run(delta_filter, polls):
+    written = []
+    for poll in polls:
+        rows, updates = delta_filter.select(poll)
+        written.extend(rows)
+        delta_filter.remember(updates)
+    written.extend(delta_filter.unwritten())
+    return written
+
+
+class TestBikeDeltaFilter(unittest.TestCase):
+    def setUp(self):
+        self.delta_filter = BikeDeltaFilter(heartbeat_seconds=3600)
+
+    def test_first_sighting_is_written(self):
+        rows, _ = self.delta_filter.select([_bike("1", 0, (50.0, 8.0))])
+        self.assertEqual(len(rows), 1)
+
+    def test_unchanged_bike_is_skipped(self):
+        _run(self.delta_filter, [[_bike("1", 0, (50.0, 8.0))]])
+        rows, _ = self.delta_filter.select([_bike("1", 1, (50.0, 8.0))])
+        self.assertEqual(rows, [])
+
+    def test_move_writes_previous_and_current_sighting(self):
+        _run(self.delta_filter, [[_bike("1", 0, (50.0, 8.0))], [_bike("1", 1, (50.0, 8.0))]])
+        rows, _ = self.delta_filter.select([_bike("1", 2, (50.1, 8.1))])
+
+        self.assertEqual([row.last_updated.minute for row in rows], [1, 2])
+
+    def test_state_change_is_written(self):
+        _run(self.delta_filter, [[_bike("1", 0, (50.0, 8.0))]])
+        rows, _ = self.delta_filter.select([_bike("1", 1, (50.0, 8.0), state="maintenance")])
+        self.assertEqual(len(rows), 1)
+
+    def test_heartbeat_is_written(self):
+        polls = [[_bike("1", minute, (50.0, 8.0))] for minute in range(0, 121)]
+        written = _run(BikeDeltaFilter(heartbeat_seconds=3600), polls)
+
+        self.assertEqual([row.last_updated.hour for row in written], [8, 9, 10])
+
+    def test_nothing_is_remembered_without_remember(self):
+        self.delta_filter.select([_bike("1", 0, (50.0, 8.0))])
+        rows, _ = self.delta_filter.select([_bike("1", 1, (50.0, 8.0))])
+        self.assertEqual(len(rows), 1)
+
+    def test_same_bike_number_in_two_cities_is_tracked_separately(self):
+        other_city = _bike("1", 0, (50.0, 8.0))
+        other_city.city_id = 773
+        rows, _ = self.delta_filter.select([_bike("1", 0, (50.0, 8.0)), other_city])
+        self.assertEqual(len(rows), 2)
+
+
+class TestDeltaKeepsTrips(unittest.TestCase):
+    def test_trips_match_full_snapshots(self):
+        rng = random.Random(42)
+        spots = [(50.0 + i / 100, 8.0 + i / 100) for i in range(6)]
+        positions = {str(number): rng.choice(spots) for number in range(25)}
+
+        polls = []
+        for minute in range(600):
+            poll = []
+            for number in positions:
+                if rng.random() < 0.02:
+                    positions[number] = rng.choice(spots)
+                # Bikes on a trip disappear from the API for a while
+                if rng.random() < 0.05:
+                    continue
+                poll.append(_bike(number, minute, positions[number]))
+            polls.append(poll)
+
+        full_rows = [bike for poll in polls for bike in poll]
+        delta_rows = _run(BikeDeltaFilter(heartbeat_seconds=3600), polls)
+
+        self.assertLess(len(delta_rows), len(full_rows) / 2)
+        self.assertTrue(_trips(full_rows))
+        self.assertEqual(_trips(delta_rows), _trips(full_rows))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+import unittest
+import urllib.request
+
+import httpx
+from metrics import CollectorMetrics, Histogram, MetricsServer
+from query_nextbike import AsyncNextbikeAPI
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets_are_cumulative(self):
+        histogram = Histogram(buckets=(0.1, 1, 10))
+        for value in (0.05, 0.5, 5, 50):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.counts, [1, 2, 3])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.sum, 55.55)
+
+
+class TestCollectorMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = CollectorMetrics(buckets=(0.1, 1))
+
+    def test_prometheus_text(self):
+        self.metrics.observe_phase(467, "fetch", 0.5)
+        self.metrics.add_payload_bytes(467, 1024)
+        self.metrics.add_rows(467, "bikes", 300)
+        self.metrics.observe_tick(0.02, 1)
+
+        text = self.metrics.render_prometheus()
+
+        self.assertIn('nextbike_collector_phase_seconds_bucket{city_id="467",phase="fetch",le="0.1"} 0', text)
+        self.assertIn('nextbike_collector_phase_seconds_bucket{city_id="467",phase="fetch",le="1.0"} 1', text)
+        self.assertIn('nextbike_collector_phase_seconds_bucket{city_id="467",phase="fetch",le="+Inf"} 1', text)
+        self.assertIn('nextbike_collector_phase_seconds_count{city_id="467",phase="fetch"} 1', text)
+        self.assertIn('nextbike_collector_payload_bytes_total{city_id="467"} 1024', text)
+        self.assertIn('nextbike_collector_rows_written_total{city_id="467",table="bikes"} 300', text)
+        self.assertIn('nextbike_collector_tick_lateness_seconds_count 1', text)
+        self.assertIn("nextbike_collector_ticks_skipped_total 1", text)
+
+    def test_poll_interval_gauge(self):
+        self.metrics.set_poll_interval(467, 45.0)
+
+        text = self.metrics.render_prometheus()
+
+        self.assertIn("# TYPE nextbike_collector_poll_interval_seconds gauge", text)
+        self.assertIn('nextbike_collector_poll_interval_seconds{city_id="467"} 45.0', text)
+        self.assertEqual(self.metrics.snapshot()["cities"]["467"]["poll_interval_seconds"], 45.0)
+
+    def test_failed_phase_is_counted_not_timed(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.time_phase(467, "store"):
+                raise ValueError("database down")
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["cities"]["467"]["failures"], {"store": 1})
+        self.assertNotIn("phases", snapshot["cities"]["467"])
+
+    def test_dump_json(self):
+        self.metrics.observe_phase(467, "parse", 0.01)
+        path = os.path.join(tempfile.mkdtemp(), "metrics.json")
+
+        self.metrics.dump_json(path)
+
+        with open(path) as dump:
+            data = json.load(dump)
+        self.assertEqual(data["cities"]["467"]["phases"]["parse"]["count"], 1)
+
+
+class TestMetricsServer(unittest.TestCase):
+    def test_serves_metrics(self):
+        metrics = CollectorMetrics()
+        metrics.add_rows(467, "bikes", 3)
+        server = MetricsServer(metrics, port=0)
+        server.start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+                body = response.read().decode()
+        finally:
+            server.stop()
+
+        self.assertIn('nextbike_collector_rows_written_total{city_id="467",table="bikes"} 3', body)
+
+
+class TestApiMetrics(unittest.IsolatedAsyncioTestCase):
+    async def test_fetch_records_phases_and_payload_bytes(self):
+        body = json.dumps({"countries": []}).encode()
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+        metrics = CollectorMetrics()
+
+        async with AsyncNextbikeAPI(transport=transport, metrics=metrics) as api:
+            await api.fetch_all([467])
+
+        city = metrics.snapshot()["cities"]["467"]
+        self.assertEqual(set(city["phases"]), {"fetch", "decode"})
+        self.assertEqual(city["payload_bytes"], len(body))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import datetime
+import unittest
+from zoneinfo import ZoneInfo
+
+from columnar import BikeColumns, StationColumns
+from occupancy import StationOccupancyTracker
+from query_nextbike import Bike, City, Station
+
+BERLIN = ZoneInfo("Europe/Berlin")
+
+
+def _snapshot(timestamp, bikes_at_station):
+    """`bikes_at_station` maps station number to the bike numbers parked there"""
+    city = City(467, "Gießen", "Europe/Berlin", 50.58, 8.67, 10, 1, timestamp)
+    stations = [
+        Station(1000 + number, 50.58, 8.67, f"Station {number}", True, number, False, "sign", timestamp, 467, "Gießen")
+        for number in (1, 2)
+    ]
+    bikes = [
+        Bike(bike_number, 50.58, 8.67, True, "ok", "150", number, 1000 + number, timestamp, 467, "Gießen")
+        for number, bike_numbers in bikes_at_station.items()
+        for bike_number in bike_numbers
+    ]
+    # A free-floating bike is not at any station
+    bikes.append(Bike("99", 50.6, 8.7, True, "ok", "150", 0, 0, timestamp, 467, "Gießen"))
+    return city, bikes, stations
+
+
+class TestStationOccupancyTracker(unittest.TestCase):
+    def setUp(self):
+        self.tracker = StationOccupancyTracker()
+        self.start = datetime.datetime(2026, 6, 9, 10, 0, tzinfo=BERLIN)
+
+    def _changes(self, minute, bikes_at_station):
+        timestamp = self.start + datetime.timedelta(minutes=minute)
+        return self.tracker.changes(*_snapshot(timestamp, bikes_at_station))
+
+    def test_first_snapshot_writes_every_station(self):
+        rows = self._changes(0, {1: ["10", "11"]})
+
+        self.assertEqual(
+            [(row[0], row[1], row[2]) for row in rows],
+            [(1, 2, "10, 11"), (2, 0, "")],
+        )
+        self.assertEqual(rows[0][3:], (self.start, 467))
+
+    def test_only_changed_stations_are_written(self):
+        self._changes(0, {1: ["10", "11"]})
+        self.assertEqual(self._changes(1, {1: ["10", "11"]}), [])
+
+        rows = self._changes(2, {1: ["10"], 2: ["11"]})
+        self.assertEqual([(row[0], row[1]) for row in rows], [(1, 1), (2, 1)])
+
+    def test_new_local_day_writes_every_station(self):
+        self._changes(0, {1: ["10"]})
+        # 22:00 UTC is midnight in Berlin
+        midnight = datetime.datetime(2026, 6, 9, 22, 0, tzinfo=datetime.timezone.utc)
+        rows = self.tracker.changes(*_snapshot(midnight, {1: ["10"]}))
+        self.assertEqual(len(rows), 2)
+
+    def test_columnar_entries(self):
+        city, _, _ = _snapshot(self.start, {})
+        places = [
+            {"uid": 1001, "number": 1, "bike": False, "bike_list": [{"number": "10"}]},
+            {"uid": 1002, "number": 2, "bike": False, "bike_list": []},
+        ]
+        bikes = BikeColumns.from_places(places, 467, "Gießen", self.start)
+        stations = StationColumns.from_places(places, 467, "Gießen", self.start)
+
+        rows = self.tracker.changes(city, bikes, stations)
+        self.assertEqual([(row[0], row[1], row[2]) for row in rows], [(1, 1, "10"), (2, 0, "")])
+
+    def test_rollback_on_error_restores_counts(self):
+        self._changes(0, {1: ["10"]})
+        with self.assertRaises(RuntimeError):
+            with self.tracker.rollback_on_error():
+                self._changes(1, {1: []})
+                raise RuntimeError("database down")
+
+        rows = self._changes(2, {1: []})
+        self.assertEqual([(row[0], row[1]) for row in rows], [(1, 0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
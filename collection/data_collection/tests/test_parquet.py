@@ -0,0 +1,123 @@
+import datetime
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from columnar import BikeColumns
+from database.parquet import ParquetClient, pa, pq
+from query_nextbike import Bike, City, Station
+
+START = datetime.datetime(2026, 6, 9, 8, 0, tzinfo=datetime.timezone.utc)
+
+
+def _snapshot(minute):
+    timestamp = START + datetime.timedelta(minutes=minute)
+    city = City(467, "Gießen", "Europe/Berlin", 50.58, 8.67, 10, 1, timestamp)
+    bikes = [
+        Bike("B1", 50.58, 8.67, True, "ok", 150, 1, 1001, timestamp, 467, "Gießen"),
+        Bike("B2", 50.59, 8.68, True, "ok", "150", 0, 0, timestamp, 467, "Gießen"),
+    ]
+    stations = [Station(1001, 50.58, 8.67, "Bahnhof", True, 1, False, "sign", timestamp, 467, "Gießen")]
+    return city, bikes, stations
+
+
+@unittest.skipIf(pa is None, "pyarrow is not installed")
+class TestParquetClient(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.client = ParquetClient(
+            SimpleNamespace(parquet_dir=self.root, parquet_compression="zstd", parquet_roll_seconds=300)
+        )
+
+    def _bike_files(self):
+        directory = os.path.join(self.root, "bikes", "city_id=467", "date=2026-06-09")
+        return sorted(os.listdir(directory))
+
+    def test_one_file_per_hour_and_row_group_per_write(self):
+        for minute in (0, 30, 70):
+            self.client.insert_bike_entries(_snapshot(minute)[1])
+        self.client.close()
+
+        self.assertEqual(self._bike_files(), ["bikes_20260609T08.parquet", "bikes_20260609T09.parquet"])
+        first_hour = pq.ParquetFile(os.path.join(
+            self.root, "bikes", "city_id=467", "date=2026-06-09", "bikes_20260609T08.parquet"
+        ))
+        self.assertEqual(first_hour.metadata.num_row_groups, 2)
+        statistics = first_hour.metadata.row_group(1).column(8).statistics
+        self.assertEqual(statistics.min, START + datetime.timedelta(minutes=30))
+
+    def test_running_hour_is_in_progress_until_closed(self):
+        self.client.insert_bike_entries(_snapshot(0)[1])
+        self.assertEqual(self._bike_files(), [".bikes_20260609T08.parquet.inprogress"])
+
+        self.client.close()
+        self.assertEqual(self._bike_files(), ["bikes_20260609T08.parquet"])
+
+    def test_dataset_is_readable_while_writing(self):
+        import pyarrow.dataset as ds
+
+        self.client.insert_bike_entries(_snapshot(0)[1])
+        self.client.insert_bike_entries(_snapshot(70)[1])
+
+        bikes = ds.dataset(os.path.join(self.root, "bikes"), partitioning="hive")
+        self.assertEqual(bikes.to_table().num_rows, 2)
+
+    @patch("database.parquet.time.monotonic")
+    def test_open_file_is_rolled_within_the_hour(self, mock_monotonic):
+        mock_monotonic.return_value = 0
+        self.client.insert_bike_entries(_snapshot(0)[1])
+        mock_monotonic.return_value = 299
+        self.client.insert_bike_entries(_snapshot(5)[1])
+        mock_monotonic.return_value = 301
+        self.client.insert_bike_entries(_snapshot(10)[1])
+
+        self.assertEqual(
+            self._bike_files(),
+            [".bikes_20260609T08_1.parquet.inprogress", "bikes_20260609T08.parquet"],
+        )
+        self.client.close()
+        self.assertEqual(self._bike_files(), ["bikes_20260609T08.parquet", "bikes_20260609T08_1.parquet"])
+
+    def test_rows_roundtrip_with_text_coercion(self):
+        _, bikes, _ = _snapshot(0)
+        self.client.insert_bike_entries(bikes)
+        self.client.close()
+
+        table = pq.read_table(os.path.join(
+            self.root, "bikes", "city_id=467", "date=2026-06-09", "bikes_20260609T08.parquet"
+        ))
+        self.assertEqual(table.column("bike_type").to_pylist(), ["150", "150"])
+        self.assertEqual(table.column("last_updated").to_pylist()[0], START)
+
+    def test_columnar_entries(self):
+        places = [{"lat": 50.0, "lng": 8.0, "number": 1, "uid": 2, "bike_list": [{"number": "B1"}]}]
+        self.client.insert_bike_entries(BikeColumns.from_places(places, 467, "Gießen", START))
+        self.client.close()
+
+        table = pq.read_table(os.path.join(
+            self.root, "bikes", "city_id=467", "date=2026-06-09", "bikes_20260609T08.parquet"
+        ))
+        self.assertEqual(table.column("bike_number").to_pylist(), ["B1"])
+        self.assertEqual(table.column("city_id").to_pylist(), [467])
+
+    def test_last_syncs_from_statistics(self):
+        for minute in (0, 70):
+            city, _, stations = _snapshot(minute)
+            self.client.insert_station_entries(stations)
+            self.client.insert_city_information(city)
+        self.client.close()
+
+        self.assertEqual(
+            self.client.get_last_station_syncs([467, 773]),
+            {467: START + datetime.timedelta(minutes=70)},
+        )
+        self.assertEqual(
+            self.client.get_last_city_syncs([467]),
+            {467: START + datetime.timedelta(minutes=70)},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
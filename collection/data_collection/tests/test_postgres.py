@@ -1,7 +1,18 @@
 import re
 import unittest
 import datetime
-from database.postgres import PostgresClient
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from psycopg import errors
+from database.postgres import (
+    BIKE_COLUMNS,
+    BIKE_COPY_TYPES,
+    STATION_COLUMNS,
+    SNAPSHOT_COLUMNS,
+    STATION_COPY_TYPES,
+    BikeIdCache,
+    PostgresClient,
+)
 from query_nextbike import City, Bike, Station
 
 
@@ -92,3 +103,290 @@ class TestStationInsertStatement(unittest.TestCase):
         placeholders = re.findall(r"$\((.*?)\)s", self.sql_statement)
         for placeholder in placeholders:
             self.assertIn(placeholder, self.bike.__dict__)
+
+
+class TestCopyStatement(unittest.TestCase):
+    def test_copy_statement_lists_bike_columns(self):
+        statement = PostgresClient.copy_statement("public.bikes", BIKE_COLUMNS)
+        self.assertEqual(
+            statement,
+            "COPY public.bikes (bike_number, latitude, longitude, active, state, bike_type, "
+            "station_number, station_uid, last_updated, city_id, city_name) FROM STDIN (FORMAT BINARY)",
+        )
+
+    def test_bike_columns_match_bike_tuple_order(self):
+        now = datetime.datetime.now()
+        bike = Bike("1", 1.0, 2.0, True, "ok", "150", 3, 4, now, 5, "X")
+        self.assertEqual(BIKE_COLUMNS, tuple(bike.__dict__.keys()))
+        self.assertEqual(len(BIKE_COPY_TYPES), len(BIKE_COLUMNS))
+
+    def test_station_columns_match_station_tuple_order(self):
+        now = datetime.datetime.now()
+        station = Station(1, 1.0, 2.0, "A", True, 3, False, "sign", now, 5, "X")
+        self.assertEqual(STATION_COLUMNS, tuple(station.__dict__.keys()))
+        self.assertEqual(len(STATION_COPY_TYPES), len(STATION_COLUMNS))
+
+    def test_staging_table_name(self):
+        self.assertEqual(PostgresClient.staging_table_name("public.bikes"), "public.bikes_staging")
+
+
+class TestCopyRows(unittest.TestCase):
+    def setUp(self):
+        self.copy = MagicMock()
+        self.cursor = MagicMock()
+        self.cursor.copy.return_value.__enter__.return_value = self.copy
+
+    def test_writes_every_row(self):
+        rows = [("a", 1), ("b", 2)]
+        PostgresClient.copy_rows(self.cursor, "COPY t FROM STDIN", ("text", "int4"), rows)
+
+        self.copy.set_types.assert_called_once_with(("text", "int4"))
+        self.assertEqual(self.copy.write_row.call_count, 2)
+
+    def test_converts_numbers_in_text_columns(self):
+        rows = [("B001", 150, None)]
+        PostgresClient.copy_rows(self.cursor, "COPY t FROM STDIN", ("text", "text", "text"), rows)
+
+        self.copy.write_row.assert_called_once_with(["B001", "150", None])
+
+
+def _test_config(ingest_mode="copy", partitions_ahead_days=0, bike_storage="wide"):
+    return SimpleNamespace(
+        db_host="localhost", db_port=5432, db_name="db", db_user="u", db_password="p",
+        db_bikes_table="public.bikes", db_stations_table="public.stations",
+        db_cities_table="public.cities", db_station_occupancy_table="public.station_occupancy",
+        db_ingest_mode=ingest_mode,
+        db_bike_storage=bike_storage,
+        db_bike_snapshots_table="public.bike_snapshots", db_bike_dim_table="public.bike_dim",
+        db_pool_min_size=1, db_pool_max_size=2,
+        db_bike_partitions_ahead_days=partitions_ahead_days,
+    )
+
+
+def _pooled_cursor(mock_pool):
+    connection = mock_pool.return_value.connection.return_value.__enter__.return_value
+    return connection.cursor.return_value.__enter__.return_value
+
+
+class TestInsertBikeEntries(unittest.TestCase):
+    def _bike(self):
+        return Bike("1", 1.0, 2.0, True, "ok", "150", 3, 4, datetime.datetime.now(), 5, "X")
+
+    def test_unknown_ingest_mode_raises(self):
+        with self.assertRaises(ValueError):
+            PostgresClient(_test_config("bogus"))
+
+    @patch("database.postgres.ConnectionPool")
+    def test_copy_mode_uses_single_copy(self, mock_pool):
+        cursor = _pooled_cursor(mock_pool)
+        PostgresClient(_test_config("copy")).insert_bike_entries([self._bike(), self._bike()])
+
+        cursor.copy.assert_called_once()
+        self.assertIn("COPY public.bikes", cursor.copy.call_args.args[0])
+        cursor.executemany.assert_not_called()
+
+    @patch("database.postgres.ConnectionPool")
+    def test_copy_staging_mode_moves_rows_from_staging_table(self, mock_pool):
+        cursor = _pooled_cursor(mock_pool)
+        PostgresClient(_test_config("copy_staging")).insert_bike_entries([self._bike()])
+
+        self.assertIn("COPY public.bikes_staging", cursor.copy.call_args.args[0])
+        executed = " ".join(call.args[0] for call in cursor.execute.call_args_list)
+        self.assertIn("CREATE UNLOGGED TABLE IF NOT EXISTS public.bikes_staging", executed)
+        self.assertIn("INSERT INTO public.bikes", executed)
+
+    @patch("database.postgres.ConnectionPool")
+    def test_insert_mode_uses_executemany(self, mock_pool):
+        cursor = _pooled_cursor(mock_pool)
+        PostgresClient(_test_config("insert")).insert_bike_entries([self._bike()])
+
+        cursor.executemany.assert_called_once()
+        cursor.copy.assert_not_called()
+
+
+class TestNormalizedBikeStorage(unittest.TestCase):
+    def _bike(self, number="1"):
+        return Bike(number, 1.0, 2.0, True, "ok", 150, 3, 4, datetime.datetime.now(), 5, "X")
+
+    def _cursor(self, mock_pool, known, new):
+        cursor = _pooled_cursor(mock_pool)
+        cursor.fetchall.side_effect = [known, new]
+        return cursor
+
+    def test_unknown_bike_storage_raises(self):
+        with self.assertRaises(ValueError):
+            PostgresClient(_test_config(bike_storage="bogus"))
+
+    @patch("database.postgres.ConnectionPool")
+    def test_copies_bike_ids_instead_of_numbers(self, mock_pool):
+        cursor = self._cursor(mock_pool, known=[(5, "1", 10)], new=[(5, "2", 11)])
+        copy = cursor.copy.return_value.__enter__.return_value
+
+        PostgresClient(_test_config(bike_storage="normalized")).insert_bike_entries(
+            [self._bike("1"), self._bike("2"), self._bike("1")]
+        )
+
+        self.assertIn("COPY public.bike_snapshots (bike_id, city_id", cursor.copy.call_args.args[0])
+        rows = [call.args[0] for call in copy.write_row.call_args_list]
+        self.assertEqual([row[0] for row in rows], [10, 11, 10])
+        self.assertEqual(len(rows[0]), len(SNAPSHOT_COLUMNS))
+        self.assertEqual(rows[0][1], 5)
+        self.assertEqual(rows[0][-1], "150")
+        insert = cursor.execute.call_args_list[1]
+        self.assertIn("INSERT INTO public.bike_dim", insert.args[0])
+        self.assertEqual(insert.args[1], ([5], ["2"]))
+
+    @patch("database.postgres.ConnectionPool")
+    def test_known_bikes_are_not_looked_up_again(self, mock_pool):
+        cursor = self._cursor(mock_pool, known=[(5, "1", 10)], new=[])
+        client = PostgresClient(_test_config(bike_storage="normalized"))
+
+        client.insert_bike_entries([self._bike("1")])
+        client.insert_bike_entries([self._bike("1")])
+
+        self.assertEqual(cursor.execute.call_count, 1)
+
+    @patch("database.postgres.ConnectionPool")
+    def test_insert_mode_uses_executemany(self, mock_pool):
+        cursor = self._cursor(mock_pool, known=[(5, "1", 10)], new=[])
+
+        PostgresClient(_test_config("insert", bike_storage="normalized")).insert_bike_entries([self._bike("1")])
+
+        self.assertIn("INSERT INTO public.bike_snapshots", cursor.executemany.call_args.args[0])
+        cursor.copy.assert_not_called()
+
+
+class TestBikeIdCache(unittest.TestCase):
+    def _row(self, number):
+        return Bike(number, 1.0, 2.0, True, "ok", "150", 3, 4, datetime.datetime.now(), 5, "X").as_tuple()
+
+    def test_new_ids_are_kept_after_commit(self):
+        cache = BikeIdCache("public.bike_dim")
+        cursor = MagicMock()
+        cursor.fetchall.side_effect = [[], [(5, "7", 70)]]
+
+        self.assertEqual(cache.bike_ids(cursor, [self._row("7")]), [70])
+        cache.commit()
+
+        self.assertEqual(cache.bike_ids(cursor, [self._row("7")]), [70])
+        self.assertEqual(cursor.execute.call_count, 3)
+
+    def test_new_ids_are_forgotten_after_rollback(self):
+        cache = BikeIdCache("public.bike_dim")
+        cursor = MagicMock()
+        cursor.fetchall.side_effect = [[], [(5, "7", 70)], [(5, "7", 71)]]
+
+        cache.bike_ids(cursor, [self._row("7")])
+        cache.rollback()
+
+        self.assertEqual(cache.bike_ids(cursor, [self._row("7")]), [71])
+
+
+class TestBikePartitions(unittest.TestCase):
+    def _bike(self):
+        return Bike("1", 1.0, 2.0, True, "ok", "150", 3, 4, datetime.datetime.now(), 5, "X")
+
+    @patch("database.postgres.ConnectionPool")
+    def test_partitions_are_created_once_per_day(self, mock_pool):
+        cursor = _pooled_cursor(mock_pool)
+        cursor.fetchone.return_value = (0,)
+        client = PostgresClient(_test_config(partitions_ahead_days=2))
+
+        client.insert_bike_entries([self._bike()])
+        client.insert_bike_entries([self._bike()])
+
+        partition_calls = [
+            call for call in cursor.execute.call_args_list
+            if "create_bikes_partitions" in call.args[0]
+        ]
+        self.assertEqual(len(partition_calls), 1)
+        self.assertEqual(partition_calls[0].args[1][1], 4)
+
+    @patch("database.postgres.ConnectionPool")
+    def test_normalized_storage_creates_snapshot_partitions(self, mock_pool):
+        cursor = _pooled_cursor(mock_pool)
+        cursor.fetchone.return_value = (0,)
+
+        PostgresClient(_test_config(partitions_ahead_days=2, bike_storage="normalized")).ensure_bike_partitions()
+
+        self.assertIn("create_bike_snapshots_partitions", cursor.execute.call_args.args[0])
+
+    @patch("database.postgres.ConnectionPool")
+    def test_unpartitioned_database_disables_partitions(self, mock_pool):
+        cursor = _pooled_cursor(mock_pool)
+        cursor.execute.side_effect = errors.UndefinedFunction("no function")
+        config = _test_config(partitions_ahead_days=2)
+
+        PostgresClient(config).ensure_bike_partitions()
+
+        self.assertEqual(config.db_bike_partitions_ahead_days, 0)
+
+
+class TestStationOccupancy(unittest.TestCase):
+    def _rows(self):
+        return [(1, 2, "10, 11", datetime.datetime.now(datetime.timezone.utc), 467)]
+
+    @patch("database.postgres.ConnectionPool")
+    def test_copy_mode_copies_occupancy_rows(self, mock_pool):
+        cursor = _pooled_cursor(mock_pool)
+        PostgresClient(_test_config("copy_staging")).insert_station_occupancy(self._rows())
+
+        self.assertIn("COPY public.station_occupancy (", cursor.copy.call_args.args[0])
+        cursor.execute.assert_not_called()
+
+    @patch("database.postgres.ConnectionPool")
+    def test_insert_mode_uses_executemany(self, mock_pool):
+        cursor = _pooled_cursor(mock_pool)
+        PostgresClient(_test_config("insert")).insert_station_occupancy(self._rows())
+
+        self.assertIn("INSERT INTO public.station_occupancy", cursor.executemany.call_args.args[0])
+
+    @patch("database.postgres.ConnectionPool")
+    def test_missing_table_disables_occupancy(self, mock_pool):
+        cursor = _pooled_cursor(mock_pool)
+        cursor.copy.side_effect = errors.UndefinedTable("no table")
+        client = PostgresClient(_test_config("copy"))
+
+        client.insert_station_occupancy(self._rows())
+        client.insert_station_occupancy(self._rows())
+
+        cursor.copy.assert_called_once()
+
+
+class TestConnectionPool(unittest.TestCase):
+    @patch("database.postgres.ConnectionPool")
+    def test_pool_is_not_opened_before_first_use(self, mock_pool):
+        PostgresClient(_test_config())
+        mock_pool.assert_not_called()
+
+    @patch("database.postgres.ConnectionPool")
+    def test_pool_is_created_once_and_bounded(self, mock_pool):
+        client = PostgresClient(_test_config())
+        client.get_last_city_syncs([467])
+        client.get_last_station_syncs([467])
+
+        mock_pool.assert_called_once()
+        self.assertEqual(mock_pool.call_args.kwargs["max_size"], 2)
+        self.assertEqual(mock_pool.return_value.connection.call_count, 2)
+
+    @patch("database.postgres.ConnectionPool")
+    def test_transaction_reuses_one_connection(self, mock_pool):
+        client = PostgresClient(_test_config())
+        bike = Bike("1", 1.0, 2.0, True, "ok", "150", 3, 4, datetime.datetime.now(), 5, "X")
+
+        with client.transaction():
+            client.insert_bike_entries([bike])
+            client.get_last_station_syncs([5])
+            client.get_last_city_syncs([5])
+
+        mock_pool.return_value.connection.assert_called_once()
+        connection = mock_pool.return_value.connection.return_value.__enter__.return_value
+        connection.transaction.assert_called_once()
+
+    @patch("database.postgres.ConnectionPool")
+    def test_close_closes_pool(self, mock_pool):
+        client = PostgresClient(_test_config())
+        client.get_last_city_syncs([467])
+        client.close()
+
+        mock_pool.return_value.close.assert_called_once()
@@ -0,0 +1,249 @@
+import asyncio
+import signal
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from query_nextbike import Bike, run_daemon
+from scheduler import AdaptivePollPlanner, BikeChangeCounter, TickScheduler
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestNextTickAfter(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = TickScheduler(60)
+
+    def test_aligns_to_next_minute(self):
+        self.assertEqual(self.scheduler.next_tick_after(125.0), 180.0)
+
+    def test_on_boundary_moves_to_following_tick(self):
+        self.assertEqual(self.scheduler.next_tick_after(120.0), 180.0)
+
+    def test_rejects_non_positive_interval(self):
+        with self.assertRaises(ValueError):
+            TickScheduler(0)
+
+
+class TestWaitForNextTick(unittest.IsolatedAsyncioTestCase):
+    async def test_sleeps_until_boundary(self):
+        clock = FakeClock(100.0)
+        scheduler = TickScheduler(60, clock=clock, sleep=clock.sleep)
+
+        tick = await scheduler.wait_for_next_tick()
+
+        self.assertEqual(tick.scheduled, 120.0)
+        self.assertEqual(clock.now, 120.0)
+        self.assertEqual(tick.lateness, 0.0)
+
+    async def test_cadence_does_not_drift_with_work_duration(self):
+        clock = FakeClock(100.0)
+        scheduler = TickScheduler(60, clock=clock, sleep=clock.sleep)
+
+        scheduled = []
+        for _ in range(3):
+            tick = await scheduler.wait_for_next_tick()
+            scheduled.append(tick.scheduled)
+            clock.now += 17.5  # simulated poll work
+
+        self.assertEqual(scheduled, [120.0, 180.0, 240.0])
+
+    async def test_overrun_skips_missed_ticks(self):
+        clock = FakeClock(100.0)
+        scheduler = TickScheduler(60, clock=clock, sleep=clock.sleep)
+
+        await scheduler.wait_for_next_tick()
+        clock.now += 130  # work overran two ticks
+        tick = await scheduler.wait_for_next_tick()
+
+        self.assertEqual(tick.scheduled, 300.0)
+        self.assertEqual(tick.skipped, 2)
+
+    async def test_lateness_is_reported(self):
+        clock = FakeClock(100.0)
+
+        async def late_sleep(seconds):
+            clock.now += seconds + 0.25
+
+        scheduler = TickScheduler(60, clock=clock, sleep=late_sleep)
+        tick = await scheduler.wait_for_next_tick()
+
+        self.assertAlmostEqual(tick.lateness, 0.25)
+
+
+class TestAdaptivePollPlanner(unittest.IsolatedAsyncioTestCase):
+    def _planner(self, clock, **options):
+        options = dict(min_interval=30, max_interval=600, initial_interval=60, target_changes=5, jitter=0, **options)
+        return AdaptivePollPlanner([1, 2], clock=clock, sleep=clock.sleep, rng=lambda: 0.5, **options)
+
+    def _observe_rate(self, planner, clock, city_id, changed, seconds):
+        planner.observe_changes(city_id, None)
+        clock.now += seconds
+        planner.observe_changes(city_id, changed)
+
+    async def test_first_polls_are_spread_over_the_shortest_interval(self):
+        clock = FakeClock(1000.0)
+        planner = self._planner(clock)
+
+        due, lateness = await planner.wait_for_due()
+
+        self.assertEqual(due, [1, 2])
+        self.assertEqual(clock.now, 1015.0)
+        self.assertEqual(lateness, 0.0)
+
+    async def test_only_due_cities_are_returned(self):
+        clock = FakeClock(1000.0)
+        planner = self._planner(clock)
+        await planner.wait_for_due()
+        planner.record_poll(1)
+        clock.now += 100
+        planner.record_poll(2)
+
+        due, lateness = await planner.wait_for_due()
+
+        self.assertEqual(due, [1])
+        self.assertEqual(lateness, 40.0)
+
+    def test_busy_city_is_polled_more_often(self):
+        clock = FakeClock(1000.0)
+        planner = self._planner(clock)
+        self._observe_rate(planner, clock, 1, changed=10, seconds=60)
+
+        delay = planner.record_poll(1)
+
+        self.assertEqual(delay, 30.0)
+        self.assertEqual(planner.next_poll(1), clock.now + 30.0)
+
+    def test_quiet_city_interval_grows_at_most_twofold_per_poll(self):
+        clock = FakeClock(1000.0)
+        planner = self._planner(clock)
+        self._observe_rate(planner, clock, 1, changed=0, seconds=60)
+
+        intervals = [planner.record_poll(1) for _ in range(5)]
+
+        self.assertEqual(intervals, [120.0, 240.0, 480.0, 600.0, 600.0])
+
+    def test_change_rate_is_smoothed(self):
+        clock = FakeClock(1000.0)
+        planner = self._planner(clock)
+        self._observe_rate(planner, clock, 1, changed=1, seconds=60)
+        clock.now += 60
+        planner.observe_changes(1, 11)
+
+        # 5 changes at (1/60 + 0.3 * (11/60 - 1/60)) per second
+        self.assertAlmostEqual(planner.record_poll(1), 75.0)
+
+    def test_failures_back_off_up_to_the_longest_interval(self):
+        clock = FakeClock(1000.0)
+        planner = self._planner(clock)
+
+        delays = [planner.record_poll(1, failed=True) for _ in range(5)]
+        after_success = planner.record_poll(1)
+
+        self.assertEqual(delays, [120.0, 240.0, 480.0, 600.0, 600.0])
+        self.assertEqual(after_success, 60.0)
+
+    def test_long_outage_stays_at_the_longest_interval(self):
+        clock = FakeClock(1000.0)
+        planner = self._planner(clock)
+
+        delays = [planner.record_poll(1, failed=True) for _ in range(5000)]
+
+        self.assertEqual(delays[-1], 600.0)
+        self.assertEqual(planner.record_poll(1), 60.0)
+
+    def test_retry_after_extends_the_backoff(self):
+        clock = FakeClock(1000.0)
+        planner = self._planner(clock)
+
+        self.assertEqual(planner.record_poll(1, failed=True, retry_after=300), 300.0)
+
+    def test_jitter_spreads_the_delay(self):
+        clock = FakeClock(1000.0)
+        planner = AdaptivePollPlanner([1], initial_interval=60, jitter=0.1, clock=clock, rng=lambda: 1.0)
+
+        self.assertAlmostEqual(planner.record_poll(1), 66.0)
+
+    def test_jitter_keeps_the_delay_within_the_bounds(self):
+        clock = FakeClock(1000.0)
+        longest = AdaptivePollPlanner([1], initial_interval=600, jitter=0.1, clock=clock, rng=lambda: 1.0)
+        shortest = AdaptivePollPlanner([1], initial_interval=30, jitter=0.1, clock=clock, rng=lambda: 0.0)
+
+        self.assertEqual(longest.record_poll(1), 600.0)
+        self.assertEqual(longest.record_poll(1, failed=True), 600.0)
+        self.assertEqual(shortest.record_poll(1), 30.0)
+
+    def test_rejects_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            AdaptivePollPlanner([1], min_interval=60, max_interval=30)
+
+
+class TestRunDaemon(unittest.IsolatedAsyncioTestCase):
+    def _collector(self, poll_planner):
+        config = SimpleNamespace(
+            http_timeout_seconds=1, fetch_concurrency=1, nextbike_api_url="http://localhost", poll_interval_seconds=60
+        )
+        self.addCleanup(asyncio.get_running_loop().remove_signal_handler, signal.SIGTERM)
+        return SimpleNamespace(config=config, metrics=None, poll_planner=poll_planner, dump_metrics=lambda: None)
+
+    async def test_adaptive_mode_never_waits_for_ticks(self):
+        stop = asyncio.CancelledError()
+        with patch("query_nextbike.poll_due_cities", AsyncMock(side_effect=[None, stop])) as poll_due_cities, \
+                patch("query_nextbike.TickScheduler") as tick_scheduler:
+            with self.assertRaises(asyncio.CancelledError):
+                await run_daemon(self._collector(poll_planner=object()))
+
+        self.assertEqual(poll_due_cities.await_count, 2)
+        tick_scheduler.assert_not_called()
+
+    async def test_fixed_mode_polls_on_ticks(self):
+        with patch("query_nextbike.poll_cities", AsyncMock()) as poll_cities, \
+                patch("query_nextbike.poll_due_cities", AsyncMock()) as poll_due_cities, \
+                patch("query_nextbike.TickScheduler") as tick_scheduler:
+            tick = SimpleNamespace(scheduled=0.0, lateness=0.0, skipped=0)
+            tick_scheduler.return_value.wait_for_next_tick = AsyncMock(side_effect=[tick, asyncio.CancelledError()])
+            collector = self._collector(poll_planner=None)
+            collector.metrics = SimpleNamespace(observe_tick=lambda lateness, skipped: None)
+            with self.assertRaises(asyncio.CancelledError):
+                await run_daemon(collector)
+
+        tick_scheduler.assert_called_once_with(60)
+        poll_cities.assert_awaited_once()
+        poll_due_cities.assert_not_awaited()
+
+
+class TestBikeChangeCounter(unittest.TestCase):
+    def _bike(self, number, latitude, station_number=1):
+        return Bike(number, latitude, 13.4, True, "ok", "classic", station_number, 10, None, 467, "Berlin")
+
+    def test_first_snapshot_has_no_changes(self):
+        counter = BikeChangeCounter()
+        self.assertIsNone(counter.count(467, [self._bike("1", 52.5)]))
+
+    def test_counts_moved_new_and_missing_bikes(self):
+        counter = BikeChangeCounter()
+        counter.count(467, [self._bike("1", 52.5), self._bike("2", 52.5), self._bike("3", 52.5)])
+
+        changed = counter.count(467, [self._bike("1", 52.5), self._bike("2", 52.6, 0), self._bike("4", 52.5)])
+
+        self.assertEqual(changed, 3)
+
+    def test_cities_are_counted_separately(self):
+        counter = BikeChangeCounter()
+        counter.count(467, [self._bike("1", 52.5)])
+
+        self.assertIsNone(counter.count(210, [self._bike("1", 52.6)]))
+        self.assertEqual(counter.count(467, [self._bike("1", 52.5)]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
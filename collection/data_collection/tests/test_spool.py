@@ -0,0 +1,233 @@
+import datetime
+import os
+import tempfile
+import unittest
+from contextlib import contextmanager
+
+from columnar import entry_rows
+from query_nextbike import Bike, City, Station, spooled_snapshots, store_snapshots
+from spool import SnapshotSpool, SpoolFlusher, decode_snapshot
+from sync_state import SyncStateCache
+
+START = datetime.datetime(2026, 6, 9, 8, 0, tzinfo=datetime.timezone.utc)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _snapshot(minute, city_id=467):
+    timestamp = START + datetime.timedelta(minutes=minute)
+    city = City(city_id, "Gießen", "Europe/Berlin", 50.58, 8.67, 10, 1, timestamp)
+    bikes = [Bike("B1", 50.58, 8.67, True, "ok", 150, 1, 1001, timestamp, city_id, "Gießen")]
+    stations = [Station(1001, 50.58, 8.67, "Bahnhof", True, 1, False, "sign", timestamp, city_id, "Gießen")]
+    return city, bikes, stations
+
+
+class TestSnapshotSpool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.clock = FakeClock()
+        self.spool = SnapshotSpool(self.directory, segment_seconds=300, clock=self.clock)
+
+    def _append(self, minute):
+        city, bikes, stations = _snapshot(minute)
+        self.spool.append(city.city_id, city.__dict__, entry_rows(bikes), entry_rows(stations))
+        return city, bikes, stations
+
+    def test_roundtrip(self):
+        city, bikes, stations = self._append(0)
+        self.spool.seal(force=True)
+
+        [path] = self.spool.sealed_segments()
+        [snapshot] = self.spool.read_segment(path)
+
+        self.assertEqual(City(**snapshot.city), city)
+        self.assertEqual(snapshot.bike_rows, [bike.as_tuple() for bike in bikes])
+        self.assertEqual(snapshot.station_rows, [station.as_tuple() for station in stations])
+
+    def test_occupancy_rows_roundtrip(self):
+        city, bikes, stations = _snapshot(0)
+        occupancy = [(1, 1, "B1", city.last_updated, city.city_id)]
+        self.spool.append(city.city_id, city.__dict__, entry_rows(bikes), entry_rows(stations), occupancy)
+        self.spool.seal(force=True)
+
+        [snapshot] = self.spool.read_segment(self.spool.sealed_segments()[0])
+        self.assertEqual(snapshot.occupancy_rows, occupancy)
+
+    def test_snapshot_spooled_without_occupancy_decodes(self):
+        snapshot = decode_snapshot(b'{"city_id":467,"city":null,"bikes":[],"stations":[]}')
+        self.assertEqual(snapshot.occupancy_rows, [])
+
+    def test_segment_is_sealed_after_segment_seconds(self):
+        self._append(0)
+        self.clock.now = 299
+        self.spool.seal()
+        self.assertEqual(self.spool.sealed_segments(), [])
+
+        self.clock.now = 300
+        self.spool.seal()
+        self.assertEqual(len(self.spool.sealed_segments()), 1)
+
+    def test_open_segment_of_previous_process_is_sealed(self):
+        self._append(0)
+        reopened = SnapshotSpool(self.directory)
+        self.assertEqual(len(reopened.sealed_segments()), 1)
+
+    def test_truncated_segment_keeps_complete_snapshots(self):
+        self._append(0)
+        self._append(1)
+        self.spool.seal(force=True)
+        [path] = self.spool.sealed_segments()
+        with open(path, "r+b") as segment:
+            segment.truncate(os.path.getsize(path) - 10)
+
+        snapshots = self.spool.read_segment(path)
+        self.assertEqual(len(snapshots), 1)
+
+
+class TestSpoolFlusher(unittest.TestCase):
+    def setUp(self):
+        self.spool = SnapshotSpool(tempfile.mkdtemp())
+        city, bikes, stations = _snapshot(0)
+        self.spool.append(city.city_id, city.__dict__, entry_rows(bikes), entry_rows(stations))
+        self.spool.seal(force=True)
+
+    def test_replayed_segment_is_removed(self):
+        batches = []
+        self.assertTrue(SpoolFlusher(self.spool, batches.append).flush())
+
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(self.spool.sealed_segments(), [])
+
+    def test_failed_segment_is_kept(self):
+        def store_batch(snapshots):
+            raise ConnectionError("database down")
+
+        self.assertFalse(SpoolFlusher(self.spool, store_batch).flush())
+        self.assertEqual(len(self.spool.sealed_segments()), 1)
+
+    def _append_segment(self, *cities):
+        for city_id in cities:
+            city, bikes, stations = _snapshot(0, city_id)
+            self.spool.append(city_id, city.__dict__, entry_rows(bikes), entry_rows(stations))
+        self.spool.seal(force=True)
+
+    def _quarantined(self):
+        directory = os.path.join(self.spool.directory, "quarantine")
+        paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))]
+        return [snapshot.city_id for path in paths for snapshot in self.spool.read_segment(path)]
+
+    def test_bad_snapshot_is_quarantined_after_max_attempts(self):
+        self.spool.remove(self.spool.sealed_segments()[0])
+        self._append_segment(1, 666, 2)
+        self._append_segment(3)
+        stored = []
+
+        def store_batch(snapshots):
+            if any(snapshot.city_id == 666 for snapshot in snapshots):
+                raise ValueError("bad snapshot")
+            stored.extend(snapshot.city_id for snapshot in snapshots)
+
+        flusher = SpoolFlusher(self.spool, store_batch, max_attempts=3)
+        self.assertFalse(flusher.flush())
+        self.assertFalse(flusher.flush())
+        self.assertEqual(stored, [])
+
+        self.assertTrue(flusher.flush())
+        self.assertEqual(stored, [1, 2, 3])
+        self.assertEqual(self.spool.sealed_segments(), [])
+        self.assertEqual(self._quarantined(), [666])
+
+    def test_unstorable_segment_is_quarantined_once_a_later_one_is_stored(self):
+        self._append_segment(666)
+
+        def store_batch(snapshots):
+            if any(snapshot.city_id == 666 for snapshot in snapshots):
+                raise ValueError("bad snapshot")
+
+        self.assertTrue(SpoolFlusher(self.spool, store_batch, max_attempts=1).flush())
+        self.assertEqual(self.spool.sealed_segments(), [])
+        self.assertEqual(self._quarantined(), [666])
+
+    def test_nothing_is_quarantined_while_the_database_is_down(self):
+        self._append_segment(2)
+
+        def store_batch(snapshots):
+            raise ConnectionError("database down")
+
+        flusher = SpoolFlusher(self.spool, store_batch, max_attempts=1)
+        self.assertFalse(flusher.flush())
+        self.assertFalse(flusher.flush())
+        self.assertEqual(len(self.spool.sealed_segments()), 2)
+        self.assertFalse(os.path.exists(os.path.join(self.spool.directory, "quarantine")))
+
+
+class RecordingDatabase:
+    def __init__(self):
+        self.bike_rows = []
+        self.station_writes = 0
+        self.city_writes = 0
+        self.occupancy_rows = []
+        self.transactions = 0
+
+    @contextmanager
+    def transaction(self):
+        self.transactions += 1
+        yield self
+
+    def insert_bike_entries(self, bike_entries):
+        self.bike_rows.extend(entry_rows(bike_entries))
+
+    def insert_station_entries(self, station_entries):
+        self.station_writes += 1
+
+    def insert_station_occupancy(self, occupancy_rows):
+        self.occupancy_rows.extend(occupancy_rows)
+
+    def insert_city_information(self, city):
+        self.city_writes += 1
+
+    def get_last_station_syncs(self, city_ids):
+        return {}
+
+    def get_last_city_syncs(self, city_ids):
+        return {}
+
+
+class TestStoreSpooledSnapshots(unittest.TestCase):
+    def test_batch_is_one_transaction_with_one_bulk_bike_write(self):
+        spool = SnapshotSpool(tempfile.mkdtemp())
+        # Three hours of polls
+        for minute in range(0, 180):
+            city, bikes, stations = _snapshot(minute)
+            spool.append(city.city_id, city.__dict__, entry_rows(bikes), entry_rows(stations))
+        spool.seal(force=True)
+        snapshots = spool.read_segment(spool.sealed_segments()[0])
+
+        db = RecordingDatabase()
+        store_snapshots(db, SyncStateCache(1, 720), spooled_snapshots(snapshots))
+
+        self.assertEqual(db.transactions, 1)
+        self.assertEqual(len(db.bike_rows), 180)
+        # Unchanged stations of one local day are written once
+        self.assertEqual(db.station_writes, 1)
+        self.assertEqual(db.city_writes, 1)
+
+    def test_occupancy_rows_are_written_in_the_batch_transaction(self):
+        city, bikes, stations = _snapshot(0)
+        occupancy = [(1, 1, "B1", city.last_updated, city.city_id)]
+        db = RecordingDatabase()
+
+        store_snapshots(db, SyncStateCache(1, 720), [(city.city_id, city, bikes, stations)], occupancy_rows=occupancy)
+
+        self.assertEqual(db.transactions, 1)
+        self.assertEqual(db.occupancy_rows, occupancy)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import io
+import json
+import unittest
+from contextlib import redirect_stdout
+
+import httpx
+import ijson
+from benchmarks.payloads import synthetic_city_payload
+from columnar import entry_rows
+from query_nextbike import (
+    AsyncNextbikeAPI,
+    NextbikeAPI,
+    parse_nextbike_data,
+    parse_nextbike_stream,
+)
+from streaming import PlaceStreamParser
+
+
+def _parse_quietly(parse, *args):
+    with redirect_stdout(io.StringIO()):
+        return parse(*args)
+
+
+def _events(payload):
+    return ijson.parse(io.BytesIO(json.dumps(payload).encode()), use_float=True)
+
+
+class TestPlaceStreamParser(unittest.TestCase):
+    def test_places_match_extract_places(self):
+        payload = synthetic_city_payload(467, bikes=200)
+        parser = PlaceStreamParser()
+
+        places = []
+        for prefix, event, value in _events(payload):
+            places.extend(parser.feed(prefix, event, value))
+
+        self.assertEqual(places, NextbikeAPI.extract_places(payload))
+
+    def test_only_first_city_of_first_country_is_used(self):
+        payload = {
+            "countries": [
+                {
+                    "timezone": "Europe/Berlin",
+                    "cities": [
+                        {"uid": 1, "name": "First", "places": [{"uid": 10}]},
+                        {"uid": 2, "name": "Second", "places": [{"uid": 20}]},
+                    ],
+                },
+                {"timezone": "Europe/Vienna", "cities": [{"uid": 3, "places": [{"uid": 30}]}]},
+            ]
+        }
+        parser = PlaceStreamParser()
+        places = [place for event in _events(payload) for place in parser.feed(*event)]
+
+        self.assertEqual(places, [{"uid": 10}])
+        header = parser.api_header()
+        self.assertEqual(header["countries"][0]["timezone"], "Europe/Berlin")
+        self.assertEqual(header["countries"][0]["cities"][0]["uid"], 1)
+        self.assertEqual(header["countries"][0]["cities"][0]["name"], "First")
+
+    def test_places_before_the_header_fields_are_held_back(self):
+        payload = {
+            "countries": [
+                {
+                    "cities": [{"places": [{"uid": 10}, {"uid": 11}], "uid": 1, "name": "First"}],
+                    "timezone": "Europe/Berlin",
+                }
+            ]
+        }
+        parser = PlaceStreamParser()
+
+        released = []
+        for event in _events(payload):
+            places = parser.feed(*event)
+            if places:
+                released.append((places, parser.header_known()))
+
+        self.assertEqual(released, [([{"uid": 10}, {"uid": 11}], True)])
+
+
+class TestParseNextbikeStream(unittest.TestCase):
+    def setUp(self):
+        self.payload = synthetic_city_payload(467, bikes=300)
+
+    def assert_same_snapshot(self, streamed, parsed):
+        self.assertEqual(streamed[0].city_id, parsed[0].city_id)
+        self.assertEqual(streamed[0].city_name, parsed[0].city_name)
+        self.assertEqual(streamed[0].available_bikes, parsed[0].available_bikes)
+        for streamed_entries, parsed_entries in zip(streamed[1:], parsed[1:]):
+            streamed_rows = [row[:-3] for row in entry_rows(streamed_entries)]
+            parsed_rows = [row[:-3] for row in entry_rows(parsed_entries)]
+            self.assertEqual(streamed_rows, parsed_rows)
+
+    def test_matches_parse_nextbike_data(self):
+        streamed = _parse_quietly(parse_nextbike_stream, _events(self.payload))
+        parsed = _parse_quietly(parse_nextbike_data, self.payload)
+        self.assert_same_snapshot(streamed, parsed)
+
+    def test_columnar_matches_parse_nextbike_data(self):
+        streamed = _parse_quietly(parse_nextbike_stream, _events(self.payload), True)
+        parsed = _parse_quietly(parse_nextbike_data, self.payload, True)
+        self.assert_same_snapshot(streamed, parsed)
+
+    def test_city_without_places(self):
+        payload = {"countries": [{"timezone": "Europe/Berlin", "cities": [{"uid": 1, "places": []}]}]}
+        city, bikes, stations = _parse_quietly(parse_nextbike_stream, _events(payload))
+
+        self.assertEqual(city.city_id, 1)
+        self.assertEqual((len(bikes), len(stations)), (0, 0))
+
+    def test_header_fields_after_the_places(self):
+        country = self.payload["countries"][0]
+        city_data = country["cities"][0]
+        reordered = {
+            "countries": [
+                {
+                    "cities": [{"places": city_data["places"], "uid": city_data["uid"], "name": city_data["name"]}],
+                    **{key: value for key, value in country.items() if key != "cities"},
+                }
+            ]
+        }
+
+        streamed = _parse_quietly(parse_nextbike_stream, _events(reordered))
+        parsed = _parse_quietly(parse_nextbike_data, self.payload)
+
+        self.assert_same_snapshot(streamed, parsed)
+        self.assertEqual(streamed[0].timezone, parsed[0].timezone)
+        self.assertEqual(streamed[0].set_point_bikes, parsed[0].set_point_bikes)
+
+
+class TestAsyncStreamedFetch(unittest.IsolatedAsyncioTestCase):
+    async def test_fetch_all_streams_every_city(self):
+        def handler(request):
+            city_id = int(request.url.params["city"])
+            return httpx.Response(200, json=synthetic_city_payload(city_id, bikes=50))
+
+        transport = httpx.MockTransport(handler)
+        with redirect_stdout(io.StringIO()):
+            async with AsyncNextbikeAPI(transport=transport) as api:
+                results = await api.fetch_all([467, 773], stream=True)
+
+        for city_id in (467, 773):
+            city, bikes, _ = results[city_id]
+            self.assertEqual(city.city_id, city_id)
+            self.assertEqual(len(bikes), 50)
+
+    async def test_failing_city_maps_to_exception(self):
+        transport = httpx.MockTransport(lambda request: httpx.Response(500))
+        async with AsyncNextbikeAPI(transport=transport) as api:
+            results = await api.fetch_all([467], stream=True)
+
+        self.assertIsInstance(results[467], httpx.HTTPStatusError)
+
+
+if __name__ == "__main__":
+    unittest.main()
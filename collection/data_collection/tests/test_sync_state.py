@@ -0,0 +1,104 @@
+import datetime
+import unittest
+from zoneinfo import ZoneInfo
+
+from query_nextbike import City, Station
+from sync_state import SyncStateCache, station_content_hash
+
+BERLIN = ZoneInfo("Europe/Berlin")
+
+
+def _city(timestamp, city_id=467):
+    return City(city_id, "Gießen", "Europe/Berlin", 50.58, 8.67, 10, 1, timestamp)
+
+
+def _stations(timestamp, name="Bahnhof"):
+    return [Station(1001, 50.58, 8.67, name, True, 1, False, "sign", timestamp, 467, "Gießen")]
+
+
+class FakeDatabase:
+    def __init__(self, station_syncs=None, city_syncs=None):
+        self.station_syncs = station_syncs or {}
+        self.city_syncs = city_syncs or {}
+        self.queries = 0
+
+    def get_last_station_syncs(self, city_ids):
+        self.queries += 1
+        return {city_id: self.station_syncs[city_id] for city_id in city_ids if city_id in self.station_syncs}
+
+    def get_last_city_syncs(self, city_ids):
+        self.queries += 1
+        return {city_id: self.city_syncs[city_id] for city_id in city_ids if city_id in self.city_syncs}
+
+
+class TestStationContentHash(unittest.TestCase):
+    def test_timestamp_does_not_change_hash(self):
+        first = datetime.datetime(2026, 6, 9, 10, 0, tzinfo=BERLIN)
+        later = first + datetime.timedelta(hours=3)
+        self.assertEqual(station_content_hash(_stations(first)), station_content_hash(_stations(later)))
+
+    def test_changed_station_changes_hash(self):
+        timestamp = datetime.datetime(2026, 6, 9, 10, 0, tzinfo=BERLIN)
+        self.assertNotEqual(
+            station_content_hash(_stations(timestamp)),
+            station_content_hash(_stations(timestamp, name="Marktplatz")),
+        )
+
+
+class TestSyncStateCache(unittest.TestCase):
+    def setUp(self):
+        self.start = datetime.datetime(2026, 6, 9, 10, 0, tzinfo=BERLIN)
+        self.cache = SyncStateCache(stations_sync_interval_hours=1, cities_sync_interval_hours=720)
+        self.hash = station_content_hash(_stations(self.start))
+
+    def _write_stations(self, timestamp, content_hash):
+        city = _city(timestamp)
+        due = self.cache.station_sync_due(city, content_hash)
+        if due:
+            self.cache.stations_written(city, content_hash)
+        return due
+
+    def test_load_queries_each_table_once(self):
+        db = FakeDatabase(station_syncs={467: self.start})
+        self.cache.load(db, [467, 773])
+        self.cache.load(db, [467, 773])
+
+        self.assertEqual(db.queries, 2)
+        self.assertFalse(self.cache.station_sync_due(_city(self.start), self.hash))
+
+    def test_unknown_city_is_due(self):
+        self.assertTrue(self.cache.station_sync_due(_city(self.start), self.hash))
+        self.assertTrue(self.cache.city_sync_due(_city(self.start)))
+
+    def test_unchanged_stations_are_skipped_after_interval(self):
+        self._write_stations(self.start, self.hash)
+        self.assertFalse(self._write_stations(self.start + datetime.timedelta(hours=2), self.hash))
+
+    def test_changed_stations_wait_for_interval(self):
+        self._write_stations(self.start, self.hash)
+        self.assertFalse(self._write_stations(self.start + datetime.timedelta(minutes=30), "changed"))
+        self.assertTrue(self._write_stations(self.start + datetime.timedelta(hours=1), "changed"))
+
+    def test_new_local_day_is_written(self):
+        self._write_stations(self.start, self.hash)
+        midnight = datetime.datetime(2026, 6, 10, 0, 1, tzinfo=BERLIN)
+        self.assertTrue(self._write_stations(midnight, self.hash))
+
+    def test_loaded_sync_without_hash_writes_after_interval(self):
+        self.cache.load(FakeDatabase(station_syncs={467: self.start}), [467])
+        self.assertFalse(self._write_stations(self.start + datetime.timedelta(minutes=5), self.hash))
+        self.assertTrue(self._write_stations(self.start + datetime.timedelta(hours=1), self.hash))
+
+    def test_failed_write_is_rolled_back(self):
+        with self.assertRaises(ConnectionError):
+            with self.cache.rollback_on_error():
+                self.cache.stations_written(_city(self.start), self.hash)
+                self.cache.city_written(_city(self.start))
+                raise ConnectionError("database down")
+
+        self.assertTrue(self.cache.station_sync_due(_city(self.start), self.hash))
+        self.assertTrue(self.cache.city_sync_due(_city(self.start)))
+
+
+if __name__ == "__main__":
+    unittest.main()
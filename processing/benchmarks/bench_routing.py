@@ -0,0 +1,132 @@
+"""
+Compare the networkx and CSR routing backends on one street graph.
+
+Uses a cached city graph (see graph_cache.py) or, without --graph-file, a
+synthetic jittered grid of about the size of a 10 km city bike network, so
+it runs offline:
+
+    python benchmarks/bench_routing.py
+    python benchmarks/bench_routing.py --graph-file /data/graph_cache/467_bike_10000m.npz
+
+Reports the memory of both graphs, the time of one-to-many searches per
+origin and of single pairs, and checks that both give the same distances.
+"""
+import argparse
+import math
+import random
+import time
+import tracemalloc
+
+import networkx as nx
+
+from nextbike_processing.graph_cache import arrays_to_graph, graph_to_arrays, load_graph_arrays
+from nextbike_processing.routing_csr import CSRGraph
+from nextbike_processing.trips import shortest_paths_from
+
+
+def synthetic_graph(side, spacing_m=80, center=(52.52, 13.405), seed=1):
+    """Grid of side × side jittered nodes, mostly two-way streets and some parallel edges"""
+    rng = random.Random(seed)
+    lat0, lon0 = center
+    dlat = spacing_m / 111_320
+    dlon = spacing_m / (111_320 * math.cos(math.radians(lat0)))
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    for i in range(side):
+        for j in range(side):
+            G.add_node(
+                i * side + j,
+                y=lat0 + (i - side // 2 + rng.uniform(-0.2, 0.2)) * dlat,
+                x=lon0 + (j - side // 2 + rng.uniform(-0.2, 0.2)) * dlon,
+            )
+    for i in range(side):
+        for j in range(side):
+            for v_i, v_j in ((i, j + 1), (i + 1, j)):
+                if v_i >= side or v_j >= side or rng.random() < 0.08:
+                    continue
+                u, v = i * side + j, v_i * side + v_j
+                # Longer than the straight line, like a street
+                length = math.hypot(
+                    (G.nodes[u]["y"] - G.nodes[v]["y"]) * 111_320,
+                    (G.nodes[u]["x"] - G.nodes[v]["x"]) * 111_320 * math.cos(math.radians(lat0)),
+                ) * rng.uniform(1.0, 1.15)
+                G.add_edge(u, v, length=length)
+                if rng.random() > 0.1:
+                    G.add_edge(v, u, length=length)
+                if rng.random() < 0.02:
+                    G.add_edge(u, v, length=length * 1.3)
+    return G
+
+
+def measure(build):
+    """(result, seconds, MB allocated) of build()"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / 1e6
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the networkx and CSR routing backends.")
+    parser.add_argument("--graph-file", help="Cached graph (.npz) to route on, default a synthetic grid.")
+    parser.add_argument("--side", type=int, default=250, help="Nodes per side of the synthetic grid. (default: 250)")
+    parser.add_argument("--origins", type=int, default=10, help="Origins of the one-to-many searches. (default: 10)")
+    parser.add_argument("--targets", type=int, default=20, help="Targets per origin. (default: 20)")
+    parser.add_argument("--pairs", type=int, default=20, help="Single pairs to route. (default: 20)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.graph_file:
+        arrays, metadata = load_graph_arrays(args.graph_file)
+        if arrays is None:
+            raise SystemExit(f"{args.graph_file} is missing or of another format version")
+        G, nx_seconds, nx_mb = measure(lambda: arrays_to_graph(arrays, metadata["crs"]))
+    else:
+        G, nx_seconds, nx_mb = measure(lambda: synthetic_graph(args.side, seed=args.seed))
+        arrays = graph_to_arrays(G)
+    csr, csr_seconds, csr_mb = measure(lambda: CSRGraph(arrays))
+    print(f"Graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
+    print(f"  networkx: {nx_mb:7.1f} MB, built in {nx_seconds:.2f} s")
+    print(f"  csr:      {csr_mb:7.1f} MB, built in {csr_seconds:.2f} s (from the arrays)")
+
+    rng = random.Random(args.seed)
+    nodes = list(G.nodes)
+    destinations = {origin: set(rng.sample(nodes, args.targets)) for origin in rng.sample(nodes, args.origins)}
+    nx_routes, nx_seconds = timed(lambda: {o: shortest_paths_from(G, o, t) for o, t in destinations.items()})
+    csr_routes, csr_seconds = timed(lambda: {o: csr.shortest_paths_from(o, t) for o, t in destinations.items()})
+    print(f"One-to-many, {args.origins} origins × {args.targets} targets:")
+    print(f"  networkx Dijkstra: {nx_seconds / args.origins * 1000:8.1f} ms per origin")
+    print(f"  scipy Dijkstra:    {csr_seconds / args.origins * 1000:8.1f} ms per origin")
+    mismatches = sum(
+        not math.isclose(nx_routes[o][t][0], csr_routes[o][t][0], abs_tol=1e-6)
+        for o in destinations for t in nx_routes[o]
+    ) + sum(nx_routes[o].keys() != csr_routes[o].keys() for o in destinations)
+
+    pairs = [tuple(rng.sample(nodes, 2)) for _ in range(args.pairs)]
+    _, two_search_seconds = timed(lambda: [
+        (nx.shortest_path_length(G, o, t, weight="length"), nx.shortest_path(G, o, t, weight="length"))
+        for o, t in pairs if nx.has_path(G, o, t)
+    ])
+    nx_pairs, nx_seconds = timed(lambda: [shortest_paths_from(G, o, [t]).get(t, (None, []))[0] for o, t in pairs])
+    csr_pairs, csr_seconds = timed(lambda: [csr.shortest_path(o, t)[0] for o, t in pairs])
+    print(f"Single pairs, {args.pairs}:")
+    print(f"  networkx length + path:  {two_search_seconds / args.pairs * 1000:8.1f} ms per pair (incl. has_path)")
+    print(f"  networkx Dijkstra:       {nx_seconds / args.pairs * 1000:8.1f} ms per pair")
+    print(f"  csr A*:                  {csr_seconds / args.pairs * 1000:8.1f} ms per pair")
+    mismatches += sum(
+        (a is None) != (b is None) or (a is not None and not math.isclose(a, b, abs_tol=1e-6))
+        for a, b in zip(nx_pairs, csr_pairs)
+    )
+    print(f"Distance mismatches between the backends: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
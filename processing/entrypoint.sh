@@ -6,6 +6,13 @@ if [ $# -gt 0 ]; then
     exec python -m nextbike_processing.main "$@"
 fi
 
+# Trips of the current day every few minutes, next to the nightly run
+if [ -n "$INCREMENTAL_TRIPS_MINUTES" ]; then
+  echo "Processing new trips every $INCREMENTAL_TRIPS_MINUTES minutes"
+  python -m nextbike_processing.incremental --city-id $(echo "$CITY_IDS" | tr ',' ' ') \
+    --every-minutes "$INCREMENTAL_TRIPS_MINUTES" &
+fi
+
 # Otherwise, run the scheduled loop
 while true; do
   sleep_seconds=$(( $(date -d 'tomorrow 00:00' +%s) - $(date +%s) ))
@@ -19,4 +26,10 @@ while true; do
     echo "Processing city $city_id for $YESTERDAY"
     python -m nextbike_processing.main --city-id "$city_id" --date "$YESTERDAY"
   done
+
+  if [ -n "$ARCHIVE_AFTER_DAYS" ]; then
+    echo "Archiving raw bike days older than $ARCHIVE_AFTER_DAYS days"
+    python -m nextbike_processing.archive --city-id $(echo "$CITY_IDS" | tr ',' ' ') \
+      --older-than-days "$ARCHIVE_AFTER_DAYS" --drop-partitions
+  fi
 done
@@ -0,0 +1,320 @@
+"""
+Retention of raw bike snapshots.
+
+Days older than the retention period are moved out of public.bikes (or
+public.bike_snapshots with DB_BIKE_STORAGE=normalized) into one zstd
+compressed Parquet file per city and local day, in the columns of
+public.bikes:
+
+    {ARCHIVE_DIR}/bikes/city_id={city_id}/date={YYYY-MM-DD}.parquet
+
+The trips and station queries read an archived day from a temporary table
+filled from its file, so reprocessing old dates runs the same SQL.
+
+Run nightly after the processing:
+    python -m nextbike_processing.archive --city-id 467 --older-than-days 30
+"""
+import argparse
+import datetime
+import io
+import os
+from zoneinfo import ZoneInfo
+
+import psycopg
+
+from nextbike_processing.cities import get_city_timezone_from_database
+from nextbike_processing.config import ARCHIVE_DIR, BIKE_STORAGE
+from nextbike_processing.database import get_connection, raw_bikes_source, raw_bikes_table
+from nextbike_processing.utils import ensure_directory_exists, local_day_bounds
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # only needed to archive days or read archived ones
+    pa = None
+    pa_csv = None
+    pq = None
+
+ARCHIVE_COLUMNS = (
+    "bike_number", "latitude", "longitude", "active", "state", "bike_type",
+    "station_number", "station_uid", "last_updated", "city_id", "city_name",
+)
+ARCHIVED_BIKES_TABLE = "pg_temp.archived_bikes"
+BATCH_ROWS = 100_000
+COMPRESSION = "zstd"
+
+
+def _schema():
+    return pa.schema([
+        ("bike_number", pa.string()),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("active", pa.bool_()),
+        ("state", pa.string()),
+        ("bike_type", pa.string()),
+        ("station_number", pa.int32()),
+        ("station_uid", pa.int32()),
+        ("last_updated", pa.timestamp("us", tz="UTC")),
+        ("city_id", pa.int32()),
+        ("city_name", pa.string()),
+    ])
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Archived bike days need pyarrow: pip install pyarrow")
+
+
+def archive_path(city_id, date, archive_dir=None):
+    """File of one archived city day"""
+    return os.path.join(
+        archive_dir or ARCHIVE_DIR, "bikes", f"city_id={city_id}", f"date={datetime.date.fromisoformat(str(date))}.parquet"
+    )
+
+
+def is_archived(city_id, date, archive_dir=None):
+    return os.path.exists(archive_path(city_id, date, archive_dir))
+
+
+def archive_city_day(city_id, date, archive_dir=None):
+    """
+    Move the raw bike rows of one city day into its archive file.
+
+    The rows are written to a temporary file next to the archive, checked
+    against the row count of the file and only then deleted, in the same
+    repeatable read transaction they were read in. Archiving a day again
+    adds rows that reached the table later to the existing file.
+
+    Args:
+        city_id (int): City to archive
+        date (str): Local day in YYYY-MM-DD format
+        archive_dir (str): Defaults to ARCHIVE_DIR
+
+    Returns:
+        int: Rows moved, 0 if the day has no raw bike rows
+    """
+    _require_pyarrow()
+    table = raw_bikes_table()
+    # Same order as the collector inserted the rows, the station bike lists keep it
+    order = "last_updated, id" if BIKE_STORAGE != "normalized" else "last_updated"
+    day = (city_id, *local_day_bounds(date, get_city_timezone_from_database(city_id)))
+    path = archive_path(city_id, date, archive_dir)
+    partial_path = path + ".partial"
+
+    with get_connection() as conn:
+        conn.isolation_level = psycopg.IsolationLevel.REPEATABLE_READ
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT COUNT(*) FROM {table}
+                WHERE city_id = %s AND last_updated >= %s AND last_updated < %s
+                """,
+                day,
+            )
+            rows = cur.fetchone()[0]
+        if not rows:
+            return 0
+
+        ensure_directory_exists(os.path.dirname(path))
+        schema = _schema()
+        written = 0
+        try:
+            with pq.ParquetWriter(partial_path, schema, compression=COMPRESSION) as writer:
+                if os.path.exists(path):
+                    for batch in pq.ParquetFile(path).iter_batches(batch_size=BATCH_ROWS):
+                        writer.write_batch(batch)
+                        written += batch.num_rows
+                with conn.cursor(name="archive_bikes") as cur:
+                    cur.execute(
+                        f"""
+                        SELECT {", ".join(ARCHIVE_COLUMNS)} FROM {raw_bikes_source()} b
+                        WHERE city_id = %s AND last_updated >= %s AND last_updated < %s
+                        ORDER BY {order}
+                        """,
+                        day,
+                    )
+                    while batch := cur.fetchmany(BATCH_ROWS):
+                        writer.write_table(pa.Table.from_pylist(
+                            [dict(zip(ARCHIVE_COLUMNS, row)) for row in batch], schema=schema
+                        ))
+                        written += len(batch)
+
+            archived_rows = pq.read_metadata(partial_path).num_rows
+            if archived_rows != written:
+                raise RuntimeError(f"{partial_path} holds {archived_rows} rows, expected {written}")
+
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"""
+                    DELETE FROM {table}
+                    WHERE city_id = %s AND last_updated >= %s AND last_updated < %s
+                    """,
+                    day,
+                )
+                if cur.rowcount != rows:
+                    raise RuntimeError(f"Deleted {cur.rowcount} bike rows of city {city_id} on {date}, archived {rows}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+    # Renamed after the commit, so a day is never read from the file and from
+    # the table at once. Should the rename fail the rows are in the .partial file.
+    os.replace(partial_path, path)
+
+    return rows
+
+
+def archive_old_days(city_id, older_than_days, today=None, archive_dir=None):
+    """
+    Archive every local day of the city before `today - older_than_days`
+    that still has raw bike rows.
+
+    Returns:
+        list: (date, rows) of the archived days
+    """
+    timezone = get_city_timezone_from_database(city_id)
+    if today is None:
+        today = datetime.datetime.now(ZoneInfo(timezone)).date()
+    first_kept_day = today - datetime.timedelta(days=older_than_days)
+    cutoff, _ = local_day_bounds(first_kept_day, timezone)
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT MIN(last_updated) FROM {raw_bikes_table()} WHERE city_id = %s AND last_updated < %s",
+                (city_id, cutoff),
+            )
+            oldest = cur.fetchone()[0]
+    if oldest is None:
+        return []
+
+    archived = []
+    day = oldest.astimezone(ZoneInfo(timezone)).date()
+    while day < first_kept_day:
+        rows = archive_city_day(city_id, day, archive_dir)
+        if rows:
+            archived.append((day, rows))
+        day += datetime.timedelta(days=1)
+    return archived
+
+
+def drop_empty_bikes_partitions(before):
+    """
+    Drop the daily bikes_YYYYMMDD (bike_snapshots_YYYYMMDD) partitions of
+    UTC days before `before` that archiving emptied for every city. DELETE
+    leaves their space to VACUUM, dropping them gives it back right away.
+
+    Returns:
+        list: Names of the dropped partitions
+    """
+    parent = raw_bikes_table()
+    prefix = parent.split(".")[-1]
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+                AND c.relname ~ %s
+                AND c.relname < %s
+                ORDER BY c.relname
+                """,
+                (parent, f"^{prefix}_[0-9]{{8}}$", f"{prefix}_{before:%Y%m%d}"),
+            )
+            partitions = [row[0] for row in cur.fetchall()]
+
+            dropped = []
+            for partition in partitions:
+                cur.execute(f"LOCK TABLE public.{partition} IN ACCESS EXCLUSIVE MODE")
+                cur.execute(f"SELECT EXISTS (SELECT 1 FROM public.{partition})")
+                if cur.fetchone()[0]:
+                    continue
+                cur.execute(f"ALTER TABLE {parent} DETACH PARTITION public.{partition}")
+                cur.execute(f"DROP TABLE public.{partition}")
+                dropped.append(partition)
+        conn.commit()
+    return dropped
+
+
+def bikes_table_for_day(conn, city_id, date, day_start, day_end, archive_dir=None):
+    """
+    Table the day queries of `conn` read the city day's bike rows from.
+
+    public.bikes (see raw_bikes_source) unless the day is archived. Then
+    the rows of the archive file, plus any the collector wrote for the day
+    since, are loaded into a temporary table that is dropped at the end of
+    the transaction.
+    """
+    source = raw_bikes_source()
+    path = archive_path(city_id, date, archive_dir)
+    if not os.path.exists(path):
+        return source
+
+    _require_pyarrow()
+    columns = ", ".join(ARCHIVE_COLUMNS)
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {ARCHIVED_BIKES_TABLE}")
+        cur.execute(
+            f"""
+            CREATE TEMPORARY TABLE archived_bikes ON COMMIT DROP AS
+            SELECT {columns} FROM {source} b WITH NO DATA
+            """
+        )
+        with cur.copy(f"COPY {ARCHIVED_BIKES_TABLE} ({columns}) FROM STDIN (FORMAT CSV)") as copy:
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=BATCH_ROWS, columns=list(ARCHIVE_COLUMNS)):
+                buffer = io.BytesIO()
+                pa_csv.write_csv(batch, buffer, pa_csv.WriteOptions(include_header=False))
+                copy.write(buffer.getvalue())
+        cur.execute(
+            f"""
+            INSERT INTO {ARCHIVED_BIKES_TABLE} ({columns})
+            SELECT {columns} FROM {source} b
+            WHERE city_id = %s AND last_updated >= %s AND last_updated < %s
+            """,
+            (city_id, day_start, day_end),
+        )
+        cur.execute(f"ANALYZE {ARCHIVED_BIKES_TABLE}")
+    return ARCHIVED_BIKES_TABLE
+
+
+def process_archive(city_id, older_than_days, archive_dir=None):
+    print(f"Archiving bike snapshots of city {city_id} older than {older_than_days} days...")
+    archived = archive_old_days(city_id, older_than_days, archive_dir=archive_dir)
+    for day, rows in archived:
+        print(f"  [{day}] Moved {rows} bike rows to {archive_path(city_id, day, archive_dir)}")
+    if not archived:
+        print("  Nothing to archive")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old raw bike snapshots to Parquet archive files.")
+    parser.add_argument("--city-id", type=int, nargs="+", required=True, help="City IDs to archive.")
+    parser.add_argument(
+        "--older-than-days", type=int, required=True, help="Archive local days before today minus this many days."
+    )
+    parser.add_argument("--archive-dir", default=None, help=f"Archive folder. (default: ARCHIVE_DIR, {ARCHIVE_DIR})")
+    parser.add_argument(
+        "--drop-partitions",
+        action="store_true",
+        help="Afterwards drop the daily bike partitions archiving emptied for every city.",
+    )
+    args = parser.parse_args()
+    if args.older_than_days < 1:
+        parser.error("--older-than-days must be at least 1.")
+
+    for city_id in args.city_id:
+        process_archive(city_id, args.older_than_days, archive_dir=args.archive_dir)
+    if args.drop_partitions:
+        # Only empty partitions are dropped, one day of margin covers the city timezones
+        before = datetime.datetime.now(datetime.timezone.utc).date() - datetime.timedelta(days=args.older_than_days + 1)
+        for partition in drop_empty_bikes_partitions(before):
+            print(f"Dropped empty partition public.{partition}")
+
+
+if __name__ == "__main__":
+    main()
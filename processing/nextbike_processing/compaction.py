@@ -0,0 +1,133 @@
+from nextbike_processing.cities import get_city_timezone_from_database
+from nextbike_processing.database import get_connection, raw_bikes_source, raw_bikes_table
+from nextbike_processing.utils import local_day_bounds
+
+# A new interval starts whenever one of these changes, or the bike was
+# missing from the previous snapshot of the city
+INTERVAL_COLUMNS = (
+    "latitude", "longitude", "active", "state", "bike_type", "station_number", "station_uid",
+)
+
+COMPACT_QUERY = f"""
+    WITH day_bikes AS (
+        SELECT *
+        FROM {{bikes_table}} AS raw_bikes
+        WHERE city_id = %s
+        AND last_updated >= %s
+        AND last_updated < %s
+    ),
+    snapshots AS (
+        SELECT last_updated,
+               ROW_NUMBER() OVER (ORDER BY last_updated) AS snapshot_index,
+               LEAD(last_updated) OVER (ORDER BY last_updated) AS next_snapshot
+        FROM (SELECT DISTINCT last_updated FROM day_bikes) AS snapshot_times
+    ),
+    marked AS (
+        SELECT b.*,
+               s.snapshot_index,
+               CASE
+                   WHEN LAG(s.snapshot_index) OVER w = s.snapshot_index - 1
+                    AND ({", ".join(f"b.{column}" for column in INTERVAL_COLUMNS)})
+                        IS NOT DISTINCT FROM
+                        ({", ".join(f"LAG(b.{column}) OVER w" for column in INTERVAL_COLUMNS)})
+                   THEN 0
+                   ELSE 1
+               END AS starts_interval
+        FROM day_bikes b
+        JOIN snapshots s ON s.last_updated = b.last_updated
+        WINDOW w AS (PARTITION BY b.bike_number ORDER BY b.last_updated)
+    ),
+    numbered AS (
+        SELECT *,
+               SUM(starts_interval) OVER (PARTITION BY bike_number ORDER BY last_updated) AS interval_number
+        FROM marked
+    ),
+    intervals AS (
+        SELECT bike_number,
+               {", ".join(INTERVAL_COLUMNS)},
+               MIN(last_updated) AS valid_from,
+               MAX(last_updated) AS valid_to,
+               COUNT(*) AS snapshots,
+               city_id,
+               MIN(city_name) AS city_name
+        FROM numbered
+        GROUP BY city_id, bike_number, interval_number, {", ".join(INTERVAL_COLUMNS)}
+    )
+    INSERT INTO public.bike_intervals (
+        bike_number, {", ".join(INTERVAL_COLUMNS)},
+        valid_from, valid_to, ended_at, snapshots, city_id, city_name
+    )
+    SELECT i.bike_number, {", ".join(f"i.{column}" for column in INTERVAL_COLUMNS)},
+           i.valid_from, i.valid_to, s.next_snapshot, i.snapshots, i.city_id, i.city_name
+    FROM intervals i
+    JOIN snapshots s ON s.last_updated = i.valid_to;
+"""
+
+
+def compact_bike_intervals(city_id, date, drop_raw=False):
+    """
+    Fold the raw bike snapshots of one city day into public.bike_intervals.
+
+    Consecutive snapshots of a bike at the same spot (gaps and islands over
+    the city's snapshots, ordered by last_updated) become one interval row
+    with its first and last snapshot. Compacting a day again replaces its
+    intervals. With `drop_raw` the raw rows of the day are deleted in the
+    same transaction.
+
+    Args:
+        city_id (int): City to compact
+        date (str): Local day in YYYY-MM-DD format
+        drop_raw (bool): Delete the compacted rows from public.bikes
+            (public.bike_snapshots with DB_BIKE_STORAGE=normalized)
+
+    Returns:
+        tuple: (raw_rows, intervals) - rows read and intervals written.
+            (0, 0) if the day has no raw rows, its intervals are kept then.
+    """
+    day_start, day_end = local_day_bounds(date, get_city_timezone_from_database(city_id))
+    day = (city_id, day_start, day_end)
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT COUNT(*) FROM {raw_bikes_table()}
+                WHERE city_id = %s AND last_updated >= %s AND last_updated < %s
+                """,
+                day,
+            )
+            raw_rows = cur.fetchone()[0]
+            if not raw_rows:
+                return 0, 0
+
+            cur.execute(
+                """
+                DELETE FROM public.bike_intervals
+                WHERE city_id = %s AND valid_from >= %s AND valid_from < %s
+                """,
+                day,
+            )
+            cur.execute(COMPACT_QUERY.format(bikes_table=raw_bikes_source()), day)
+            intervals = cur.rowcount
+
+            if drop_raw:
+                cur.execute(
+                    f"""
+                    DELETE FROM {raw_bikes_table()}
+                    WHERE city_id = %s AND last_updated >= %s AND last_updated < %s
+                    """,
+                    day,
+                )
+        conn.commit()
+
+    return raw_rows, intervals
+
+
+def process_compaction(city_id, date, drop_raw=False):
+    print(f"[{date}] Compacting bike snapshots of city {city_id}...")
+    raw_rows, intervals = compact_bike_intervals(city_id, date, drop_raw=drop_raw)
+    if not raw_rows:
+        print("  No raw bike rows, keeping existing intervals")
+        return
+    dropped = ", dropped raw rows" if drop_raw else ""
+    print(f"  Folded {raw_rows} bike rows into {intervals} intervals{dropped}")
@@ -8,3 +8,20 @@ DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
+
+# Street graphs for routing, rebuilt when older than the TTL, see graph_cache.py
+GRAPH_CACHE_DIR = os.getenv("GRAPH_CACHE_DIR", "/data/graph_cache")
+GRAPH_CACHE_TTL_DAYS = float(os.getenv("GRAPH_CACHE_TTL_DAYS", "30"))
+# Trip endpoints farther than this from the nearest street node are not routed
+ROUTE_SNAP_MAX_DISTANCE_METERS = float(os.getenv("ROUTE_SNAP_MAX_DISTANCE_METERS", "500"))
+# Processes the uncached routes of a day are computed in, see trips.route_from_origins
+ROUTING_WORKERS = int(os.getenv("ROUTING_WORKERS", "1"))
+# "networkx" graphs or "csr" arrays routed with scipy, see routing_csr.py
+ROUTING_BACKEND = os.getenv("ROUTING_BACKEND", "networkx").lower()
+
+# Parquet files of raw bike days moved out of public.bikes, see archive.py
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "/data/archive")
+
+# "wide" public.bikes rows or "normalized" public.bike_snapshots with the
+# bike numbers in public.bike_dim, see 005_bike_dim_migration.sql
+BIKE_STORAGE = os.getenv("DB_BIKE_STORAGE", "wide").lower()
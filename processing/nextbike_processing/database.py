@@ -8,8 +8,17 @@ from WRITE operations (storing) to make testing and understanding easier.
 import json
 import pandas as pd
 import psycopg
+from psycopg_pool import ConnectionPool
 
-from nextbike_processing.config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+from nextbike_processing.config import BIKE_STORAGE, DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+
+
+# Set by open_connection_pool in processes that work through many days
+_pool = None
+
+
+def _connection_kwargs():
+    return dict(host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD)
 
 
 def get_connection():
@@ -19,14 +28,64 @@ def get_connection():
     Each connection is independent. Use in a `with` statement to auto-close:
         with get_connection() as conn:
             # use conn
+
+    After open_connection_pool the `with` block borrows a pooled
+    connection instead and hands it back at the end, committed or rolled
+    back like a closed one.
     """
-    return psycopg.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-    )
+    if _pool is not None:
+        return _pool.connection()
+    return psycopg.connect(**_connection_kwargs())
+
+
+def _reset_connection(conn):
+    conn.isolation_level = None
+
+
+def open_connection_pool(max_size=2):
+    """Keep up to `max_size` connections open for get_connection of this process"""
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(
+            kwargs=_connection_kwargs(), min_size=1, max_size=max_size, reset=_reset_connection, open=True
+        )
+    return _pool
+
+
+def close_connection_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+
+# ============================================================================
+# RAW BIKE ROWS: public.bikes or the normalized bike_snapshots
+# ============================================================================
+
+# The public.bikes columns of DB_BIKE_STORAGE=normalized: bike numbers and
+# city names are joined back from public.bike_dim and public.cities
+NORMALIZED_BIKES_SOURCE = """(
+            SELECT d.bike_number, s.latitude, s.longitude, s.active, s.state, s.bike_type,
+                   s.station_number, s.station_uid, s.last_updated, s.city_id, c.city_name
+            FROM public.bike_snapshots s
+            JOIN public.bike_dim d ON d.bike_id = s.bike_id
+            LEFT JOIN public.cities c ON c.city_id = s.city_id
+        )"""
+
+
+def raw_bikes_table():
+    """Table the collector writes the raw bike snapshots to"""
+    return "public.bike_snapshots" if BIKE_STORAGE == "normalized" else "public.bikes"
+
+
+def raw_bikes_source():
+    """
+    Relation with the columns of public.bikes to read raw bike rows from,
+    a subquery when DB_BIKE_STORAGE=normalized. Use with an alias:
+        f"SELECT b.bike_number FROM {raw_bikes_source()} b"
+    """
+    return NORMALIZED_BIKES_SOURCE if BIKE_STORAGE == "normalized" else "public.bikes"
 
 
 # ============================================================================
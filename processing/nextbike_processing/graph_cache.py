@@ -0,0 +1,194 @@
+"""
+On-disk cache of the street graphs used for routing.
+
+Downloading and building a city's bike network with osmnx takes minutes
+and needs the Overpass API. The graph is stored once per city, extent and
+network type as plain arrays in one .npz file:
+
+    {GRAPH_CACHE_DIR}/{city_id}_{network_type}_{dist}m.npz
+
+node ids and coordinates, and the edges as CSR (indptr, indices, length)
+over the node positions. Only what routing reads is kept: the x/y of every
+node and the length of every edge.
+
+A file is rebuilt when it is older than GRAPH_CACHE_TTL_DAYS, was written
+by another FORMAT_VERSION or for another city center. If the download
+fails, an outdated file is used rather than none.
+
+Build or refresh the files ahead, e.g. before going offline:
+    python -m nextbike_processing.graph_cache --city-id 467 210 --refresh
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+
+import networkx as nx
+import numpy as np
+import osmnx as ox
+
+from nextbike_processing.cities import get_city_coordinates_from_database
+from nextbike_processing.config import GRAPH_CACHE_DIR, GRAPH_CACHE_TTL_DAYS
+from nextbike_processing.utils import ensure_directory_exists
+
+# Bump when the stored arrays change, older files are rebuilt
+FORMAT_VERSION = 1
+GRAPH_DIST_METERS = 10000
+GRAPH_NETWORK_TYPE = "bike"
+# City centers closer than this (degrees, ~10 m) share a cached graph
+CENTER_TOLERANCE = 1e-4
+
+
+def graph_cache_path(city_id, dist=GRAPH_DIST_METERS, network_type=GRAPH_NETWORK_TYPE, cache_dir=None):
+    return os.path.join(cache_dir or GRAPH_CACHE_DIR, f"{city_id}_{network_type}_{dist}m.npz")
+
+
+def graph_to_arrays(G):
+    """
+    Node coordinates and CSR edges of an osmnx graph.
+
+    Returns:
+        dict: node_ids, node_lat, node_lon (one entry per node) and
+            indptr, indices, length (CSR over the node positions, parallel
+            edges kept)
+    """
+    node_ids = np.fromiter(G.nodes, dtype=np.int64, count=G.number_of_nodes())
+    position = {node: index for index, node in enumerate(node_ids.tolist())}
+    node_lat = np.array([G.nodes[node]["y"] for node in node_ids.tolist()], dtype=np.float64)
+    node_lon = np.array([G.nodes[node]["x"] for node in node_ids.tolist()], dtype=np.float64)
+
+    edges = [(position[u], position[v], data.get("length", 0.0)) for u, v, data in G.edges(data=True)]
+    sources = np.array([edge[0] for edge in edges], dtype=np.int64)
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=len(node_ids)), out=indptr[1:])
+
+    return {
+        "node_ids": node_ids,
+        "node_lat": node_lat,
+        "node_lon": node_lon,
+        "indptr": indptr,
+        "indices": np.array([edge[1] for edge in edges], dtype=np.int32)[order],
+        "length": np.array([edge[2] for edge in edges], dtype=np.float64)[order],
+    }
+
+
+def arrays_to_graph(arrays, crs):
+    """Rebuild the networkx graph calculate_shortest_path routes on"""
+    node_ids = arrays["node_ids"].tolist()
+    sources = np.repeat(arrays["node_ids"], np.diff(arrays["indptr"])).tolist()
+    targets = arrays["node_ids"][arrays["indices"]].tolist()
+    G = nx.MultiDiGraph(crs=crs)
+    # The cyclic GC would scan the growing dicts again and again, they hold no cycles
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        G.add_nodes_from(
+            (node, {"x": lon, "y": lat})
+            for node, lat, lon in zip(node_ids, arrays["node_lat"].tolist(), arrays["node_lon"].tolist())
+        )
+        G.add_edges_from(
+            (u, v, {"length": length}) for u, v, length in zip(sources, targets, arrays["length"].tolist())
+        )
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return G
+
+
+def save_graph(path, G, metadata):
+    """Write the graph arrays and their metadata, replacing `path` at once"""
+    ensure_directory_exists(os.path.dirname(path))
+    metadata = dict(metadata, version=FORMAT_VERSION, crs=str(G.graph.get("crs", ox.settings.default_crs)))
+    partial_path = path + ".partial"
+    with open(partial_path, "wb") as partial:
+        np.savez(partial, metadata=np.array(json.dumps(metadata)), **graph_to_arrays(G))
+    os.replace(partial_path, path)
+
+
+def load_graph_arrays(path):
+    """
+    Returns:
+        tuple: (arrays, metadata), (None, None) for a missing file or one
+            of another FORMAT_VERSION
+    """
+    if not os.path.exists(path):
+        return None, None
+    with np.load(path) as stored:
+        metadata = json.loads(str(stored["metadata"]))
+        if metadata.get("version") != FORMAT_VERSION:
+            return None, None
+        arrays = {name: stored[name] for name in stored.files if name != "metadata"}
+    return arrays, metadata
+
+
+def _is_fresh(metadata, center, ttl_days):
+    created = datetime.datetime.fromisoformat(metadata["created_at"])
+    age = datetime.datetime.now(datetime.timezone.utc) - created
+    same_center = all(abs(a - b) <= CENTER_TOLERANCE for a, b in zip(metadata["center"], center))
+    return same_center and age <= datetime.timedelta(days=ttl_days)
+
+
+def load_city_graph_cached(
+    city_id, dist=GRAPH_DIST_METERS, network_type=GRAPH_NETWORK_TYPE, cache_dir=None, ttl_days=None, refresh=False,
+    as_arrays=False,
+):
+    """
+    Street graph around the city center, from its cache file if that is
+    fresh, else downloaded with osmnx and written to the cache.
+
+    Args:
+        city_id (int): City to load the graph of
+        dist (int): Meters around the city center
+        network_type (str): osmnx network type
+        cache_dir (str): Defaults to GRAPH_CACHE_DIR
+        ttl_days (float): Defaults to GRAPH_CACHE_TTL_DAYS
+        refresh (bool): Download even if the cache file is fresh
+        as_arrays (bool): Return the arrays of graph_to_arrays, without
+            building a networkx graph from a cache file
+
+    Returns:
+        networkx.MultiDiGraph: Nodes with x/y, edges with length
+    """
+    ttl_days = GRAPH_CACHE_TTL_DAYS if ttl_days is None else ttl_days
+    path = graph_cache_path(city_id, dist, network_type, cache_dir)
+    center = get_city_coordinates_from_database(city_id)
+
+    arrays, metadata = load_graph_arrays(path)
+    if arrays is not None and not refresh and _is_fresh(metadata, center, ttl_days):
+        return arrays if as_arrays else arrays_to_graph(arrays, metadata["crs"])
+
+    try:
+        G = ox.graph_from_point(center, dist=dist, network_type=network_type)
+    except Exception as error:
+        if arrays is None:
+            raise
+        print(f"  Could not download the street graph of city {city_id} ({error!r}), using {path}")
+        return arrays if as_arrays else arrays_to_graph(arrays, metadata["crs"])
+
+    save_graph(path, G, {
+        "city_id": city_id,
+        "center": list(center),
+        "dist": dist,
+        "network_type": network_type,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    })
+    print(f"  Cached the street graph of city {city_id} in {path}")
+    return graph_to_arrays(G) if as_arrays else G
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the street graphs of cities into the graph cache.")
+    parser.add_argument("--city-id", type=int, nargs="+", required=True, help="City IDs to cache.")
+    parser.add_argument("--refresh", action="store_true", help="Download even if the cached graph is fresh.")
+    parser.add_argument("--cache-dir", default=None, help=f"Cache folder. (default: GRAPH_CACHE_DIR, {GRAPH_CACHE_DIR})")
+    args = parser.parse_args()
+
+    for city_id in args.city_id:
+        G = load_city_graph_cached(city_id, cache_dir=args.cache_dir, refresh=args.refresh)
+        print(f"City {city_id}: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
+
+
+if __name__ == "__main__":
+    main()
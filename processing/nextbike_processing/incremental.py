@@ -0,0 +1,237 @@
+"""
+Incremental trip processing during the day.
+
+Every run reads only the raw bike rows of a city newer than its watermark
+in public.trip_watermarks, pairs them with the last position of every bike
+from the run before (public.trip_bike_positions) and appends the trips.
+A movement that spans two runs gets the same start_time as in the nightly
+run of the whole day, so the nightly run skips the trips already stored.
+
+Rows are only processed once they are SETTLE_LAG older than the newest row
+of the city. The collector's --delta mode writes a held back sighting with
+the next poll of the city, under the timestamp of the poll before. Reading
+the newest poll right away would move the watermark past that sighting and
+pair the carried position with the wrong row.
+
+Run every few minutes, keeping street graphs and routes in memory:
+    python -m nextbike_processing.incremental --city-id 467 210 --every-minutes 5
+"""
+import argparse
+import datetime
+import time
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from nextbike_processing.cities import get_city_timezone_from_database
+from nextbike_processing.database import get_connection, raw_bikes_source, raw_bikes_table
+from nextbike_processing.trips import route_and_save_trips
+from nextbike_processing.utils import local_day_bounds
+
+# A bike's last position is not paired with rows more than this much newer,
+# a bike gone that long is back from maintenance, not from a trip
+MAX_CARRY_AGE = datetime.timedelta(hours=24)
+# Rows newer than the newest row of the city minus this wait for the next run,
+# a poll lands before the sightings held back from it, see the module docstring
+SETTLE_LAG = datetime.timedelta(minutes=10)
+
+INCREMENTAL_TRIPS_QUERY = """
+    WITH new_bikes AS (
+        SELECT b.bike_number, b.latitude, b.longitude, b.last_updated
+        FROM {bikes_table} b
+        WHERE b.city_id = %s
+        AND b.last_updated > %s
+        AND b.last_updated <= %s
+    ),
+    carried_bikes AS (
+        SELECT p.bike_number, p.latitude, p.longitude, p.last_updated
+        FROM public.trip_bike_positions p
+        WHERE p.city_id = %s
+        AND p.last_updated >= %s
+    ),
+    bike_movements AS (
+        SELECT bike_number,
+               latitude AS start_latitude,
+               longitude AS start_longitude,
+               last_updated AS start_time,
+               LEAD(latitude) OVER (PARTITION BY bike_number ORDER BY last_updated) AS end_latitude,
+               LEAD(longitude) OVER (PARTITION BY bike_number ORDER BY last_updated) AS end_longitude,
+               LEAD(last_updated) OVER (PARTITION BY bike_number ORDER BY last_updated) AS end_time
+        FROM (
+            SELECT * FROM carried_bikes
+            UNION ALL
+            SELECT * FROM new_bikes
+        ) AS ordered_bikes
+    )
+    SELECT bike_number,
+           start_latitude,
+           start_longitude,
+           start_time,
+           end_latitude,
+           end_longitude,
+           end_time
+    FROM bike_movements
+    WHERE end_latitude IS NOT NULL
+      AND (start_latitude != end_latitude OR start_longitude != end_longitude)
+    ORDER BY start_time, bike_number;
+"""
+
+CARRY_POSITIONS_SQL = """
+    INSERT INTO public.trip_bike_positions (city_id, bike_number, latitude, longitude, last_updated)
+    SELECT DISTINCT ON (b.bike_number) b.city_id, b.bike_number, b.latitude, b.longitude, b.last_updated
+    FROM {bikes_table} b
+    WHERE b.city_id = %s
+    AND b.last_updated > %s
+    AND b.last_updated <= %s
+    ORDER BY b.bike_number, b.last_updated DESC
+    ON CONFLICT (city_id, bike_number) DO UPDATE
+    SET latitude = EXCLUDED.latitude,
+        longitude = EXCLUDED.longitude,
+        last_updated = EXCLUDED.last_updated
+"""
+
+
+def get_watermark(city_id):
+    """
+    Time up to which the raw bike rows of the city are processed. A city
+    without a watermark starts at the beginning of its current local day,
+    the days before are left to the nightly run.
+    """
+    timezone = get_city_timezone_from_database(city_id)
+    today = datetime.datetime.now(ZoneInfo(timezone)).date()
+    start_of_today, _ = local_day_bounds(today, timezone)
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO public.trip_watermarks (city_id, processed_until)
+                VALUES (%s, %s)
+                ON CONFLICT (city_id) DO NOTHING
+                """,
+                (city_id, start_of_today),
+            )
+            cur.execute("SELECT processed_until FROM public.trip_watermarks WHERE city_id = %s", (city_id,))
+            watermark = cur.fetchone()[0]
+        conn.commit()
+    return watermark
+
+
+def fetch_new_trip_data(city_id, since):
+    """
+    Movements that end in a raw bike row newer than `since` and at least
+    SETTLE_LAG older than the newest row of the city.
+
+    Returns:
+        tuple: (trips, until) - trips in the columns of fetch_trip_data and
+            the end of the rows read, the next watermark. (None, None) if
+            there are no settled new rows.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT MAX(last_updated) FROM {raw_bikes_table()} WHERE city_id = %s AND last_updated > %s",
+                (city_id, since),
+            )
+            newest = cur.fetchone()[0]
+        if newest is None or newest - SETTLE_LAG <= since:
+            return None, None
+        until = newest - SETTLE_LAG
+
+        df = pd.read_sql_query(
+            INCREMENTAL_TRIPS_QUERY.format(bikes_table=raw_bikes_source()),
+            conn,
+            params=(city_id, since, until, city_id, since - MAX_CARRY_AGE),
+        )
+
+    df["start_time"] = pd.to_datetime(df["start_time"])
+    df["end_time"] = pd.to_datetime(df["end_time"])
+    df["duration"] = df["end_time"] - df["start_time"]
+
+    return df, until
+
+
+def advance_watermark(city_id, since, until):
+    """
+    Carry the last position of every bike seen after `since` over to the
+    next run and move the watermark to `until`, in one transaction.
+
+    Raises:
+        RuntimeError: If another run moved the watermark in the meantime.
+            Nothing is changed then, the trips both runs stored are the same.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE public.trip_watermarks
+                SET processed_until = %s, updated_at = now()
+                WHERE city_id = %s AND processed_until = %s
+                """,
+                (until, city_id, since),
+            )
+            if cur.rowcount != 1:
+                conn.rollback()
+                raise RuntimeError(f"Watermark of city {city_id} moved past {since} by another run")
+            cur.execute(CARRY_POSITIONS_SQL.format(bikes_table=raw_bikes_source()), (city_id, since, until))
+        conn.commit()
+
+
+def process_incremental_trips(city_id, graphs=None, routes=None):
+    """
+    Append the trips of the raw bike rows newer than the city's watermark.
+
+    The trips are stored before the watermark moves: a run that fails in
+    between is repeated by the next one, which skips the stored trips.
+
+    Args:
+        city_id (int): City to process
+        graphs, routes (dict): Optional caches kept between runs, see route_and_save_trips
+
+    Returns:
+        int: Trips found in the new rows
+    """
+    since = get_watermark(city_id)
+    trips, until = fetch_new_trip_data(city_id, since)
+    if until is None:
+        print(f"[{city_id}] No settled bike rows after {since.isoformat()}")
+        return 0
+
+    print(f"[{city_id}] Fetched movements from {since.isoformat()} to {until.isoformat()}")
+    if not trips.empty:
+        route_and_save_trips(city_id, trips, graphs, routes)
+    advance_watermark(city_id, since, until)
+    return len(trips)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append the trips of the bike rows since the last run.")
+    parser.add_argument("--city-id", type=int, nargs="+", required=True, help="City IDs to process.")
+    parser.add_argument(
+        "--every-minutes",
+        type=float,
+        default=0,
+        help="Keep running and process every this many minutes, with street graphs and routes kept in memory. "
+             "(default: 0, run once)",
+    )
+    args = parser.parse_args()
+    if args.every_minutes < 0:
+        parser.error("--every-minutes must not be negative.")
+
+    graphs, routes = {}, {}
+    while True:
+        started = time.monotonic()
+        for city_id in args.city_id:
+            try:
+                process_incremental_trips(city_id, graphs, routes)
+            except Exception as error:
+                if not args.every_minutes:
+                    raise
+                print(f"[{city_id}] Incremental trip processing failed: {error!r}")
+        if not args.every_minutes:
+            return
+        time.sleep(max(0.0, args.every_minutes * 60 - (time.monotonic() - started)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,103 @@
 import argparse
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from nextbike_processing.database import close_connection_pool, open_connection_pool
 from nextbike_processing.utils import ensure_directory_exists
+from nextbike_processing.compaction import process_compaction
 from nextbike_processing.stations import process_and_save_stations
 from nextbike_processing.trips import process_and_save_trips
 
+# Street graphs and routes of this process, kept from one day to the next
+_graphs = {}
+_routes = {}
+
+
+def _parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("Invalid date format. Please use YYYY-MM-DD format.")
+
+
+def date_range(start_date, end_date):
+    """Every date from `start_date` to `end_date`, both included"""
+    return [start_date + datetime.timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+def process_day(city_id, date, args):
+    """Compaction (with --compact), stations and trips of one city day"""
+    source = args.source or ("intervals" if args.compact else None)
+    if args.compact:
+        process_compaction(city_id, str(date), drop_raw=args.drop_raw)
+    process_and_save_stations(city_id, str(date), args.export_folder, export_files=args.export_files, source=source)
+    process_and_save_trips(
+        city_id, str(date), args.export_folder, export_files=args.export_files, source=source or "bikes",
+        graphs=_graphs, routes=_routes,
+    )
+
+
+def process_days(city_id, dates, args):
+    """
+    Process the days one after the other, a failed day does not stop the
+    others.
+
+    Returns:
+        list: (date, error) of the failed days
+    """
+    failed = []
+    for date in dates:
+        try:
+            process_day(city_id, date, args)
+        except Exception as error:
+            print(f"[{date}] Processing city {city_id} failed: {error!r}")
+            failed.append((date, repr(error)))
+    return failed
+
+
+def _chunks(items, count):
+    """`items` split into up to `count` contiguous chunks"""
+    size = -(-len(items) // count)
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def process_backfill(city_ids, dates, args, workers=1):
+    """
+    Process every date of every city in this process, or in `workers`
+    processes. A worker gets contiguous dates of one city, so it loads the
+    city's street graph once and reuses the routes of the days before.
+
+    Returns:
+        list: (city_id, date, error) of the failed days
+    """
+    failed = []
+    if workers <= 1:
+        open_connection_pool()
+        try:
+            for city_id in city_ids:
+                failed += [(city_id, date, error) for date, error in process_days(city_id, dates, args)]
+        finally:
+            close_connection_pool()
+        return failed
+
+    tasks = [(city_id, chunk) for city_id in city_ids for chunk in _chunks(dates, workers)]
+    # Workers open their own connections, none are inherited from this process
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=open_connection_pool
+    ) as executor:
+        futures = [(city_id, executor.submit(process_days, city_id, chunk, args)) for city_id, chunk in tasks]
+        for city_id, future in futures:
+            failed += [(city_id, date, error) for date, error in future.result()]
+    return failed
+
 
 def main():
     parser = argparse.ArgumentParser(
         description="Nextbike data processing application."
     )
     parser.add_argument(
-        "--city-id", type=int, required=True, help="City ID to process."
+        "--city-id", type=int, nargs="+", required=True, help="City IDs to process."
     )
     parser.add_argument(
         "--export-folder", type=str, default=None, help="Folder to save static files. Required when --export-files is set."
@@ -19,27 +107,72 @@ def main():
     )
     parser.add_argument(
         "--date",
-        type=str,
-        required=True,
+        type=_parse_date,
         help="Date to process data for. (format: YYYY-MM-DD).",
     )
+    parser.add_argument(
+        "--start-date",
+        type=_parse_date,
+        help="First date of a backfill, processed up to --end-date in one process. (format: YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--end-date",
+        type=_parse_date,
+        help="Last date of a backfill, included. (format: YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Process the days in this many worker processes. (default: 1)",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Fold the day's raw bike rows into public.bike_intervals first and read trips and stations from them.",
+    )
+    parser.add_argument(
+        "--drop-raw",
+        action="store_true",
+        help="Delete the day's raw bike rows after compacting them. Requires --compact.",
+    )
+    parser.add_argument(
+        "--source",
+        choices=("bikes", "intervals"),
+        default=None,
+        help="Read the raw bikes rows or the bike_intervals of an already compacted day. "
+             "(default: bikes, intervals with --compact; stations come from station_occupancy if it covers the day)",
+    )
     args = parser.parse_args()
 
     if args.export_files and not args.export_folder:
         parser.error("--export-files requires --export-folder to be set.")
+    if args.drop_raw and not args.compact:
+        parser.error("--drop-raw requires --compact.")
+    if args.compact and args.source == "bikes" and args.drop_raw:
+        parser.error("--source bikes cannot read a day whose raw rows --drop-raw deletes.")
+    if args.date and (args.start_date or args.end_date):
+        parser.error("--date cannot be combined with --start-date/--end-date.")
+    if not args.date and not (args.start_date and args.end_date):
+        parser.error("--date or --start-date and --end-date are required.")
+    if args.start_date and args.end_date and args.start_date > args.end_date:
+        parser.error("--start-date must not be after --end-date.")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1.")
 
     if args.export_folder:
         ensure_directory_exists(args.export_folder)
 
-    date = args.date
-    if (
-        not isinstance(date, str)
-        or not args.date.count("-") == 2
-        or len(args.date) != 10
-    ):
-        raise ValueError("Invalid date format. Please use YYYY-MM-DD format.")
-    process_and_save_stations(args.city_id, str(date), args.export_folder, export_files=args.export_files)
-    process_and_save_trips(args.city_id, str(date), args.export_folder, export_files=args.export_files)
+    if args.date and len(args.city_id) == 1:
+        process_day(args.city_id[0], args.date, args)
+        return
+
+    dates = [args.date] if args.date else date_range(args.start_date, args.end_date)
+    failed = process_backfill(args.city_id, dates, args, workers=args.workers)
+    if failed:
+        for city_id, date, error in failed:
+            print(f"  Failed: city {city_id} on {date}: {error}")
+        raise SystemExit(f"{len(failed)} of {len(dates) * len(args.city_id)} days failed")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,176 @@
+"""
+Routing on NumPy CSR arrays instead of a networkx graph.
+
+A networkx MultiDiGraph keeps every node and edge in nested Python dicts
+and its Dijkstra runs in the interpreter. CSRGraph holds the arrays of
+graph_cache.graph_to_arrays (node ids and lat/lon, edges as indptr,
+indices and length over the node positions):
+
+- one origin to many targets runs scipy's compiled Dijkstra
+- one pair runs A* with the haversine distance to the target as heuristic
+
+Both return the (distance, [[lat, lon], ...]) of calculate_shortest_path.
+Used with ROUTING_BACKEND=csr, see trips.load_city_graph.
+"""
+import heapq
+import itertools
+import math
+
+import numpy as np
+from scipy.sparse import csr_array
+from scipy.sparse.csgraph import dijkstra
+from sklearn.neighbors import BallTree
+
+from nextbike_processing.graph_cache import graph_to_arrays
+
+# Earth radius osmnx measures edge lengths and nearest node distances with
+EARTH_RADIUS_METERS = 6_371_009
+# A little below it, the heuristic must not exceed the length of any route
+# even with rounding in the edge lengths
+HEURISTIC_RADIUS_METERS = 6_371_000
+
+
+class CSRGraph:
+    """Street graph as CSR arrays, nodes are addressed by their OSM ids"""
+
+    def __init__(self, arrays):
+        self.node_ids = arrays["node_ids"]
+        self.node_lat = arrays["node_lat"]
+        self.node_lon = arrays["node_lon"]
+        self._order = np.argsort(self.node_ids, kind="stable")
+        self._sorted_ids = self.node_ids[self._order]
+
+        # Parallel edges count with their shortest length, like the "length"
+        # weight of networkx
+        node_count = len(self.node_ids)
+        sources = np.repeat(np.arange(node_count), np.diff(arrays["indptr"]))
+        order = np.lexsort((arrays["length"], arrays["indices"], sources))
+        sources, targets, lengths = sources[order], arrays["indices"][order], arrays["length"][order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (sources[1:] != sources[:-1]) | (targets[1:] != targets[:-1])
+        self.matrix = csr_array((lengths[first], (sources[first], targets[first])), shape=(node_count, node_count))
+
+        # Plain lists are much faster than arrays to index from Python (A*)
+        self._indptr = self.matrix.indptr.tolist()
+        self._indices = self.matrix.indices.tolist()
+        self._lengths = self.matrix.data.tolist()
+        self._lat = self.node_lat.tolist()
+        self._lon = self.node_lon.tolist()
+        self._lat_radians = np.radians(self.node_lat).tolist()
+        self._lon_radians = np.radians(self.node_lon).tolist()
+        self._tree = None
+
+    @classmethod
+    def from_graph(cls, G):
+        return cls(graph_to_arrays(G))
+
+    def number_of_nodes(self):
+        return len(self.node_ids)
+
+    def number_of_edges(self):
+        return self.matrix.nnz
+
+    def positions(self, nodes):
+        """
+        Array positions of OSM node ids, -1 for ids not in the graph.
+        """
+        nodes = np.asarray(nodes, dtype=np.int64)
+        found = np.searchsorted(self._sorted_ids, nodes).clip(max=len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[found] == nodes, self._order[found], -1)
+
+    def nearest_nodes(self, lats, lons):
+        """
+        Nearest node of every point, like ox.distance.nearest_nodes with
+        return_dist=True on an unprojected graph.
+
+        Returns:
+            tuple: (node ids, distances in meters) as arrays
+        """
+        if self._tree is None:
+            self._tree = BallTree(np.radians(np.column_stack([self.node_lat, self.node_lon])), metric="haversine")
+        distances, found = self._tree.query(np.radians(np.column_stack([lats, lons])), k=1)
+        return self.node_ids[found[:, 0]], distances[:, 0] * EARTH_RADIUS_METERS
+
+    def _segments(self, predecessors, target):
+        path = [target]
+        while predecessors[path[-1]] >= 0:
+            path.append(predecessors[path[-1]])
+        return [[self._lat[position], self._lon[position]] for position in reversed(path)]
+
+    def shortest_paths_from(self, origin, targets):
+        """
+        Shortest routes from one node to several in one scipy Dijkstra
+        search, see trips.shortest_paths_from.
+
+        Returns:
+            dict: {target: (distance_meters, segments)} of the reachable targets
+        """
+        targets = list(dict.fromkeys(targets))
+        origin_position = int(self.positions([origin])[0])
+        if origin_position < 0:
+            return {}
+        distances, predecessors = dijkstra(
+            self.matrix, directed=True, indices=origin_position, return_predecessors=True
+        )
+        routes = {}
+        for target, position in zip(targets, self.positions(targets).tolist()):
+            if position >= 0 and np.isfinite(distances[position]):
+                routes[target] = (float(distances[position]), self._segments(predecessors, position))
+        return routes
+
+    def _heuristic(self, position, target_lat, target_lon):
+        # Haversine distance to the target
+        lat = self._lat_radians[position]
+        a = (
+            math.sin((target_lat - lat) / 2) ** 2
+            + math.cos(lat) * math.cos(target_lat) * math.sin((target_lon - self._lon_radians[position]) / 2) ** 2
+        )
+        return 2 * HEURISTIC_RADIUS_METERS * math.asin(min(1.0, math.sqrt(a)))
+
+    def shortest_path(self, origin, target):
+        """
+        Shortest route between two nodes with A*.
+
+        Returns:
+            tuple: (distance_meters, segments), (None, []) if there is no route
+        """
+        origin_position, target_position = self.positions([origin, target]).tolist()
+        if origin_position < 0 or target_position < 0:
+            return None, []
+        target_lat, target_lon = self._lat_radians[target_position], self._lon_radians[target_position]
+        indptr, indices, lengths = self._indptr, self._indices, self._lengths
+
+        settled = set()
+        predecessors = {origin_position: -1}
+        tentative = {origin_position: 0.0}
+        # The counter keeps positions out of the comparison of equal estimates
+        counter = itertools.count()
+        heap = [(self._heuristic(origin_position, target_lat, target_lon), next(counter), origin_position)]
+        while heap:
+            _, _, position = heapq.heappop(heap)
+            if position == target_position:
+                return tentative[position], self._segments(predecessors, position)
+            if position in settled:
+                continue
+            settled.add(position)
+            distance = tentative[position]
+            for edge in range(indptr[position], indptr[position + 1]):
+                neighbor = indices[edge]
+                if neighbor in settled:
+                    continue
+                candidate = distance + lengths[edge]
+                if candidate < tentative.get(neighbor, math.inf):
+                    tentative[neighbor] = candidate
+                    predecessors[neighbor] = position
+                    estimate = candidate + self._heuristic(neighbor, target_lat, target_lon)
+                    heapq.heappush(heap, (estimate, next(counter), neighbor))
+        return None, []
+
+    def route(self, start_lat, start_lon, end_lat, end_lon, snapped=None):
+        """calculate_shortest_path on this graph"""
+        snapped = snapped or {}
+        missing = [point for point in ((start_lat, start_lon), (end_lat, end_lon)) if point not in snapped]
+        if missing:
+            nodes, distances = self.nearest_nodes(*zip(*missing))
+            snapped = {**snapped, **dict(zip(missing, zip(nodes.tolist(), distances.tolist())))}
+        return self.shortest_path(snapped[(start_lat, start_lon)][0], snapped[(end_lat, end_lon)][0])
@@ -1,12 +1,12 @@
 import os
 import pandas as pd
 from zoneinfo import ZoneInfo
+from nextbike_processing.archive import bikes_table_for_day
 from nextbike_processing.database import get_connection
-from nextbike_processing.utils import save_csv, save_gzipped_csv, save_json
+from nextbike_processing.utils import local_day_bounds, save_csv, save_gzipped_csv, save_json
 
 
-def fetch_station_data(city_id, date):
-    query = """
+STATIONS_CTE = """
     WITH city_context AS (
             SELECT city_id, COALESCE(timezone, 'UTC') AS city_tz
             FROM public.cities
@@ -33,7 +33,8 @@ def fetch_station_data(city_id, date):
             FROM public.stations
             JOIN city_context cc ON cc.city_id = public.stations.city_id
             WHERE public.stations.city_id = %s
-            AND DATE(last_updated AT TIME ZONE cc.city_tz) = %s
+            AND public.stations.last_updated >= %s
+            AND public.stations.last_updated < %s
         ),
         filtered_stations AS (
             SELECT
@@ -51,6 +52,10 @@ def fetch_station_data(city_id, date):
             FROM station_data
             WHERE rn = 1
         ),
+"""
+
+# Bike count per station for every minute with a snapshot
+RAW_OCCUPANCY_CTE = """
         bike_data AS (
             SELECT
                 DATE_TRUNC('minute', b.last_updated AT TIME ZONE cc.city_tz) AS minute,
@@ -58,21 +63,23 @@ def fetch_station_data(city_id, date):
                 COUNT(b.bike_number) AS bike_count,
                 STRING_AGG(b.bike_number::TEXT, ', ') AS bike_list
             FROM
-                public.bikes b
+                {bikes_table} b
             JOIN city_context cc ON cc.city_id = b.city_id
             WHERE
                 b.city_id = %s
-                AND DATE(b.last_updated AT TIME ZONE cc.city_tz) = %s
+                AND b.last_updated >= %s
+                AND b.last_updated < %s
             GROUP BY
                 DATE_TRUNC('minute', b.last_updated AT TIME ZONE cc.city_tz), b.station_number
         ),
         distinct_minutes AS (
             SELECT DISTINCT DATE_TRUNC('minute', b.last_updated AT TIME ZONE cc.city_tz) AS minute
-            FROM public.bikes b
+            FROM {bikes_table} b
             JOIN city_context cc ON cc.city_id = b.city_id
             WHERE
                 b.city_id = %s
-                AND DATE(b.last_updated AT TIME ZONE cc.city_tz) = %s
+                AND b.last_updated >= %s
+                AND b.last_updated < %s
         ),
         station_minute_combinations AS (
             SELECT
@@ -117,6 +124,119 @@ def fetch_station_data(city_id, date):
                 smc.station_number = bd.station_number
                 AND smc.minute = bd.minute
         ),
+"""
+
+# Bike count per station only at the minutes an interval starts or ends at
+# the station, plus the first snapshot of the day. The count between those
+# minutes is the same, so the changes below come out identical.
+INTERVAL_OCCUPANCY_CTE = """
+        day_intervals AS (
+            SELECT
+                bi.bike_number,
+                bi.station_number,
+                DATE_TRUNC('minute', bi.valid_from AT TIME ZONE cc.city_tz) AS from_minute,
+                DATE_TRUNC('minute', bi.ended_at AT TIME ZONE cc.city_tz) AS ended_minute
+            FROM public.bike_intervals bi
+            JOIN city_context cc ON cc.city_id = bi.city_id
+            WHERE
+                bi.city_id = %s
+                AND bi.valid_from >= %s
+                AND bi.valid_from < %s
+        ),
+        station_minutes AS (
+            SELECT fs.station_number, first_minute.minute
+            FROM filtered_stations fs
+            CROSS JOIN (SELECT MIN(from_minute) AS minute FROM day_intervals) AS first_minute
+            WHERE first_minute.minute IS NOT NULL
+            UNION
+            SELECT station_number, from_minute FROM day_intervals
+            UNION
+            SELECT station_number, ended_minute FROM day_intervals WHERE ended_minute IS NOT NULL
+        ),
+        bike_data AS (
+            SELECT
+                sm.minute,
+                sm.station_number,
+                COUNT(di.bike_number) AS bike_count,
+                STRING_AGG(di.bike_number::TEXT, ', ') AS bike_list
+            FROM station_minutes sm
+            LEFT JOIN day_intervals di
+            ON
+                di.station_number = sm.station_number
+                AND di.from_minute <= sm.minute
+                AND (di.ended_minute IS NULL OR di.ended_minute > sm.minute)
+            GROUP BY sm.minute, sm.station_number
+        ),
+        station_bike_combined AS (
+            SELECT
+                bd.minute,
+                fs.id,
+                fs.uid,
+                fs.latitude,
+                fs.longitude,
+                fs.name,
+                fs.spot,
+                fs.station_number,
+                fs.maintenance,
+                fs.terminal_type,
+                fs.city_id,
+                fs.city_name,
+                bd.bike_count,
+                COALESCE(bd.bike_list, '') AS bike_list
+            FROM
+                filtered_stations fs
+            JOIN
+                bike_data bd
+            ON
+                fs.station_number = bd.station_number
+        ),
+"""
+
+# The collector writes the changes already. LAG drops repeated counts a
+# collector restart writes for every station.
+OCCUPANCY_SELECT = """
+        occupancy_changes AS (
+            SELECT
+                DATE_TRUNC('minute', o.last_updated AT TIME ZONE cc.city_tz) AS minute,
+                o.station_number,
+                o.bike_count,
+                o.bike_list,
+                LAG(o.bike_count) OVER (PARTITION BY o.station_number ORDER BY o.last_updated) AS previous_bike_count
+            FROM public.station_occupancy o
+            JOIN city_context cc ON cc.city_id = o.city_id
+            WHERE
+                o.city_id = %s
+                AND o.last_updated >= %s
+                AND o.last_updated < %s
+        )
+        SELECT
+            oc.minute,
+            fs.id,
+            fs.uid,
+            fs.latitude,
+            fs.longitude,
+            fs.name,
+            fs.spot,
+            fs.station_number,
+            fs.maintenance,
+            fs.terminal_type,
+            fs.city_id,
+            fs.city_name,
+            oc.bike_count,
+            oc.bike_list
+        FROM
+            occupancy_changes oc
+        JOIN
+            filtered_stations fs
+        ON
+            fs.station_number = oc.station_number
+        WHERE
+            oc.bike_count IS DISTINCT FROM oc.previous_bike_count
+        ORDER BY
+            fs.station_number, oc.minute;
+"""
+
+CHANGES_SELECT = """
         bike_changes AS (
             SELECT
                 sbc.*,
@@ -152,6 +272,33 @@ def fetch_station_data(city_id, date):
         ORDER BY
             station_number, minute;
 
+"""
+
+
+def station_occupancy_covers_day(cur, city_id, day_start, day_end):
+    """
+    True if the collector wrote public.station_occupancy of the city for the
+    whole day, checked by the SQL function of the same name. False on
+    databases without it (collection/007_station_occupancy_coverage_migration.sql).
+    """
+    cur.execute(
+        "SELECT to_regprocedure('public.station_occupancy_covers_day(integer, timestamptz, timestamptz)') IS NOT NULL"
+    )
+    if not cur.fetchone()[0]:
+        return False
+    cur.execute("SELECT public.station_occupancy_covers_day(%s, %s, %s)", (city_id, day_start, day_end))
+    return cur.fetchone()[0]
+
+
+def fetch_station_data(city_id, date, source=None):
+    """
+    Bike count and bike list per station at every minute the count changed.
+    `source` is "bikes" for the raw snapshots, "intervals" for the
+    public.bike_intervals of a compacted day or "occupancy" for the changes
+    the collector wrote to public.station_occupancy. The default reads
+    occupancy if the collector wrote it for the whole day, else the raw
+    snapshots. The raw snapshots of an archived day come from its archive
+    file.
     """
     city_timezone = "UTC"
     with get_connection() as conn:
@@ -163,11 +310,35 @@ def fetch_station_data(city_id, date):
             row = cur.fetchone()
             city_timezone = row[0] if row else "UTC"
 
-        df = pd.read_sql_query(
-            query,
-            conn,
-            params=(city_id, city_id, date, city_id, date, city_id, date),
-        )
+        day_start, day_end = local_day_bounds(date, city_timezone)
+        with conn.cursor() as cur:
+            if source is None:
+                source = "occupancy" if station_occupancy_covers_day(cur, city_id, day_start, day_end) else "bikes"
+
+        if source == "occupancy":
+            query = STATIONS_CTE + OCCUPANCY_SELECT
+            params = (
+                city_id,
+                city_id, day_start, day_end,  # station_data
+                city_id, day_start, day_end,  # occupancy_changes
+            )
+        elif source == "intervals":
+            query = STATIONS_CTE + INTERVAL_OCCUPANCY_CTE + CHANGES_SELECT
+            params = (
+                city_id,
+                city_id, day_start, day_end,  # station_data
+                city_id, day_start, day_end,  # day_intervals
+            )
+        else:
+            bikes_table = bikes_table_for_day(conn, city_id, date, day_start, day_end)
+            query = STATIONS_CTE + RAW_OCCUPANCY_CTE.format(bikes_table=bikes_table) + CHANGES_SELECT
+            params = (
+                city_id,
+                city_id, day_start, day_end,  # station_data
+                city_id, day_start, day_end,  # bike_data
+                city_id, day_start, day_end,  # distinct_minutes
+            )
+        df = pd.read_sql_query(query, conn, params=params)
 
     city_zone = ZoneInfo(city_timezone)
     df["minute"] = pd.to_datetime(df["minute"]).map(
@@ -177,7 +348,7 @@ def fetch_station_data(city_id, date):
     return df
 
 
-def process_and_save_stations(city_id, date, folder, export_files=False):
-    df = fetch_station_data(city_id, date)
+def process_and_save_stations(city_id, date, folder, export_files=False, source=None):
+    df = fetch_station_data(city_id, date, source=source)
     if export_files:
         save_gzipped_csv(os.path.join(folder, f"{city_id}_stations_{date}.csv.gz"), df)
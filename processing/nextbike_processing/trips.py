@@ -1,7 +1,10 @@
+import heapq
+import itertools
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import osmnx as ox
-import networkx as nx
 from zoneinfo import ZoneInfo
 from nextbike_processing.database import (
     get_connection, 
@@ -10,11 +13,20 @@ from nextbike_processing.database import (
     insert_new_routes, 
     insert_trips
 )
-from nextbike_processing.utils import save_gzipped_geojson, save_gzipped_csv
-from nextbike_processing.cities import (
-    get_city_coordinates_from_database,
-    get_city_timezone_from_database,
-)
+from nextbike_processing.archive import bikes_table_for_day
+from nextbike_processing.graph_cache import load_city_graph_cached
+from nextbike_processing.utils import local_day_bounds, save_gzipped_geojson, save_gzipped_csv
+from nextbike_processing.cities import get_city_timezone_from_database
+from nextbike_processing.config import ROUTE_SNAP_MAX_DISTANCE_METERS, ROUTING_BACKEND, ROUTING_WORKERS
+from nextbike_processing.routing_csr import CSRGraph
+
+
+ROUTE_KEY_COLUMNS = ["start_latitude", "start_longitude", "end_latitude", "end_longitude"]
+# Chunks per routing worker, smaller chunks balance origins of uneven cost
+ROUTING_CHUNKS_PER_WORKER = 4
+
+# Graph the forked routing workers read, inherited instead of pickled
+_routing_graph = None
 
 
 def _to_city_isoformat(timestamp, city_zone):
@@ -24,17 +36,53 @@ def _to_city_isoformat(timestamp, city_zone):
     return ts.tz_convert(city_zone).isoformat(timespec="seconds")
 
 
-def fetch_trip_data(city_id, date):
+INTERVAL_TRIPS_QUERY = """
+    WITH day_intervals AS (
+        SELECT bike_number, latitude, longitude, valid_from, valid_to
+        FROM public.bike_intervals
+        WHERE city_id = %s
+        AND valid_from >= %s
+        AND valid_from < %s
+    ),
+    bike_movements AS (
+        SELECT bike_number,
+               latitude AS start_latitude,
+               longitude AS start_longitude,
+               valid_to AS start_time,
+               LEAD(latitude) OVER (PARTITION BY bike_number ORDER BY valid_from) AS end_latitude,
+               LEAD(longitude) OVER (PARTITION BY bike_number ORDER BY valid_from) AS end_longitude,
+               LEAD(valid_from) OVER (PARTITION BY bike_number ORDER BY valid_from) AS end_time
+        FROM day_intervals
+    )
+    SELECT bike_number,
+           start_latitude,
+           start_longitude,
+           start_time,
+           end_latitude,
+           end_longitude,
+           end_time
+    FROM bike_movements
+    WHERE end_latitude IS NOT NULL
+      AND (start_latitude != end_latitude OR start_longitude != end_longitude)
+    ORDER BY start_time, bike_number;
+"""
+
+
+def fetch_trip_data(city_id, date, source="bikes"):
     """
     Load raw bike movements for a specific day.
     
     A "movement" is detected when a bike is seen at one location, then later
     seen at a different location. This function reconstructs those movements
-    from the bikes table.
+    from the bikes table, or from public.bike_intervals of a compacted day:
+    a movement starts at the last snapshot of one interval and ends at the
+    first snapshot of the bike's next interval somewhere else. The bike
+    rows of an archived day are read from its archive file.
     
     Args:
         city_id (int): City to query
         date (str): Date in YYYY-MM-DD format
+        source (str): "bikes" for the raw snapshots, "intervals" for bike_intervals
     
     Returns:
         pd.DataFrame with columns:
@@ -46,10 +94,10 @@ def fetch_trip_data(city_id, date):
     query = """
         WITH ordered_bikes AS (
             SELECT b.*
-            FROM public.bikes b
-            JOIN public.cities c ON b.city_id = c.city_id
+            FROM {bikes_table} b
             WHERE b.city_id = %s
-            AND DATE(b.last_updated AT TIME ZONE c.timezone) = %s
+            AND b.last_updated >= %s
+            AND b.last_updated < %s
             ORDER BY b.bike_number, b.last_updated
         ),
         bike_movements AS (
@@ -75,8 +123,14 @@ def fetch_trip_data(city_id, date):
         ORDER BY start_time, bike_number;
     """
     
+    day_start, day_end = local_day_bounds(date, get_city_timezone_from_database(city_id))
+
     with get_connection() as conn:
-        df = pd.read_sql_query(query, conn, params=(city_id, date))
+        if source == "intervals":
+            query = INTERVAL_TRIPS_QUERY
+        else:
+            query = query.format(bikes_table=bikes_table_for_day(conn, city_id, date, day_start, day_end))
+        df = pd.read_sql_query(query, conn, params=(city_id, day_start, day_end))
     
     df["start_time"] = pd.to_datetime(df["start_time"])
     df["end_time"] = pd.to_datetime(df["end_time"])
@@ -84,7 +138,35 @@ def fetch_trip_data(city_id, date):
     
     return df
 
-def calculate_shortest_path(G, start_lat, start_lon, end_lat, end_lon):
+def route_endpoints(pairs):
+    """Unique (lat, lon) start and end points of O/D pairs"""
+    starts = zip(pairs["start_latitude"].tolist(), pairs["start_longitude"].tolist())
+    ends = zip(pairs["end_latitude"].tolist(), pairs["end_longitude"].tolist())
+    return list(dict.fromkeys([*starts, *ends]))
+
+
+def snap_points(G, points):
+    """
+    Nearest street node of every point, in one BallTree query over the graph.
+
+    Args:
+        G (networkx.MultiDiGraph or CSRGraph): Street graph, see load_city_graph
+        points (list): (lat, lon) tuples, see route_endpoints
+
+    Returns:
+        dict: {(lat, lon): (node, distance_meters)}
+    """
+    if not points:
+        return {}
+    lats, lons = zip(*points)
+    if isinstance(G, CSRGraph):
+        nodes, distances = G.nearest_nodes(lats, lons)
+    else:
+        nodes, distances = ox.distance.nearest_nodes(G, X=list(lons), Y=list(lats), return_dist=True)
+    return dict(zip(points, zip(nodes.tolist(), distances.tolist())))
+
+
+def calculate_shortest_path(G, start_lat, start_lon, end_lat, end_lon, snapped=None):
     """
     Compute the shortest bike-friendly route between two points using OSM graph.
     
@@ -92,9 +174,11 @@ def calculate_shortest_path(G, start_lat, start_lon, end_lat, end_lon):
     returning the distance and the coordinate sequence.
     
     Args:
-        G (networkx.MultiDiGraph): OSM street network graph (from osmnx)
+        G (networkx.MultiDiGraph or CSRGraph): Street graph, see load_city_graph
         start_lat, start_lon (float): Starting point coordinates
         end_lat, end_lon (float): Ending point coordinates
+        snapped (dict): Optional nodes of the points from snap_points,
+            points missing in it are looked up one by one
     
     Returns:
         tuple: (distance_meters, segments)
@@ -103,59 +187,179 @@ def calculate_shortest_path(G, start_lat, start_lon, end_lat, end_lon):
             
         Returns (None, []) if route cannot be computed
     """
+    if isinstance(G, CSRGraph):
+        # A* on the arrays, see routing_csr.py
+        return G.route(start_lat, start_lon, end_lat, end_lon, snapped)
+
     try:
         # Find closest street intersection nodes to our start/end points
-        start_node = ox.distance.nearest_nodes(G, X=start_lon, Y=start_lat)
-        end_node = ox.distance.nearest_nodes(G, X=end_lon, Y=end_lat)
+        snapped = snapped or {}
+        if (start_lat, start_lon) in snapped:
+            start_node = snapped[(start_lat, start_lon)][0]
+        else:
+            start_node = ox.distance.nearest_nodes(G, X=start_lon, Y=start_lat)
+        if (end_lat, end_lon) in snapped:
+            end_node = snapped[(end_lat, end_lon)][0]
+        else:
+            end_node = ox.distance.nearest_nodes(G, X=end_lon, Y=end_lat)
 
         if start_node not in G.nodes or end_node not in G.nodes:
             return None, []
 
-        # Compute shortest path
-        shortest_path_length = nx.shortest_path_length(
-            G, start_node, end_node, weight="length"
-        )
-        shortest_path = nx.shortest_path(G, start_node, end_node, weight="length")
-        
-    except nx.NetworkXNoPath:
-        # No route exists between these points
-        return None, []
+        # Compute shortest path, (None, []) if no route exists
+        return shortest_paths_from(G, start_node, [end_node]).get(end_node, (None, []))
+
     except Exception:
         # Unexpected error
         return None, []
 
-    # Convert node IDs to [lat, lon] coordinates
-    path_segments = [[G.nodes[node]["y"], G.nodes[node]["x"]] for node in shortest_path]
 
-    return shortest_path_length, path_segments
+def shortest_paths_from(G, origin, targets):
+    """
+    Shortest routes from one node to several in a single Dijkstra search,
+    stopped once every target is reached.
+
+    Parallel edges count with their shortest length, like the "length"
+    weight of networkx.
 
-def process_and_save_trips(city_id, date, folder, export_files=False):
+    Args:
+        G (networkx.MultiDiGraph or CSRGraph): Street graph, see load_city_graph
+        origin: Node the routes start at
+        targets (iterable): Nodes the routes end at
+
+    Returns:
+        dict: {target: (distance_meters, segments)} of the reachable
+            targets, segments as [[lat, lon], ...] like calculate_shortest_path
     """
-    Main orchestration function: Fetch raw movements → compute routes → save results.
-    
-    This is the high-level flow:
-    1. Load raw bike movements from database
-    2. Identify which O/D pairs need routing (not cached)
-    3. Compute routes for uncached pairs
-    4. Combine with cached routes
-    5. Interpolate timestamps along routes
-    6. Save to database and optionally export files
-    
+    if isinstance(G, CSRGraph):
+        return G.shortest_paths_from(origin, targets)
+
+    remaining = set(targets)
+    settled = {}
+    predecessors = {origin: None}
+    tentative = {origin: 0.0}
+    # The counter keeps nodes out of the comparison of equal distances
+    counter = itertools.count()
+    heap = [(0.0, next(counter), origin)]
+    while heap and remaining:
+        distance, _, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        settled[node] = distance
+        remaining.discard(node)
+        for neighbor, edges in G.succ[node].items():
+            if neighbor in settled:
+                continue
+            candidate = distance + min(data.get("length", 1) for data in edges.values())
+            if candidate < tentative.get(neighbor, float("inf")):
+                tentative[neighbor] = candidate
+                predecessors[neighbor] = node
+                heapq.heappush(heap, (candidate, next(counter), neighbor))
+
+    routes = {}
+    for target in set(targets) & settled.keys():
+        path = [target]
+        while predecessors[path[-1]] is not None:
+            path.append(predecessors[path[-1]])
+        # Convert node IDs to [lat, lon] coordinates
+        routes[target] = (settled[target], [[G.nodes[node]["y"], G.nodes[node]["x"]] for node in reversed(path)])
+    return routes
+
+def _route_origin_chunk(chunk):
+    return [(origin, shortest_paths_from(_routing_graph, origin, targets)) for origin, targets in chunk]
+
+
+def route_from_origins(G, destinations, workers=1):
+    """
+    Shortest routes from every origin node to its destinations, see
+    shortest_paths_from.
+
+    With several workers the origins are split into chunks routed by forked
+    processes. They share `G` copy-on-write with this process, only the
+    chunks and their routes are pickled.
+
     Args:
-        city_id (int): City to process
-        date (str): Date in YYYY-MM-DD format
-        folder (str): Export folder path (if export_files=True)
-        export_files (bool): Whether to export .geojson.gz and .csv.gz files
-    
+        G (networkx.MultiDiGraph or CSRGraph): Street graph, see load_city_graph
+        destinations (dict): {origin: set of target nodes}
+        workers (int): Routing processes, 1 routes in this process
+
     Returns:
-        None (all data saved to database)
+        dict: {origin: {target: (distance_meters, segments)}}, in the order
+            of `destinations` whatever the number of workers
+    """
+    origins = list(destinations.items())
+    if workers <= 1 or len(origins) < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        origin_routes = {}
+        for idx, (origin, targets) in enumerate(origins, 1):
+            if idx % 50 == 0:
+                print(f"    Progress: {idx}/{len(origins)}")
+            origin_routes[origin] = shortest_paths_from(G, origin, targets)
+        return origin_routes
+
+    global _routing_graph
+    size = -(-len(origins) // (workers * ROUTING_CHUNKS_PER_WORKER))
+    chunks = [origins[start:start + size] for start in range(0, len(origins), size)]
+    origin_routes = {}
+    _routing_graph = G
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            # map yields the chunks in submission order
+            for chunk_routes in executor.map(_route_origin_chunk, chunks):
+                previous = len(origin_routes)
+                origin_routes.update(chunk_routes)
+                if len(origin_routes) // 50 > previous // 50:
+                    print(f"    Progress: {len(origin_routes)}/{len(origins)}")
+    finally:
+        _routing_graph = None
+    return origin_routes
+
+
+def load_city_graph(city_id, graphs=None):
+    """
+    Street network graph around the city center for routing.
+
+    Args:
+        city_id (int): City to load the graph of
+        graphs (dict): Optional {city_id: graph} cache of a long running
+            process, filled on the first load of a city
+
+    Returns:
+        networkx.MultiDiGraph: osmnx bike network within 10 km of the center,
+            from the graph cache on disk if it is fresh (see graph_cache.py).
+            A CSRGraph of it with ROUTING_BACKEND=csr.
+    """
+    if graphs is not None and city_id in graphs:
+        return graphs[city_id]
+
+    if ROUTING_BACKEND == "csr":
+        G = CSRGraph(load_city_graph_cached(city_id, as_arrays=True))
+    else:
+        G = load_city_graph_cached(city_id)
+    # Use bidirectional graph - ignores one way signs
+    # okay here as OpenStreetMap might not have all correct one-way bike ways listed
+    # G = ox.convert.to_undirected(G)
+    if graphs is not None:
+        graphs[city_id] = G
+    return G
+
+
+def route_and_save_trips(city_id, trips, graphs=None, routes=None):
+    """
+    Compute or look up the route of every movement and store the trips.
+
+    Args:
+        city_id (int): City the movements belong to
+        trips (pd.DataFrame): Movements as returned by fetch_trip_data
+        graphs (dict): Optional graph cache, see load_city_graph
+        routes (dict): Optional {(start_lat, start_lon, end_lat, end_lon):
+            (distance, segments)} cache of a long running process. Pairs
+            found in it are not looked up in public.routes, the routes
+            looked up or computed are added to it.
+
+    Returns:
+        pd.DataFrame: The saved trips with duration in seconds, distance
+            and segments. None if no route is available.
     """
-    
-    # ===== STEP 1: Fetch raw bike movements =====
-    print(f"[{date}] Fetching trip data for city {city_id}...")
-    trips = fetch_trip_data(city_id, date)
-    
-    # Convert duration to seconds (for storage)
     trips["duration"] = trips["duration"].dt.total_seconds()
     
     # Get unique O/D pairs from all trips
@@ -166,13 +370,24 @@ def process_and_save_trips(city_id, date, folder, export_files=False):
     
     print(f"  Found {len(trips)} trips from {len(unique_pairs)} unique routes")
     
-    # ===== STEP 2: Check database for cached routes =====
+    # ===== STEP 2: Check memory and database for cached routes =====
+    remembered_routes = pd.DataFrame()
+    lookup_pairs = unique_pairs
+    if routes:
+        pair_keys = list(unique_pairs.itertuples(index=False, name=None))
+        remembered = [key in routes for key in pair_keys]
+        remembered_routes = pd.DataFrame(
+            [(*key, *routes[key]) for key, known in zip(pair_keys, remembered) if known],
+            columns=ROUTE_KEY_COLUMNS + ["distance", "segments"],
+        )
+        lookup_pairs = unique_pairs[[not known for known in remembered]]
+
     print(f"  Checking database for cached routes...")
     with get_connection() as conn:
-        cached_routes = get_cached_routes(unique_pairs, conn)
-        uncached_pairs = get_uncached_route_pairs(unique_pairs, conn)
+        cached_routes = get_cached_routes(lookup_pairs, conn)
+        uncached_pairs = get_uncached_route_pairs(lookup_pairs, conn)
     
-    print(f"    Cached: {len(cached_routes)} routes")
+    print(f"    Cached: {len(cached_routes) + len(remembered_routes)} routes ({len(remembered_routes)} in memory)")
     print(f"    Need to compute: {len(uncached_pairs)} routes")
     
     # ===== STEP 3: Compute routes for uncached pairs =====
@@ -180,25 +395,42 @@ def process_and_save_trips(city_id, date, folder, export_files=False):
     if not uncached_pairs.empty:
         print(f"  Computing {len(uncached_pairs)} new routes using OSM...")
         
-        # Load city center and build street network graph
-        city_lat, city_lng = get_city_coordinates_from_database(city_id)
-        G = ox.graph_from_point((city_lat, city_lng), dist=10000, network_type="bike")
-        # Use bidirectional graph - ignores one way signs
-        # okay here as OpenStreetMap might not have all correct one-way bike ways listed
-        # G = ox.convert.to_undirected(G)
-        
+        G = load_city_graph(city_id, graphs)
+
+        # Snap every endpoint once, a station is part of many pairs
+        snapped = snap_points(G, route_endpoints(uncached_pairs))
+        far_points = {
+            point for point, (_, snap_distance) in snapped.items()
+            if snap_distance > ROUTE_SNAP_MAX_DISTANCE_METERS
+        }
+        print(
+            f"  Snapped {len(snapped)} endpoints to the street graph, "
+            f"{len(far_points)} farther than {ROUTE_SNAP_MAX_DISTANCE_METERS:g} m"
+        )
+
+        # One search per origin node covers all of its destinations
+        pair_points = [
+            ((row["start_latitude"], row["start_longitude"]), (row["end_latitude"], row["end_longitude"]))
+            for _, row in uncached_pairs.iterrows()
+        ]
+        destinations = {}
+        for start, end in pair_points:
+            if start not in far_points and end not in far_points:
+                destinations.setdefault(snapped[start][0], set()).add(snapped[end][0])
+        workers = min(ROUTING_WORKERS, len(destinations))
+        print(f"  Routing from {len(destinations)} origin nodes in {max(workers, 1)} processes...")
+        origin_routes = route_from_origins(G, destinations, workers)
+
         route_results = []
         failed_pairs = []
         skipped_routes = 0
-        for idx, (_, row) in enumerate(uncached_pairs.iterrows(), 1):
-            if idx % 50 == 0:
-                print(f"    Progress: {idx}/{len(uncached_pairs)}")
-
-            distance, segments = calculate_shortest_path(
-                G,
-                row["start_latitude"], row["start_longitude"],
-                row["end_latitude"], row["end_longitude"]
-            )
+        too_far_routes = 0
+        for (_, row), (start, end) in zip(uncached_pairs.iterrows(), pair_points):
+            if start in far_points or end in far_points:
+                too_far_routes += 1
+                distance, segments = None, []
+            else:
+                distance, segments = origin_routes[snapped[start][0]].get(snapped[end][0], (None, []))
 
             if segments:
                 route_results.append({
@@ -227,7 +459,10 @@ def process_and_save_trips(city_id, date, folder, export_files=False):
                     )
 
         new_routes = pd.DataFrame(route_results)
-        print(f"  Successfully computed {len(new_routes)} routes (skipped {skipped_routes})")
+        print(
+            f"  Successfully computed {len(new_routes)} routes "
+            f"(skipped {skipped_routes}, {too_far_routes} off the street graph)"
+        )
         print(f"  Failed pairs: {len(failed_pairs)}")
         for i, pair in enumerate(failed_pairs[:10], 1):
             print(
@@ -241,11 +476,18 @@ def process_and_save_trips(city_id, date, folder, export_files=False):
             insert_new_routes(new_routes, conn)
             print(f"  Cached new routes in database")
     
+    if routes is not None:
+        for looked_up in (cached_routes, new_routes):
+            for route in looked_up.itertuples(index=False):
+                routes[(route.start_latitude, route.start_longitude, route.end_latitude, route.end_longitude)] = (
+                    route.distance, route.segments
+                )
+
     # ===== STEP 4: Combine cached + newly computed routes =====
-    all_routes_list = [df for df in [cached_routes, new_routes] if not df.empty]
+    all_routes_list = [df for df in [remembered_routes, cached_routes, new_routes] if not df.empty]
     if not all_routes_list:
         print(f"  WARNING: No routes available!")
-        return
+        return None
     
     all_routes = pd.concat(all_routes_list, ignore_index=True)
     
@@ -264,6 +506,42 @@ def process_and_save_trips(city_id, date, folder, export_files=False):
     with get_connection() as conn:
         insert_trips(trips, city_id, conn)
     print(f"  Done!")
+
+    return trips
+
+def process_and_save_trips(city_id, date, folder, export_files=False, source="bikes", graphs=None, routes=None):
+    """
+    Main orchestration function: Fetch raw movements → compute routes → save results.
+    
+    This is the high-level flow:
+    1. Load raw bike movements from database
+    2. Identify which O/D pairs need routing (not cached)
+    3. Compute routes for uncached pairs
+    4. Combine with cached routes
+    5. Interpolate timestamps along routes
+    6. Save to database and optionally export files
+    
+    Args:
+        city_id (int): City to process
+        date (str): Date in YYYY-MM-DD format
+        folder (str): Export folder path (if export_files=True)
+        export_files (bool): Whether to export .geojson.gz and .csv.gz files
+        source (str): Read movements from "bikes" or "intervals", see fetch_trip_data
+        graphs, routes (dict): Optional caches of a process that works
+            through many days, see route_and_save_trips
+    
+    Returns:
+        None (all data saved to database)
+    """
+    
+    # ===== STEP 1: Fetch raw bike movements =====
+    print(f"[{date}] Fetching trip data for city {city_id}...")
+    trips = fetch_trip_data(city_id, date, source=source)
+
+    # ===== STEPS 2-6: Route and save =====
+    trips = route_and_save_trips(city_id, trips, graphs, routes)
+    if trips is None:
+        return
     
     # ===== STEP 7: Export files (optional) =====
     if not export_files:
@@ -1,6 +1,8 @@
+import datetime
 import gzip
 import os
 import json
+from zoneinfo import ZoneInfo
 
 
 def save_json(file_path, data):
@@ -35,3 +37,18 @@ def save_gzipped_geojson(file_path, data):
 
 def ensure_directory_exists(folder):
     os.makedirs(folder, exist_ok=True)
+
+
+def local_day_bounds(date, timezone):
+    """
+    Start of `date` and of the next day in `timezone`, as aware datetimes.
+
+    Day queries filter with `last_updated >= start AND last_updated < end`
+    instead of `DATE(last_updated AT TIME ZONE ...) = date`, so Postgres can
+    use the index and only scans the daily bikes partitions of that day.
+    """
+    day = datetime.date.fromisoformat(str(date))
+    zone = ZoneInfo(timezone)
+    start = datetime.datetime.combine(day, datetime.time(), zone)
+    end = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time(), zone)
+    return start, end
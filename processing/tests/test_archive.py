@@ -0,0 +1,133 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from nextbike_processing import archive as archive_module
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+UTC = datetime.timezone.utc
+BIKE_ROWS = [
+    ("42", 52.5, 13.4, True, "ok", "classic", 7, 70, datetime.datetime(2026, 6, 8, 10, 0, tzinfo=UTC), 467, "Berlin"),
+    ("43", 52.51, 13.41, None, "", None, None, None, datetime.datetime(2026, 6, 8, 10, 1, tzinfo=UTC), 467, "Berlin"),
+]
+
+
+def _connection_cm(cursor):
+    conn = MagicMock(name="conn")
+    conn.cursor.return_value.__enter__.return_value = cursor
+    cm = MagicMock()
+    cm.__enter__.return_value = conn
+    cm.__exit__.return_value = False
+    return cm, conn
+
+
+class TestArchivePath(unittest.TestCase):
+    def test_one_file_per_city_and_day(self):
+        self.assertEqual(
+            archive_module.archive_path(467, "2026-06-08", "/archive"),
+            "/archive/bikes/city_id=467/date=2026-06-08.parquet",
+        )
+
+    def test_bikes_table_of_a_day_that_is_not_archived(self):
+        conn = MagicMock(name="conn")
+        with tempfile.TemporaryDirectory() as archive_dir:
+            table = archive_module.bikes_table_for_day(conn, 467, "2026-06-08", None, None, archive_dir)
+
+        self.assertEqual(table, "public.bikes")
+        conn.cursor.assert_not_called()
+
+    @patch("nextbike_processing.database.BIKE_STORAGE", "normalized")
+    def test_normalized_days_read_bike_snapshots(self):
+        with tempfile.TemporaryDirectory() as archive_dir:
+            table = archive_module.bikes_table_for_day(MagicMock(), 467, "2026-06-08", None, None, archive_dir)
+
+        self.assertIn("FROM public.bike_snapshots s", table)
+        self.assertIn("d.bike_number", table)
+
+
+@unittest.skipIf(pq is None, "pyarrow is not installed")
+@patch("nextbike_processing.archive.get_city_timezone_from_database", return_value="Europe/Berlin")
+class TestArchiveCityDay(unittest.TestCase):
+    def setUp(self):
+        self._archive_dir = tempfile.TemporaryDirectory()
+        self.archive_dir = self._archive_dir.name
+        self.addCleanup(self._archive_dir.cleanup)
+
+    def _archive(self, cursor):
+        cm, conn = _connection_cm(cursor)
+        with patch("nextbike_processing.archive.get_connection", return_value=cm):
+            rows = archive_module.archive_city_day(467, "2026-06-08", self.archive_dir)
+        return rows, conn
+
+    def _cursor(self, raw_rows, deleted):
+        cursor = MagicMock(name="cursor")
+        cursor.fetchone.return_value = (raw_rows,)
+        cursor.fetchmany.side_effect = [BIKE_ROWS, []]
+        cursor.rowcount = deleted
+        return cursor
+
+    def test_moves_the_local_day_to_its_file(self, _):
+        cursor = self._cursor(raw_rows=2, deleted=2)
+
+        rows, conn = self._archive(cursor)
+
+        self.assertEqual(rows, 2)
+        table = pq.read_table(archive_module.archive_path(467, "2026-06-08", self.archive_dir))
+        self.assertEqual(table.column("bike_number").to_pylist(), ["42", "43"])
+        self.assertEqual(table.column("last_updated").to_pylist()[0], BIKE_ROWS[0][8])
+        delete = cursor.execute.call_args_list[-1]
+        self.assertIn("DELETE FROM public.bikes", delete.args[0])
+        self.assertEqual(delete.args[1][1].isoformat(), "2026-06-08T00:00:00+02:00")
+        conn.commit.assert_called_once()
+
+    def test_archiving_again_keeps_the_archived_rows(self, _):
+        self._archive(self._cursor(raw_rows=2, deleted=2))
+
+        rows, _ = self._archive(self._cursor(raw_rows=2, deleted=2))
+
+        self.assertEqual(rows, 2)
+        metadata = pq.read_metadata(archive_module.archive_path(467, "2026-06-08", self.archive_dir))
+        self.assertEqual(metadata.num_rows, 4)
+
+    def test_day_without_rows_writes_no_file(self, _):
+        rows, conn = self._archive(self._cursor(raw_rows=0, deleted=0))
+
+        self.assertEqual(rows, 0)
+        self.assertFalse(archive_module.is_archived(467, "2026-06-08", self.archive_dir))
+        conn.commit.assert_not_called()
+
+    def test_rolls_back_when_the_delete_does_not_match(self, _):
+        with self.assertRaises(RuntimeError):
+            self._archive(self._cursor(raw_rows=2, deleted=3))
+
+        self.assertFalse(archive_module.is_archived(467, "2026-06-08", self.archive_dir))
+        self.assertEqual(os.listdir(os.path.join(self.archive_dir, "bikes", "city_id=467")), [])
+
+    def test_bikes_table_of_an_archived_day(self, _):
+        self._archive(self._cursor(raw_rows=2, deleted=2))
+        cursor = MagicMock(name="cursor")
+        copy = cursor.copy.return_value.__enter__.return_value
+        conn = MagicMock(name="conn")
+        conn.cursor.return_value.__enter__.return_value = cursor
+        day = (datetime.datetime(2026, 6, 8, tzinfo=UTC), datetime.datetime(2026, 6, 9, tzinfo=UTC))
+
+        table = archive_module.bikes_table_for_day(conn, 467, "2026-06-08", *day, self.archive_dir)
+
+        self.assertEqual(table, archive_module.ARCHIVED_BIKES_TABLE)
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertTrue(any("ON COMMIT DROP" in statement for statement in statements))
+        self.assertTrue(any("SELECT bike_number" in statement and "FROM public.bikes" in statement
+                            for statement in statements[2:]))
+        loaded = b"".join(call.args[0] for call in copy.write.call_args_list).decode()
+        self.assertEqual(loaded.splitlines()[0], '"42",52.5,13.4,true,"ok","classic",7,70,2026-06-08 10:00:00.000000Z,467,"Berlin"')
+        self.assertEqual(loaded.splitlines()[1], '"43",52.51,13.41,,"",,,,2026-06-08 10:01:00.000000Z,467,"Berlin"')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from nextbike_processing import compaction as compaction_module
+
+
+class TestCompactBikeIntervals(unittest.TestCase):
+    def _connection_cm(self, raw_rows, intervals=0):
+        cursor = MagicMock(name="cursor")
+        cursor.fetchone.return_value = (raw_rows,)
+        cursor.rowcount = intervals
+        conn = MagicMock(name="conn")
+        conn.cursor.return_value.__enter__.return_value = cursor
+        cm = MagicMock()
+        cm.__enter__.return_value = conn
+        cm.__exit__.return_value = False
+        return cm, conn, cursor
+
+    @patch("nextbike_processing.compaction.get_city_timezone_from_database", return_value="Europe/Berlin")
+    @patch("nextbike_processing.compaction.get_connection")
+    def test_replaces_intervals_of_the_local_day(self, mock_get_connection, _):
+        cm, conn, cursor = self._connection_cm(raw_rows=1000, intervals=40)
+        mock_get_connection.return_value = cm
+
+        result = compaction_module.compact_bike_intervals(467, "2026-06-08")
+
+        self.assertEqual(result, (1000, 40))
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertEqual(len(statements), 3)
+        self.assertIn("DELETE FROM public.bike_intervals", statements[1])
+        self.assertIn("INSERT INTO public.bike_intervals", statements[2])
+        params = cursor.execute.call_args_list[2].args[1]
+        self.assertEqual(params[0], 467)
+        self.assertEqual(params[1].isoformat(), "2026-06-08T00:00:00+02:00")
+        self.assertEqual(params[2].isoformat(), "2026-06-09T00:00:00+02:00")
+        conn.commit.assert_called_once()
+
+    @patch("nextbike_processing.compaction.get_city_timezone_from_database", return_value="UTC")
+    @patch("nextbike_processing.compaction.get_connection")
+    def test_drop_raw_deletes_bike_rows(self, mock_get_connection, _):
+        cm, _, cursor = self._connection_cm(raw_rows=1000, intervals=40)
+        mock_get_connection.return_value = cm
+
+        compaction_module.compact_bike_intervals(467, "2026-06-08", drop_raw=True)
+
+        last_statement = cursor.execute.call_args_list[-1].args[0]
+        self.assertIn("DELETE FROM public.bikes", last_statement)
+
+    @patch("nextbike_processing.compaction.get_city_timezone_from_database", return_value="UTC")
+    @patch("nextbike_processing.compaction.get_connection")
+    def test_keeps_intervals_when_raw_rows_are_gone(self, mock_get_connection, _):
+        cm, conn, cursor = self._connection_cm(raw_rows=0)
+        mock_get_connection.return_value = cm
+
+        result = compaction_module.compact_bike_intervals(467, "2026-06-08")
+
+        self.assertEqual(result, (0, 0))
+        self.assertEqual(cursor.execute.call_count, 1)
+        conn.commit.assert_not_called()
+
+    @patch("nextbike_processing.database.BIKE_STORAGE", "normalized")
+    @patch("nextbike_processing.compaction.get_city_timezone_from_database", return_value="UTC")
+    @patch("nextbike_processing.compaction.get_connection")
+    def test_normalized_storage_reads_bike_snapshots(self, mock_get_connection, _):
+        cm, _, cursor = self._connection_cm(raw_rows=1000, intervals=40)
+        mock_get_connection.return_value = cm
+
+        compaction_module.compact_bike_intervals(467, "2026-06-08", drop_raw=True)
+
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertIn("FROM public.bike_snapshots", statements[0])
+        self.assertIn("JOIN public.bike_dim d ON d.bike_id = s.bike_id", statements[2])
+        self.assertIn("DELETE FROM public.bike_snapshots", statements[3])
+
+    def test_compact_query_splits_runs_on_missing_snapshots(self):
+        self.assertIn("LAG(s.snapshot_index) OVER w = s.snapshot_index - 1", compaction_module.COMPACT_QUERY)
+        for column in compaction_module.INTERVAL_COLUMNS:
+            self.assertIn(f"LAG(b.{column}) OVER w", compaction_module.COMPACT_QUERY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import datetime
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import networkx as nx
+import numpy as np
+
+from nextbike_processing import graph_cache as graph_cache_module
+
+CENTER = (52.5, 13.4)
+
+
+def _graph():
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    G.add_node(30, x=13.40, y=52.50, street_count=3)
+    G.add_node(10, x=13.41, y=52.50)
+    G.add_node(20, x=13.41, y=52.51)
+    G.add_edge(30, 10, length=680.0, name="A")
+    G.add_edge(10, 20, length=1110.0)
+    G.add_edge(10, 20, length=1200.0)
+    G.add_edge(20, 30, length=1300.0)
+    return G
+
+
+def _edges(G):
+    return sorted((u, v, data["length"]) for u, v, data in G.edges(data=True))
+
+
+@patch("nextbike_processing.graph_cache.get_city_coordinates_from_database", return_value=CENTER)
+class TestGraphCache(unittest.TestCase):
+    def setUp(self):
+        self._cache_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self._cache_dir.name
+        self.addCleanup(self._cache_dir.cleanup)
+
+    def _load(self, **kwargs):
+        return graph_cache_module.load_city_graph_cached(467, cache_dir=self.cache_dir, **kwargs)
+
+    def _age_cache_file(self, **metadata):
+        path = graph_cache_module.graph_cache_path(467, cache_dir=self.cache_dir)
+        with np.load(path) as stored:
+            arrays = {name: stored[name] for name in stored.files}
+        arrays["metadata"] = np.array(json.dumps(dict(json.loads(str(arrays["metadata"])), **metadata)))
+        with open(path, "wb") as cache_file:
+            np.savez(cache_file, **arrays)
+
+    @patch("nextbike_processing.graph_cache.ox.graph_from_point")
+    def test_downloads_once_then_reads_the_cache_file(self, mock_graph_from_point, _):
+        mock_graph_from_point.return_value = _graph()
+
+        self._load()
+        cached = self._load()
+
+        mock_graph_from_point.assert_called_once_with(CENTER, dist=10000, network_type="bike")
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, "467_bike_10000m.npz")))
+        self.assertEqual(_edges(cached), _edges(_graph()))
+        self.assertEqual(cached.nodes[20], {"x": 13.41, "y": 52.51})
+        self.assertEqual(cached.graph["crs"], "epsg:4326")
+
+    @patch("nextbike_processing.graph_cache.ox.graph_from_point")
+    def test_arrays_without_a_networkx_graph(self, mock_graph_from_point, _):
+        mock_graph_from_point.return_value = _graph()
+
+        downloaded = self._load(as_arrays=True)
+        with patch("nextbike_processing.graph_cache.arrays_to_graph") as mock_arrays_to_graph:
+            cached = self._load(as_arrays=True)
+
+        mock_arrays_to_graph.assert_not_called()
+        self.assertEqual(cached.keys(), downloaded.keys())
+        self.assertEqual(cached["indices"].tolist(), downloaded["indices"].tolist())
+
+    @patch("nextbike_processing.graph_cache.ox.graph_from_point")
+    def test_expired_file_is_downloaded_again(self, mock_graph_from_point, _):
+        mock_graph_from_point.return_value = _graph()
+        self._load()
+        expired = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=31)
+        self._age_cache_file(created_at=expired.isoformat())
+
+        self._load(ttl_days=30)
+
+        self.assertEqual(mock_graph_from_point.call_count, 2)
+
+    @patch("nextbike_processing.graph_cache.ox.graph_from_point")
+    def test_file_of_another_version_is_rebuilt(self, mock_graph_from_point, _):
+        mock_graph_from_point.return_value = _graph()
+        self._load()
+        self._age_cache_file(version=graph_cache_module.FORMAT_VERSION - 1)
+
+        self._load()
+
+        self.assertEqual(mock_graph_from_point.call_count, 2)
+
+    @patch("nextbike_processing.graph_cache.ox.graph_from_point")
+    def test_expired_file_is_used_when_the_download_fails(self, mock_graph_from_point, _):
+        mock_graph_from_point.return_value = _graph()
+        self._load()
+        self._age_cache_file(created_at="2020-01-01T00:00:00+00:00")
+        mock_graph_from_point.side_effect = ConnectionError("offline")
+
+        with patch("builtins.print"):
+            G = self._load()
+
+        self.assertEqual(_edges(G), _edges(_graph()))
+
+    @patch("nextbike_processing.graph_cache.ox.graph_from_point", side_effect=ConnectionError("offline"))
+    def test_download_error_without_cache_file_is_raised(self, _, __):
+        with self.assertRaises(ConnectionError):
+            self._load()
+
+
+class TestGraphArrays(unittest.TestCase):
+    def test_edges_are_csr_over_node_positions(self):
+        arrays = graph_cache_module.graph_to_arrays(_graph())
+
+        self.assertEqual(arrays["node_ids"].tolist(), [30, 10, 20])
+        self.assertEqual(arrays["indptr"].tolist(), [0, 1, 3, 4])
+        self.assertEqual(arrays["indices"].tolist(), [1, 2, 2, 0])
+        self.assertEqual(arrays["length"].tolist(), [680.0, 1110.0, 1200.0, 1300.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
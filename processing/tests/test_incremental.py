@@ -0,0 +1,157 @@
+import datetime
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+from nextbike_processing import incremental as incremental_module
+
+UTC = datetime.timezone.utc
+SINCE = datetime.datetime(2026, 6, 8, 10, 0, tzinfo=UTC)
+UNTIL = datetime.datetime(2026, 6, 8, 10, 5, tzinfo=UTC)
+
+
+def _connection_cm(cursor):
+    conn = MagicMock(name="conn")
+    conn.cursor.return_value.__enter__.return_value = cursor
+    cm = MagicMock()
+    cm.__enter__.return_value = conn
+    cm.__exit__.return_value = False
+    return cm, conn
+
+
+class TestFetchNewTripData(unittest.TestCase):
+    @patch("nextbike_processing.incremental.pd.read_sql_query")
+    @patch("nextbike_processing.incremental.get_connection")
+    def test_reads_rows_after_the_watermark_with_carried_positions(self, mock_get_connection, mock_read_sql_query):
+        cursor = MagicMock(name="cursor")
+        cursor.fetchone.return_value = (UNTIL + incremental_module.SETTLE_LAG,)
+        mock_get_connection.return_value, _ = _connection_cm(cursor)
+        mock_read_sql_query.return_value = pd.DataFrame([{
+            "bike_number": "42",
+            "start_latitude": 52.5,
+            "start_longitude": 13.4,
+            "start_time": "2026-06-08T09:58:00+00:00",
+            "end_latitude": 52.51,
+            "end_longitude": 13.41,
+            "end_time": "2026-06-08T10:03:00+00:00",
+        }])
+
+        trips, until = incremental_module.fetch_new_trip_data(467, SINCE)
+
+        self.assertEqual(until, UNTIL)
+        query = mock_read_sql_query.call_args.args[0]
+        self.assertIn("FROM public.bikes b", query)
+        self.assertIn("FROM public.trip_bike_positions p", query)
+        params = mock_read_sql_query.call_args.kwargs["params"]
+        self.assertEqual(params, (467, SINCE, UNTIL, 467, SINCE - incremental_module.MAX_CARRY_AGE))
+        self.assertAlmostEqual(trips.iloc[0]["duration"].total_seconds(), 300.0)
+
+    @patch("nextbike_processing.incremental.pd.read_sql_query")
+    @patch("nextbike_processing.incremental.get_connection")
+    def test_no_new_rows(self, mock_get_connection, mock_read_sql_query):
+        cursor = MagicMock(name="cursor")
+        cursor.fetchone.return_value = (None,)
+        mock_get_connection.return_value, _ = _connection_cm(cursor)
+
+        self.assertEqual(incremental_module.fetch_new_trip_data(467, SINCE), (None, None))
+        mock_read_sql_query.assert_not_called()
+
+    @patch("nextbike_processing.incremental.pd.read_sql_query")
+    @patch("nextbike_processing.incremental.get_connection")
+    def test_rows_within_the_settle_lag_wait(self, mock_get_connection, mock_read_sql_query):
+        cursor = MagicMock(name="cursor")
+        cursor.fetchone.return_value = (SINCE + incremental_module.SETTLE_LAG,)
+        mock_get_connection.return_value, _ = _connection_cm(cursor)
+
+        self.assertEqual(incremental_module.fetch_new_trip_data(467, SINCE), (None, None))
+        mock_read_sql_query.assert_not_called()
+
+    @patch("nextbike_processing.incremental.pd.read_sql_query")
+    @patch("nextbike_processing.incremental.get_connection")
+    def test_backdated_delta_row_is_read_by_a_later_run(self, mock_get_connection, mock_read_sql_query):
+        minutes = lambda count: SINCE + datetime.timedelta(minutes=count)
+        cursor = MagicMock(name="cursor")
+        mock_get_connection.return_value, _ = _connection_cm(cursor)
+        mock_read_sql_query.return_value = pd.DataFrame(columns=[
+            "bike_number", "start_latitude", "start_longitude", "start_time",
+            "end_latitude", "end_longitude", "end_time",
+        ])
+
+        # Run after the 10:05 poll: its rows are not settled, the watermark stays
+        cursor.fetchone.return_value = (minutes(5),)
+        self.assertEqual(incremental_module.fetch_new_trip_data(467, SINCE), (None, None))
+
+        # --delta writes a held back sighting of 10:05 with the 10:10 poll,
+        # the next run reads it with the other 10:05 rows
+        cursor.fetchone.return_value = (minutes(20),)
+        _, until = incremental_module.fetch_new_trip_data(467, SINCE)
+
+        params = mock_read_sql_query.call_args.kwargs["params"]
+        self.assertEqual(params[1:3], (SINCE, minutes(10)))
+        self.assertTrue(params[1] < minutes(5) <= params[2])
+        self.assertEqual(until, minutes(10))
+
+
+class TestAdvanceWatermark(unittest.TestCase):
+    @patch("nextbike_processing.incremental.get_connection")
+    def test_moves_watermark_and_carries_positions(self, mock_get_connection):
+        cursor = MagicMock(name="cursor")
+        cursor.rowcount = 1
+        mock_get_connection.return_value, conn = _connection_cm(cursor)
+
+        incremental_module.advance_watermark(467, SINCE, UNTIL)
+
+        update, carry = cursor.execute.call_args_list
+        self.assertEqual(update.args[1], (UNTIL, 467, SINCE))
+        self.assertIn("INSERT INTO public.trip_bike_positions", carry.args[0])
+        self.assertIn("DISTINCT ON (b.bike_number)", carry.args[0])
+        self.assertEqual(carry.args[1], (467, SINCE, UNTIL))
+        conn.commit.assert_called_once()
+
+    @patch("nextbike_processing.incremental.get_connection")
+    def test_watermark_moved_by_another_run(self, mock_get_connection):
+        cursor = MagicMock(name="cursor")
+        cursor.rowcount = 0
+        mock_get_connection.return_value, conn = _connection_cm(cursor)
+
+        with self.assertRaises(RuntimeError):
+            incremental_module.advance_watermark(467, SINCE, UNTIL)
+
+        self.assertEqual(cursor.execute.call_count, 1)
+        conn.rollback.assert_called_once()
+        conn.commit.assert_not_called()
+
+
+@patch("nextbike_processing.incremental.advance_watermark")
+@patch("nextbike_processing.incremental.route_and_save_trips")
+@patch("nextbike_processing.incremental.get_watermark", return_value=SINCE)
+class TestProcessIncrementalTrips(unittest.TestCase):
+    @patch("nextbike_processing.incremental.fetch_new_trip_data")
+    def test_saves_trips_before_moving_the_watermark(self, mock_fetch, _, mock_route, mock_advance):
+        trips = pd.DataFrame([{"bike_number": "42"}])
+        mock_fetch.return_value = (trips, UNTIL)
+        graphs = {}
+
+        self.assertEqual(incremental_module.process_incremental_trips(467, graphs), 1)
+
+        mock_route.assert_called_once_with(467, trips, graphs, None)
+        mock_advance.assert_called_once_with(467, SINCE, UNTIL)
+
+    @patch("nextbike_processing.incremental.fetch_new_trip_data", return_value=(pd.DataFrame(), UNTIL))
+    def test_rows_without_movements_move_the_watermark(self, _, __, mock_route, mock_advance):
+        self.assertEqual(incremental_module.process_incremental_trips(467), 0)
+
+        mock_route.assert_not_called()
+        mock_advance.assert_called_once_with(467, SINCE, UNTIL)
+
+    @patch("nextbike_processing.incremental.fetch_new_trip_data", return_value=(None, None))
+    def test_nothing_new_keeps_the_watermark(self, _, __, mock_route, mock_advance):
+        self.assertEqual(incremental_module.process_incremental_trips(467), 0)
+
+        mock_route.assert_not_called()
+        mock_advance.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
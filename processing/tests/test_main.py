@@ -0,0 +1,91 @@
+import datetime
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from nextbike_processing import main as main_module
+
+
+class TestDateRange(unittest.TestCase):
+    def test_includes_both_ends(self):
+        dates = main_module.date_range(datetime.date(2026, 5, 30), datetime.date(2026, 6, 1))
+
+        self.assertEqual([str(date) for date in dates], ["2026-05-30", "2026-05-31", "2026-06-01"])
+
+    def test_chunks_keep_dates_contiguous(self):
+        dates = main_module.date_range(datetime.date(2026, 6, 1), datetime.date(2026, 6, 7))
+
+        chunks = main_module._chunks(dates, 3)
+
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        self.assertEqual([date for chunk in chunks for date in chunk], dates)
+
+
+@patch("nextbike_processing.main.close_connection_pool")
+@patch("nextbike_processing.main.open_connection_pool")
+class TestProcessBackfill(unittest.TestCase):
+    def _args(self):
+        return SimpleNamespace(source=None, compact=False, drop_raw=False, export_folder=None, export_files=False)
+
+    @patch("nextbike_processing.main.process_day")
+    def test_processes_every_city_day_on_pooled_connections(self, mock_process_day, mock_open, mock_close):
+        dates = main_module.date_range(datetime.date(2026, 6, 1), datetime.date(2026, 6, 2))
+
+        failed = main_module.process_backfill([467, 210], dates, self._args())
+
+        self.assertEqual(failed, [])
+        self.assertEqual(
+            [call.args[:2] for call in mock_process_day.call_args_list],
+            [(467, dates[0]), (467, dates[1]), (210, dates[0]), (210, dates[1])],
+        )
+        mock_open.assert_called_once()
+        mock_close.assert_called_once()
+
+    @patch("nextbike_processing.main.process_day", side_effect=[RuntimeError("no graph"), None])
+    def test_failed_day_does_not_stop_the_others(self, mock_process_day, _, __):
+        dates = main_module.date_range(datetime.date(2026, 6, 1), datetime.date(2026, 6, 2))
+
+        failed = main_module.process_backfill([467], dates, self._args())
+
+        self.assertEqual(mock_process_day.call_count, 2)
+        self.assertEqual(failed, [(467, dates[0], "RuntimeError('no graph')")])
+
+
+class TestMainArguments(unittest.TestCase):
+    def _main(self, *argv):
+        with patch("sys.argv", ["main", *argv]):
+            main_module.main()
+
+    @patch("nextbike_processing.main.process_backfill", return_value=[])
+    def test_date_range_runs_a_backfill(self, mock_backfill):
+        self._main("--city-id", "467", "210", "--start-date", "2026-06-01", "--end-date", "2026-06-03", "--workers", "4")
+
+        city_ids, dates, _ = mock_backfill.call_args.args
+        self.assertEqual(city_ids, [467, 210])
+        self.assertEqual(len(dates), 3)
+        self.assertEqual(mock_backfill.call_args.kwargs["workers"], 4)
+
+    @patch("nextbike_processing.main.process_day")
+    def test_single_day_runs_in_place(self, mock_process_day):
+        self._main("--city-id", "467", "--date", "2026-06-01")
+
+        self.assertEqual(mock_process_day.call_args.args[:2], (467, datetime.date(2026, 6, 1)))
+
+    def test_date_and_range_are_exclusive(self):
+        with patch("sys.stderr"), self.assertRaises(SystemExit):
+            self._main("--city-id", "467", "--date", "2026-06-01", "--start-date", "2026-06-01")
+
+    def test_reversed_range_is_rejected(self):
+        with patch("sys.stderr"), self.assertRaises(SystemExit):
+            self._main("--city-id", "467", "--start-date", "2026-06-03", "--end-date", "2026-06-01")
+
+    @patch("nextbike_processing.main.process_backfill", return_value=[(467, datetime.date(2026, 6, 1), "boom")])
+    def test_failed_days_exit_with_an_error(self, _):
+        with self.assertRaises(SystemExit) as raised:
+            self._main("--city-id", "467", "--start-date", "2026-06-01", "--end-date", "2026-06-02")
+
+        self.assertIn("1 of 2 days failed", str(raised.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+from unittest.mock import patch
+
+import networkx as nx
+import osmnx as ox
+
+from nextbike_processing import trips as trips_module
+from nextbike_processing.graph_cache import graph_to_arrays
+from nextbike_processing.routing_csr import CSRGraph
+
+
+def _random_graph():
+    G = nx.MultiDiGraph(nx.gnp_random_graph(150, 0.04, seed=3, directed=True), crs="epsg:4326")
+    for node in G.nodes:
+        G.nodes[node].update(x=13.4 + node % 12 / 1000, y=52.5 + node // 12 / 1000)
+    for u, v, key in G.edges(keys=True):
+        # At least the straight line distance, like street lengths
+        G.edges[u, v, key]["length"] = 2000.0 + (u * 31 + v * 17) % 97
+    G.add_edge(0, 1, length=5.0)
+    return G
+
+
+class TestCSRGraph(unittest.TestCase):
+    def setUp(self):
+        self.G = _random_graph()
+        self.csr = CSRGraph.from_graph(self.G)
+
+    def test_one_to_many_matches_networkx(self):
+        routes = self.csr.shortest_paths_from(0, list(self.G.nodes))
+
+        expected = nx.single_source_dijkstra_path_length(self.G, 0, weight="length")
+        self.assertEqual(routes.keys(), expected.keys())
+        for target, (distance, segments) in routes.items():
+            self.assertAlmostEqual(distance, expected[target])
+            self.assertEqual(segments[0], [52.5, 13.4])
+            self.assertEqual(segments[-1], [self.G.nodes[target]["y"], self.G.nodes[target]["x"]])
+
+    def test_a_star_matches_networkx(self):
+        for target in self.G.nodes:
+            distance, segments = self.csr.shortest_path(7, target)
+            if nx.has_path(self.G, 7, target):
+                self.assertAlmostEqual(distance, nx.shortest_path_length(self.G, 7, target, weight="length"))
+                self.assertEqual(segments[-1], [self.G.nodes[target]["y"], self.G.nodes[target]["x"]])
+            else:
+                self.assertEqual((distance, segments), (None, []))
+
+    def test_parallel_edges_use_the_shortest(self):
+        self.assertEqual(self.csr.shortest_path(0, 1), (5.0, [[52.5, 13.4], [52.5, 13.401]]))
+        self.assertEqual(self.csr.number_of_edges(), len(set(self.G.edges())))
+
+    def test_unknown_nodes(self):
+        self.assertEqual(self.csr.positions([3, 999]).tolist()[1], -1)
+        self.assertEqual(self.csr.shortest_path(0, 999), (None, []))
+        self.assertEqual(self.csr.shortest_paths_from(999, [0]), {})
+
+    def test_nearest_nodes_match_osmnx(self):
+        lats, lons = [52.5004, 52.5101, 52.49], [13.4052, 13.4111, 13.39]
+
+        nodes, distances = self.csr.nearest_nodes(lats, lons)
+
+        expected_nodes, expected_distances = ox.distance.nearest_nodes(self.G, X=lons, Y=lats, return_dist=True)
+        self.assertEqual(nodes.tolist(), expected_nodes.tolist())
+        for distance, expected in zip(distances.tolist(), expected_distances.tolist()):
+            self.assertAlmostEqual(distance, expected, places=3)
+
+    def test_calculate_shortest_path_contract(self):
+        expected = trips_module.calculate_shortest_path(self.G, 52.5, 13.4, 52.508, 13.409)
+
+        distance, segments = trips_module.calculate_shortest_path(self.csr, 52.5, 13.4, 52.508, 13.409)
+
+        self.assertAlmostEqual(distance, expected[0])
+        self.assertEqual(segments[0], expected[1][0])
+        self.assertEqual(segments[-1], expected[1][-1])
+
+
+class TestLoadCityGraphBackend(unittest.TestCase):
+    @patch("nextbike_processing.trips.ROUTING_BACKEND", "csr")
+    @patch("nextbike_processing.trips.load_city_graph_cached")
+    def test_csr_backend_reads_the_cached_arrays(self, mock_load_cached):
+        mock_load_cached.return_value = graph_to_arrays(_random_graph())
+
+        G = trips_module.load_city_graph(467)
+
+        mock_load_cached.assert_called_once_with(467, as_arrays=True)
+        self.assertIsInstance(G, CSRGraph)
+        self.assertEqual(G.number_of_nodes(), 150)
+
+
+if __name__ == "__main__":
+    unittest.main()
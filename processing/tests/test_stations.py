@@ -0,0 +1,72 @@
+import datetime
+import unittest
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+from nextbike_processing import stations as stations_module
+
+UTC = datetime.timezone.utc
+
+
+def _connection_cm(fetchone_values):
+    cursor = MagicMock(name="cursor")
+    cursor.fetchone.side_effect = fetchone_values
+    conn = MagicMock(name="conn")
+    conn.cursor.return_value.__enter__.return_value = cursor
+    cm = MagicMock()
+    cm.__enter__.return_value = conn
+    cm.__exit__.return_value = False
+    return cm
+
+
+class TestFetchStationData(unittest.TestCase):
+    def _fetch(self, mock_get_connection, mock_read_sql_query, fetchone_values, **kwargs):
+        mock_get_connection.return_value = _connection_cm(fetchone_values)
+        mock_read_sql_query.return_value = pd.DataFrame(columns=["minute", "bike_count", "bike_list"])
+        stations_module.fetch_station_data(467, "2026-06-08", **kwargs)
+        return mock_read_sql_query.call_args.args[0], mock_read_sql_query.call_args.kwargs["params"]
+
+    @patch("nextbike_processing.stations.pd.read_sql_query")
+    @patch("nextbike_processing.stations.get_connection")
+    def test_day_covered_by_occupancy_reads_station_occupancy(self, mock_get_connection, mock_read_sql_query):
+        query, params = self._fetch(
+            mock_get_connection,
+            mock_read_sql_query,
+            [("Europe/Berlin",), (True,), (True,)],
+        )
+
+        self.assertIn("FROM public.station_occupancy", query)
+        self.assertNotIn("CROSS JOIN", query)
+        self.assertEqual(len(params), 7)
+        self.assertEqual(params[5].isoformat(), "2026-06-08T00:00:00+02:00")
+
+    @patch("nextbike_processing.stations.pd.read_sql_query")
+    @patch("nextbike_processing.stations.get_connection")
+    def test_day_not_covered_by_occupancy_rebuilds_from_bikes(self, mock_get_connection, mock_read_sql_query):
+        query, _ = self._fetch(mock_get_connection, mock_read_sql_query, [("Europe/Berlin",), (True,), (False,)])
+
+        self.assertIn("FROM\n                public.bikes b", query)
+        cursor = mock_get_connection.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+        coverage_sql, (city_id, day_start, day_end) = cursor.execute.call_args.args
+        self.assertIn("public.station_occupancy_covers_day(", coverage_sql)
+        self.assertEqual((day_start.isoformat(), day_end.isoformat()), ("2026-06-08T00:00:00+02:00", "2026-06-09T00:00:00+02:00"))
+
+    @patch("nextbike_processing.stations.pd.read_sql_query")
+    @patch("nextbike_processing.stations.get_connection")
+    def test_without_occupancy_table_rebuilds_from_bikes(self, mock_get_connection, mock_read_sql_query):
+        query, _ = self._fetch(mock_get_connection, mock_read_sql_query, [("Europe/Berlin",), (False,)])
+
+        self.assertIn("FROM\n                public.bikes b", query)
+        self.assertNotIn("station_occupancy", query)
+
+    @patch("nextbike_processing.stations.pd.read_sql_query")
+    @patch("nextbike_processing.stations.get_connection")
+    def test_explicit_source_skips_the_occupancy_check(self, mock_get_connection, mock_read_sql_query):
+        query, _ = self._fetch(mock_get_connection, mock_read_sql_query, [("Europe/Berlin",)], source="intervals")
+
+        self.assertIn("FROM public.bike_intervals", query)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@ import unittest
 from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
+import networkx as nx
 import pandas as pd
 
 from nextbike_processing import trips as trips_module
@@ -18,9 +19,10 @@ class TestCityIsoFormatting(unittest.TestCase):
 
 
 class TestFetchTripData(unittest.TestCase):
+    @patch("nextbike_processing.trips.get_city_timezone_from_database", return_value="Europe/Berlin")
     @patch("nextbike_processing.trips.pd.read_sql_query")
     @patch("nextbike_processing.trips.get_connection")
-    def test_fetch_trip_data_uses_city_timezone_date_filter(self, mock_get_connection, mock_read_sql_query):
+    def test_fetch_trip_data_uses_city_timezone_date_filter(self, mock_get_connection, mock_read_sql_query, _):
         mock_conn_cm = MagicMock()
         mock_conn_cm.__enter__.return_value = MagicMock()
         mock_conn_cm.__exit__.return_value = False
@@ -44,30 +46,78 @@ class TestFetchTripData(unittest.TestCase):
 
         query = mock_read_sql_query.call_args.args[0]
         params = mock_read_sql_query.call_args.kwargs["params"]
-        self.assertIn("DATE(b.last_updated AT TIME ZONE c.timezone)", query)
-        self.assertEqual(params, (467, "2026-06-08"))
+        self.assertIn("b.last_updated >= %s", query)
+        self.assertIn("b.last_updated < %s", query)
+        self.assertEqual(params[0], 467)
+        self.assertEqual(params[1].isoformat(), "2026-06-08T00:00:00+02:00")
+        self.assertEqual(params[2].isoformat(), "2026-06-09T00:00:00+02:00")
         self.assertAlmostEqual(df.iloc[0]["duration"].total_seconds(), 300.0)
 
 
+    @patch("nextbike_processing.trips.get_city_timezone_from_database", return_value="Europe/Berlin")
+    @patch("nextbike_processing.trips.pd.read_sql_query")
+    @patch("nextbike_processing.trips.get_connection")
+    def test_fetch_trip_data_reads_bike_intervals(self, mock_get_connection, mock_read_sql_query, _):
+        mock_conn_cm = MagicMock()
+        mock_conn_cm.__enter__.return_value = MagicMock()
+        mock_conn_cm.__exit__.return_value = False
+        mock_get_connection.return_value = mock_conn_cm
+        mock_read_sql_query.return_value = pd.DataFrame(
+            columns=["bike_number", "start_latitude", "start_longitude", "start_time",
+                     "end_latitude", "end_longitude", "end_time"]
+        )
+
+        trips_module.fetch_trip_data(467, "2026-06-08", source="intervals")
+
+        query = mock_read_sql_query.call_args.args[0]
+        params = mock_read_sql_query.call_args.kwargs["params"]
+        self.assertIn("FROM public.bike_intervals", query)
+        self.assertIn("valid_to AS start_time", query)
+        self.assertNotIn("public.bikes ", query)
+        self.assertEqual(params[1].isoformat(), "2026-06-08T00:00:00+02:00")
+
+    @patch("nextbike_processing.trips.bikes_table_for_day", return_value="pg_temp.archived_bikes")
+    @patch("nextbike_processing.trips.get_city_timezone_from_database", return_value="Europe/Berlin")
+    @patch("nextbike_processing.trips.pd.read_sql_query")
+    @patch("nextbike_processing.trips.get_connection")
+    def test_fetch_trip_data_reads_archived_day(self, mock_get_connection, mock_read_sql_query, _, mock_bikes_table):
+        mock_conn = MagicMock()
+        mock_conn_cm = MagicMock()
+        mock_conn_cm.__enter__.return_value = mock_conn
+        mock_conn_cm.__exit__.return_value = False
+        mock_get_connection.return_value = mock_conn_cm
+        mock_read_sql_query.return_value = pd.DataFrame(
+            columns=["bike_number", "start_latitude", "start_longitude", "start_time",
+                     "end_latitude", "end_longitude", "end_time"]
+        )
+
+        trips_module.fetch_trip_data(467, "2026-06-08")
+
+        query = mock_read_sql_query.call_args.args[0]
+        self.assertIn("FROM pg_temp.archived_bikes b", query)
+        self.assertNotIn("public.bikes", query)
+        self.assertEqual(mock_bikes_table.call_args.args[:3], (mock_conn, 467, "2026-06-08"))
+
+
+def _street_graph():
+    G = nx.MultiDiGraph(crs="epsg:4326")
+    G.add_node(1, x=13.400, y=52.500)
+    G.add_node(2, x=13.410, y=52.500)
+    G.add_node(3, x=13.410, y=52.510)
+    G.add_edge(1, 2, length=680.0)
+    G.add_edge(2, 3, length=1110.0)
+    return G
+
+
 class TestCalculateShortestPath(unittest.TestCase):
-    @patch("nextbike_processing.trips.nx.shortest_path")
-    @patch("nextbike_processing.trips.nx.shortest_path_length")
     @patch("nextbike_processing.trips.ox.distance.nearest_nodes")
-    def test_returns_distance_and_segments(self, mock_nearest_nodes, mock_shortest_path_length, mock_shortest_path):
-        graph = SimpleNamespace(
-            nodes={
-                1: {"y": 52.0, "x": 13.0},
-                2: {"y": 52.1, "x": 13.1},
-            }
-        )
-        mock_nearest_nodes.side_effect = [1, 2]
-        mock_shortest_path_length.return_value = 1000.0
-        mock_shortest_path.return_value = [1, 2]
+    def test_returns_distance_and_segments(self, mock_nearest_nodes):
+        mock_nearest_nodes.side_effect = [1, 3]
 
-        distance, segments = trips_module.calculate_shortest_path(graph, 52.0, 13.0, 52.1, 13.1)
+        distance, segments = trips_module.calculate_shortest_path(_street_graph(), 52.5, 13.4, 52.51, 13.41)
 
-        self.assertEqual(distance, 1000.0)
-        self.assertEqual(segments, [[52.0, 13.0], [52.1, 13.1]])
+        self.assertEqual(distance, 1790.0)
+        self.assertEqual(segments, [[52.5, 13.4], [52.5, 13.41], [52.51, 13.41]])
 
     @patch("nextbike_processing.trips.ox.distance.nearest_nodes")
     def test_returns_none_and_empty_when_node_not_in_graph(self, mock_nearest_nodes):
@@ -79,23 +129,101 @@ class TestCalculateShortestPath(unittest.TestCase):
         self.assertIsNone(distance)
         self.assertEqual(segments, [])
 
-    @patch("nextbike_processing.trips.nx.shortest_path_length")
     @patch("nextbike_processing.trips.ox.distance.nearest_nodes")
-    def test_returns_none_and_empty_on_no_path(self, mock_nearest_nodes, mock_shortest_path_length):
-        graph = SimpleNamespace(
-            nodes={
-                1: {"y": 52.0, "x": 13.0},
-                2: {"y": 52.1, "x": 13.1},
-            }
-        )
-        mock_nearest_nodes.side_effect = [1, 2]
-        mock_shortest_path_length.side_effect = trips_module.nx.NetworkXNoPath
+    def test_returns_none_and_empty_on_no_path(self, mock_nearest_nodes):
+        mock_nearest_nodes.side_effect = [3, 1]
 
-        distance, segments = trips_module.calculate_shortest_path(graph, 52.0, 13.0, 52.1, 13.1)
+        distance, segments = trips_module.calculate_shortest_path(_street_graph(), 52.51, 13.41, 52.5, 13.4)
 
         self.assertIsNone(distance)
         self.assertEqual(segments, [])
 
+    @patch("nextbike_processing.trips.ox.distance.nearest_nodes")
+    def test_uses_snapped_nodes(self, mock_nearest_nodes):
+        snapped = {(52.5, 13.4): (1, 3.0), (52.51, 13.41): (3, 5.0)}
+
+        distance, _ = trips_module.calculate_shortest_path(_street_graph(), 52.5, 13.4, 52.51, 13.41, snapped=snapped)
+
+        mock_nearest_nodes.assert_not_called()
+        self.assertEqual(distance, 1790.0)
+
+
+class TestShortestPathsFrom(unittest.TestCase):
+    def test_routes_every_target_of_an_origin(self):
+        G = _street_graph()
+        G.add_edge(1, 2, length=600.0)
+        G.add_node(4, x=13.42, y=52.52)
+
+        routes = trips_module.shortest_paths_from(G, 1, [2, 3, 4])
+
+        self.assertEqual(routes[2], (600.0, [[52.5, 13.4], [52.5, 13.41]]))
+        self.assertEqual(routes[3][0], 1710.0)
+        self.assertNotIn(4, routes)
+
+    def test_distances_match_networkx(self):
+        G = nx.MultiDiGraph(nx.gnp_random_graph(200, 0.03, seed=7, directed=True))
+        for u, v, key in G.edges(keys=True):
+            G.edges[u, v, key]["length"] = float((u * 31 + v * 17) % 97 + 1)
+        for node in G.nodes:
+            G.nodes[node].update(x=float(node), y=52.0)
+
+        routes = trips_module.shortest_paths_from(G, 0, range(200))
+
+        expected = nx.single_source_dijkstra_path_length(G, 0, weight="length")
+        self.assertEqual({target: distance for target, (distance, _) in routes.items()}, expected)
+        for distance, segments in routes.values():
+            path = [int(lon) for _, lon in segments]
+            self.assertEqual(nx.path_weight(G, path, "length"), distance)
+
+
+class TestRouteFromOrigins(unittest.TestCase):
+    def test_workers_return_the_routes_in_origin_order(self):
+        G = nx.MultiDiGraph(nx.grid_2d_graph(8, 8).to_directed())
+        G = nx.relabel_nodes(G, {node: node[0] * 8 + node[1] for node in G.nodes})
+        for node in G.nodes:
+            G.nodes[node].update(x=13.4 + node % 8 / 1000, y=52.5 + node // 8 / 1000)
+        nx.set_edge_attributes(G, 70.0, "length")
+        destinations = {origin: {63 - origin, 7} for origin in (5, 0, 33, 12, 50, 21, 9)}
+
+        serial = trips_module.route_from_origins(G, destinations)
+        parallel = trips_module.route_from_origins(G, destinations, workers=2)
+
+        self.assertEqual(list(parallel), [5, 0, 33, 12, 50, 21, 9])
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel[0][63][0], 14 * 70.0)
+        self.assertIsNone(trips_module._routing_graph)
+
+
+class TestSnapPoints(unittest.TestCase):
+    def test_snaps_unique_endpoints_with_distances(self):
+        pairs = pd.DataFrame(
+            [(52.5001, 13.4, 52.51, 13.41), (52.51, 13.41, 52.5001, 13.4)],
+            columns=trips_module.ROUTE_KEY_COLUMNS,
+        )
+
+        points = trips_module.route_endpoints(pairs)
+        snapped = trips_module.snap_points(_street_graph(), points)
+
+        self.assertEqual(points, [(52.5001, 13.4), (52.51, 13.41)])
+        self.assertEqual(snapped[(52.5001, 13.4)][0], 1)
+        self.assertAlmostEqual(snapped[(52.5001, 13.4)][1], 11.1, places=1)
+        self.assertEqual(snapped[(52.51, 13.41)], (3, 0.0))
+
+    def test_no_points(self):
+        self.assertEqual(trips_module.snap_points(_street_graph(), []), {})
+
+
+class TestLoadCityGraph(unittest.TestCase):
+    @patch("nextbike_processing.trips.load_city_graph_cached")
+    def test_graph_is_loaded_once_per_city(self, mock_load_cached):
+        graphs = {}
+
+        first = trips_module.load_city_graph(467, graphs)
+        second = trips_module.load_city_graph(467, graphs)
+
+        self.assertIs(first, second)
+        mock_load_cached.assert_called_once_with(467)
+
 
 class TestProcessAndSaveTrips(unittest.TestCase):
     def _connection_cm(self):
@@ -186,6 +314,60 @@ class TestProcessAndSaveTrips(unittest.TestCase):
         inserted_df = mock_insert_trips.call_args.args[0]
         self.assertAlmostEqual(inserted_df.iloc[0]["duration"], 300.0)
 
+    @patch("nextbike_processing.trips.insert_trips")
+    @patch("nextbike_processing.trips.get_uncached_route_pairs")
+    @patch("nextbike_processing.trips.get_cached_routes")
+    @patch("nextbike_processing.trips.get_connection")
+    def test_remembered_routes_are_not_looked_up_again(
+        self,
+        mock_get_connection,
+        mock_get_cached_routes,
+        mock_get_uncached_route_pairs,
+        mock_insert_trips,
+    ):
+        mock_get_connection.return_value = self._connection_cm()
+        mock_get_cached_routes.side_effect = lambda pairs, conn: self._sample_cached_routes().iloc[:len(pairs)]
+        mock_get_uncached_route_pairs.side_effect = lambda pairs, conn: pairs.iloc[:0]
+        routes = {}
+
+        trips_module.route_and_save_trips(467, self._sample_trip_rows(), routes=routes)
+        saved = trips_module.route_and_save_trips(467, self._sample_trip_rows(), routes=routes)
+
+        self.assertEqual(routes, {(52.5, 13.4, 52.51, 13.41): (1200.0, [[52.5, 13.4], [52.51, 13.41]])})
+        self.assertTrue(mock_get_cached_routes.call_args.args[0].empty)
+        self.assertEqual(saved.iloc[0]["distance"], 1200.0)
+        self.assertEqual(mock_insert_trips.call_count, 2)
+
+    @patch("nextbike_processing.trips.insert_new_routes")
+    @patch("nextbike_processing.trips.insert_trips")
+    @patch("nextbike_processing.trips.load_city_graph", return_value=_street_graph())
+    @patch("nextbike_processing.trips.get_uncached_route_pairs")
+    @patch("nextbike_processing.trips.get_cached_routes")
+    @patch("nextbike_processing.trips.get_connection")
+    def test_endpoints_off_the_street_graph_are_not_routed(
+        self,
+        mock_get_connection,
+        mock_get_cached_routes,
+        mock_get_uncached_route_pairs,
+        _,
+        __,
+        mock_insert_new_routes,
+    ):
+        trips = self._sample_trip_rows()
+        trips.loc[1] = trips.loc[0]
+        trips.loc[0, ["start_latitude", "start_longitude", "end_latitude", "end_longitude"]] = [52.5, 13.4, 52.51, 13.41]
+        trips.loc[1, ["start_latitude", "start_longitude", "end_latitude", "end_longitude"]] = [52.5, 13.4, 52.6, 13.41]
+        mock_get_connection.return_value = self._connection_cm()
+        mock_get_cached_routes.side_effect = lambda pairs, conn: self._sample_cached_routes().iloc[:0]
+        mock_get_uncached_route_pairs.side_effect = lambda pairs, conn: pairs
+
+        with patch("builtins.print"):
+            trips_module.route_and_save_trips(467, trips)
+
+        new_routes = mock_insert_new_routes.call_args.args[0]
+        self.assertEqual(new_routes[trips_module.ROUTE_KEY_COLUMNS].values.tolist(), [[52.5, 13.4, 52.51, 13.41]])
+        self.assertEqual(new_routes.iloc[0]["segments"], [[52.5, 13.4], [52.5, 13.41], [52.51, 13.41]])
+
     @patch("nextbike_processing.trips.save_gzipped_csv")
     @patch("nextbike_processing.trips.save_gzipped_geojson")
     @patch("nextbike_processing.trips.get_city_timezone_from_database")
@@ -4,7 +4,7 @@ import os
 import tempfile
 import unittest
 
-from nextbike_processing.utils import ensure_directory_exists, save_gzipped_geojson
+from nextbike_processing.utils import ensure_directory_exists, local_day_bounds, save_gzipped_geojson
 
 
 class TestSaveGzippedGeojson(unittest.TestCase):
@@ -86,5 +86,17 @@ class TestEnsureDirectoryExists(unittest.TestCase):
                 self.fail(f"ensure_directory_exists raised unexpectedly: {e}")
 
 
+class TestLocalDayBounds(unittest.TestCase):
+    def test_bounds_are_local_midnights(self):
+        start, end = local_day_bounds("2026-06-08", "Europe/Berlin")
+        self.assertEqual(start.isoformat(), "2026-06-08T00:00:00+02:00")
+        self.assertEqual(end.isoformat(), "2026-06-09T00:00:00+02:00")
+
+    def test_daylight_saving_day_has_23_hours(self):
+        start, end = local_day_bounds("2026-03-29", "Europe/Berlin")
+        self.assertEqual(start.isoformat(), "2026-03-29T00:00:00+01:00")
+        self.assertEqual(end.isoformat(), "2026-03-30T00:00:00+02:00")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,3 +1,4 @@
+import datetime
 import os
 from zoneinfo import ZoneInfo
 
@@ -16,6 +17,125 @@ def to_city_iso(timestamp, city_timezone):
     return timestamp.astimezone(city_zone).isoformat(timespec="seconds")
 
 
+def local_day_bounds(date, city_timezone):
+    """Start of `date` and of the next day in the city's timezone, for range filters on timestamptz columns"""
+    day = datetime.date.fromisoformat(str(date))
+    city_zone = ZoneInfo(city_timezone)
+    start = datetime.datetime.combine(day, datetime.time(), city_zone)
+    end = datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time(), city_zone)
+    return start, end
+
+
+def station_occupancy_covers_day(cur, city_id, day_start, day_end):
+    """
+    True if the collector wrote public.station_occupancy of the city for the
+    whole day, checked by the SQL function of the same name. False on
+    databases without it (collection/007_station_occupancy_coverage_migration.sql).
+    """
+    cur.execute(
+        "SELECT to_regprocedure('public.station_occupancy_covers_day(integer, timestamptz, timestamptz)') IS NOT NULL"
+    )
+    if not cur.fetchone()[0]:
+        return False
+    cur.execute("SELECT public.station_occupancy_covers_day(%s, %s, %s)", (city_id, day_start, day_end))
+    return cur.fetchone()[0]
+
+
+STATIONS_OF_DAY_SQL = """
+                WITH station_data AS (
+                    SELECT id, uid, latitude, longitude, name, spot, station_number,
+                           maintenance, terminal_type, city_id, city_name,
+                           ROW_NUMBER() OVER (
+                               PARTITION BY uid, latitude, longitude, name, spot,
+                                            station_number, terminal_type, DATE(last_updated AT TIME ZONE %s), maintenance
+                               ORDER BY last_updated DESC
+                           ) AS rn
+                    FROM public.stations
+                    WHERE city_id = %s AND last_updated >= %s AND last_updated < %s
+                ),
+                filtered_stations AS (
+                    SELECT id, uid, latitude, longitude, name, spot, station_number,
+                           maintenance, terminal_type, city_id, city_name
+                    FROM station_data WHERE rn = 1
+                ),
+"""
+
+# Changes written by the collector, LAG drops the repeated counts of a collector restart
+OCCUPANCY_CHANGES_SQL = STATIONS_OF_DAY_SQL + """
+                occupancy_changes AS (
+                    SELECT DATE_TRUNC('minute', last_updated AT TIME ZONE %s) AS minute,
+                           station_number, bike_count, bike_list,
+                           LAG(bike_count) OVER (PARTITION BY station_number ORDER BY last_updated) AS previous_bike_count
+                    FROM public.station_occupancy
+                    WHERE city_id = %s AND last_updated >= %s AND last_updated < %s
+                )
+                SELECT oc.minute, fs.id, fs.uid, fs.latitude, fs.longitude, fs.name, fs.spot, fs.station_number,
+                       fs.maintenance, fs.terminal_type, fs.city_id, fs.city_name, oc.bike_count, oc.bike_list
+                FROM occupancy_changes oc
+                JOIN filtered_stations fs ON fs.station_number = oc.station_number
+                WHERE oc.bike_count IS DISTINCT FROM oc.previous_bike_count
+                ORDER BY fs.station_number, oc.minute
+"""
+
+# Raw bike rows per DB_BIKE_STORAGE, the normalized rows keep the bike numbers in public.bike_dim
+RAW_BIKES_SOURCES = {
+    "wide": "public.bikes",
+    "normalized": """(
+                        SELECT s.city_id, s.station_number, s.last_updated, d.bike_number
+                        FROM public.bike_snapshots s
+                        JOIN public.bike_dim d ON d.bike_id = s.bike_id
+                    ) AS raw_bikes""",
+}
+BIKE_STORAGE = os.getenv("DB_BIKE_STORAGE", "wide").lower()
+
+# Rebuilds the changes from the raw bikes, for days without station_occupancy
+RAW_CHANGES_SQL = STATIONS_OF_DAY_SQL + """
+                bike_source AS (
+                    SELECT (last_updated AT TIME ZONE %s) AS local_ts,
+                           station_number,
+                           bike_number
+                    FROM {raw_bikes}
+                    WHERE city_id = %s AND last_updated >= %s AND last_updated < %s
+                ),
+                bike_data AS (
+                    SELECT DATE_TRUNC('minute', local_ts) AS minute,
+                           station_number,
+                           COUNT(bike_number) AS bike_count,
+                           STRING_AGG(bike_number::TEXT, ', ') AS bike_list
+                    FROM bike_source
+                    GROUP BY DATE_TRUNC('minute', local_ts), station_number
+                ),
+                distinct_minutes AS (
+                    SELECT DISTINCT DATE_TRUNC('minute', local_ts) AS minute
+                    FROM bike_source
+                ),
+                station_minute_combinations AS (
+                    SELECT dm.minute, fs.*
+                    FROM distinct_minutes dm CROSS JOIN filtered_stations fs
+                ),
+                station_bike_combined AS (
+                    SELECT smc.minute, smc.id, smc.uid, smc.latitude, smc.longitude,
+                           smc.name, smc.spot, smc.station_number, smc.maintenance,
+                           smc.terminal_type, smc.city_id, smc.city_name,
+                           COALESCE(bd.bike_count, 0) AS bike_count,
+                           COALESCE(bd.bike_list, '') AS bike_list
+                    FROM station_minute_combinations smc
+                    LEFT JOIN bike_data bd
+                        ON smc.station_number = bd.station_number AND smc.minute = bd.minute
+                ),
+                bike_changes AS (
+                    SELECT *,
+                           LAG(bike_count) OVER (PARTITION BY station_number ORDER BY minute) AS previous_bike_count
+                    FROM station_bike_combined
+                )
+                SELECT minute, id, uid, latitude, longitude, name, spot, station_number,
+                       maintenance, terminal_type, city_id, city_name, bike_count, bike_list
+                FROM bike_changes
+                WHERE bike_count IS DISTINCT FROM previous_bike_count
+                ORDER BY station_number, minute
+"""
+
+
 def get_connection():
     return psycopg.connect(
         host=os.environ["DB_HOST"],
@@ -107,77 +227,24 @@ def stations(city_id: int, date: str):
             city_tz = tz_row[0] if tz_row else 'UTC'
 
             # First, find the latest available date for this city (on or before the requested date)
+            _, requested_day_end = local_day_bounds(date, city_tz)
             cur.execute("""
                 SELECT MAX(DATE(last_updated AT TIME ZONE %s))
                 FROM public.stations
-                WHERE city_id = %s AND DATE(last_updated AT TIME ZONE %s) <= %s::date
-            """, (city_tz, city_id, city_tz, date))
+                WHERE city_id = %s AND last_updated < %s
+            """, (city_tz, city_id, requested_day_end))
             result = cur.fetchone()
             latest_date = result[0] if result[0] else date
-            
-            cur.execute("""
-                WITH station_data AS (
-                    SELECT id, uid, latitude, longitude, name, spot, station_number,
-                           maintenance, terminal_type, city_id, city_name,
-                           ROW_NUMBER() OVER (
-                               PARTITION BY uid, latitude, longitude, name, spot,
-                                            station_number, terminal_type, DATE(last_updated AT TIME ZONE %s), maintenance
-                               ORDER BY last_updated DESC
-                           ) AS rn
-                    FROM public.stations
-                    WHERE city_id = %s AND DATE(last_updated AT TIME ZONE %s) = %s
-                ),
-                filtered_stations AS (
-                    SELECT id, uid, latitude, longitude, name, spot, station_number,
-                           maintenance, terminal_type, city_id, city_name
-                    FROM station_data WHERE rn = 1
-                ),
-                bike_source AS (
-                    SELECT (last_updated AT TIME ZONE %s) AS local_ts,
-                           station_number,
-                           bike_number
-                    FROM public.bikes
-                    WHERE city_id = %s AND DATE(last_updated AT TIME ZONE %s) = %s
-                ),
-                bike_data AS (
-                    SELECT DATE_TRUNC('minute', local_ts) AS minute,
-                           station_number,
-                           COUNT(bike_number) AS bike_count,
-                           STRING_AGG(bike_number::TEXT, ', ') AS bike_list
-                    FROM bike_source
-                    GROUP BY DATE_TRUNC('minute', local_ts), station_number
-                ),
-                distinct_minutes AS (
-                    SELECT DISTINCT DATE_TRUNC('minute', local_ts) AS minute
-                    FROM bike_source
-                ),
-                station_minute_combinations AS (
-                    SELECT dm.minute, fs.*
-                    FROM distinct_minutes dm CROSS JOIN filtered_stations fs
-                ),
-                station_bike_combined AS (
-                    SELECT smc.minute, smc.id, smc.uid, smc.latitude, smc.longitude,
-                           smc.name, smc.spot, smc.station_number, smc.maintenance,
-                           smc.terminal_type, smc.city_id, smc.city_name,
-                           COALESCE(bd.bike_count, 0) AS bike_count,
-                           COALESCE(bd.bike_list, '') AS bike_list
-                    FROM station_minute_combinations smc
-                    LEFT JOIN bike_data bd
-                        ON smc.station_number = bd.station_number AND smc.minute = bd.minute
-                ),
-                bike_changes AS (
-                    SELECT *,
-                           LAG(bike_count) OVER (PARTITION BY station_number ORDER BY minute) AS previous_bike_count
-                    FROM station_bike_combined
-                )
-                SELECT minute, id, uid, latitude, longitude, name, spot, station_number,
-                       maintenance, terminal_type, city_id, city_name, bike_count, bike_list
-                FROM bike_changes
-                WHERE bike_count IS DISTINCT FROM previous_bike_count
-                ORDER BY station_number, minute
-            """, (
-                city_tz, city_id, city_tz, latest_date,   # station_data
-                city_tz, city_id, city_tz, latest_date,   # bike_source
+            # Range bounds let Postgres prune the daily bikes partitions
+            day_start, day_end = local_day_bounds(latest_date, city_tz)
+
+            if station_occupancy_covers_day(cur, city_id, day_start, day_end):
+                changes_sql = OCCUPANCY_CHANGES_SQL
+            else:
+                changes_sql = RAW_CHANGES_SQL.format(raw_bikes=RAW_BIKES_SOURCES[BIKE_STORAGE])
+            cur.execute(changes_sql, (
+                city_tz, city_id, day_start, day_end,   # station_data
+                city_tz, city_id, day_start, day_end,   # occupancy_changes or bike_source
             ))
             rows = cur.fetchall()
 
@@ -103,7 +103,7 @@ class TestTimezoneAwareEndpoints(unittest.TestCase):
     def test_stations_response_includes_timezone_and_offset_minute(self, mock_get_conn):
         station_minute = datetime(2026, 6, 8, 12, 30)
         mock_get_conn.return_value = _mock_conn_with_fetchone(
-            fetchone_values=[("Europe/Berlin",), (datetime(2026, 6, 8).date(),)],
+            fetchone_values=[("Europe/Berlin",), (datetime(2026, 6, 8).date(),), (False,)],
             fetchall_rows=[
                 (
                     station_minute,
@@ -129,5 +129,64 @@ class TestTimezoneAwareEndpoints(unittest.TestCase):
         self.assertRegex(payload[0]["minute"], r"[+-]\d{2}:\d{2}$")
 
 
+class TestStationOccupancy(unittest.TestCase):
+
+    def _stations_conn(self, fetchone_values):
+        return _mock_conn_with_fetchone(fetchone_values=fetchone_values, fetchall_rows=[])
+
+    def _changes_query(self, conn):
+        return conn.cursor.return_value.execute.call_args_list[-1].args[0]
+
+    @patch("api.get_connection")
+    def test_day_covered_by_occupancy_reads_station_occupancy(self, mock_get_conn):
+        conn = self._stations_conn([
+            ("Europe/Berlin",),
+            (datetime(2026, 6, 8).date(),),
+            (True,),
+            (True,),
+        ])
+        mock_get_conn.return_value = conn
+
+        client.get("/api/stations?city_id=467&date=2026-06-08")
+
+        query = self._changes_query(conn)
+        self.assertIn("FROM public.station_occupancy", query)
+        self.assertNotIn("CROSS JOIN", query)
+
+    @patch("api.get_connection")
+    def test_day_not_covered_by_occupancy_rebuilds_from_bikes(self, mock_get_conn):
+        conn = self._stations_conn([
+            ("Europe/Berlin",),
+            (datetime(2026, 6, 8).date(),),
+            (True,),
+            (False,),
+        ])
+        mock_get_conn.return_value = conn
+
+        client.get("/api/stations?city_id=467&date=2026-06-08")
+
+        self.assertIn("FROM public.bikes", self._changes_query(conn))
+        coverage_sql, (_, day_start, day_end) = conn.cursor.return_value.execute.call_args_list[-2].args
+        self.assertIn("public.station_occupancy_covers_day(", coverage_sql)
+        self.assertEqual(day_start.isoformat(), "2026-06-08T00:00:00+02:00")
+        self.assertEqual(day_end.isoformat(), "2026-06-09T00:00:00+02:00")
+
+    @patch("api.BIKE_STORAGE", "normalized")
+    @patch("api.get_connection")
+    def test_normalized_storage_rebuilds_from_bike_snapshots(self, mock_get_conn):
+        conn = self._stations_conn([
+            ("Europe/Berlin",),
+            (datetime(2026, 6, 8).date(),),
+            (False,),
+        ])
+        mock_get_conn.return_value = conn
+
+        client.get("/api/stations?city_id=467&date=2026-06-08")
+
+        query = self._changes_query(conn)
+        self.assertIn("FROM public.bike_snapshots s", query)
+        self.assertIn("JOIN public.bike_dim d", query)
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file